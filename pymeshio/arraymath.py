@@ -0,0 +1,195 @@
+# coding: utf-8
+"""
+vectorized math over numpy arrays.
+
+same conventions as common.Quaternion:
+
+* quaternion is (x, y, z, w)
+* matrix is row vector style(DirectX). v'=v*M, translation is the 4th row.
+* q1*q2 rotates by q2 then q1. matrix of q1*q2 is M(q2)*M(q1).
+"""
+import numpy
+
+
+def normalize(v):
+    """
+    normalize vectors ...xN. zero vector stays zero.
+    """
+    norm=numpy.linalg.norm(v, axis=-1, keepdims=True)
+    return v/numpy.where(norm>0, norm, 1)
+
+
+def quaternion_multiply(a, b):
+    """
+    a*b of quaternions ...x4
+    """
+    ax, ay, az, aw=numpy.moveaxis(a, -1, 0)
+    bx, by, bz, bw=numpy.moveaxis(b, -1, 0)
+    return numpy.stack([
+        aw*bx+bw*ax+ay*bz-az*by,
+        aw*by+bw*ay+az*bx-ax*bz,
+        aw*bz+bw*az+ax*by-ay*bx,
+        aw*bw-ax*bx-ay*by-az*bz,
+        ], axis=-1)
+
+
+def quaternion_conjugate(q):
+    return q*numpy.array([-1, -1, -1, 1], q.dtype)
+
+
+def quaternion_from_axis_angle(axis, angle):
+    """
+    quaternions from unit axis ...x3 and angle ... in radian
+    """
+    half=numpy.asarray(angle)[..., None]*0.5
+    return numpy.concatenate([axis*numpy.sin(half), numpy.cos(half)], axis=-1)
+
+
+def quaternion_to_matrix(q):
+    """
+    rotation matrices ...x3x3 of quaternions ...x4(common.Quaternion.getMatrix)
+    """
+    x, y, z, w=numpy.moveaxis(q, -1, 0)
+    return numpy.stack([
+        numpy.stack([1-2*y*y-2*z*z, 2*x*y+2*w*z, 2*x*z-2*w*y], axis=-1),
+        numpy.stack([2*x*y-2*w*z, 1-2*x*x-2*z*z, 2*y*z+2*w*x], axis=-1),
+        numpy.stack([2*x*z+2*w*y, 2*y*z-2*w*x, 1-2*x*x-2*y*y], axis=-1),
+        ], axis=-2)
+
+
+def matrix_to_quaternion(m):
+    """
+    quaternions ...x4 of rotation matrices ...x3x3(or ...x4x4)
+    """
+    m=m[..., :3, :3]
+    # column vector style
+    r=numpy.swapaxes(m, -1, -2)
+    m00=r[..., 0, 0]
+    m11=r[..., 1, 1]
+    m22=r[..., 2, 2]
+    trace=m00+m11+m22
+    # Shepperd: pick the largest of w, x, y, z to divide with
+    candidates=numpy.stack([trace, m00, m11, m22], axis=-1)
+    case=numpy.argmax(candidates, axis=-1)
+    s_w=numpy.sqrt(numpy.maximum(1+trace, 1e-12))*2
+    s_x=numpy.sqrt(numpy.maximum(1+m00-m11-m22, 1e-12))*2
+    s_y=numpy.sqrt(numpy.maximum(1-m00+m11-m22, 1e-12))*2
+    s_z=numpy.sqrt(numpy.maximum(1-m00-m11+m22, 1e-12))*2
+    q_w=numpy.stack([
+        (r[..., 2, 1]-r[..., 1, 2])/s_w,
+        (r[..., 0, 2]-r[..., 2, 0])/s_w,
+        (r[..., 1, 0]-r[..., 0, 1])/s_w,
+        0.25*s_w], axis=-1)
+    q_x=numpy.stack([
+        0.25*s_x,
+        (r[..., 0, 1]+r[..., 1, 0])/s_x,
+        (r[..., 0, 2]+r[..., 2, 0])/s_x,
+        (r[..., 2, 1]-r[..., 1, 2])/s_x], axis=-1)
+    q_y=numpy.stack([
+        (r[..., 0, 1]+r[..., 1, 0])/s_y,
+        0.25*s_y,
+        (r[..., 1, 2]+r[..., 2, 1])/s_y,
+        (r[..., 0, 2]-r[..., 2, 0])/s_y], axis=-1)
+    q_z=numpy.stack([
+        (r[..., 0, 2]+r[..., 2, 0])/s_z,
+        (r[..., 1, 2]+r[..., 2, 1])/s_z,
+        0.25*s_z,
+        (r[..., 1, 0]-r[..., 0, 1])/s_z], axis=-1)
+    q=numpy.choose(case[..., None], [q_w, q_x, q_y, q_z])
+    return normalize(q)
+
+
+def rotate(q, v):
+    """
+    rotate vectors ...x3 by quaternions ...x4
+    """
+    u=q[..., :3]
+    w=q[..., 3:]
+    t=2*numpy.cross(u, v)
+    return v+w*t+numpy.cross(u, t)
+
+
+def slerp(q0, q1, t):
+    """
+    spherical linear interpolation of quaternions ...x4 by t ...
+    """
+    dot=numpy.sum(q0*q1, axis=-1)
+    # shortest path
+    q1=numpy.where((dot<0)[..., None], -q1, q1)
+    dot=numpy.abs(dot)
+    t=numpy.asarray(t)[..., None]
+    near=(dot>0.9995)[..., None]
+    theta=numpy.arccos(numpy.clip(dot, -1.0, 1.0))[..., None]
+    sin_theta=numpy.sin(theta)
+    safe_sin=numpy.where(near, 1.0, sin_theta)
+    w0=numpy.where(near, 1-t, numpy.sin((1-t)*theta)/safe_sin)
+    w1=numpy.where(near, t, numpy.sin(t*theta)/safe_sin)
+    return normalize(w0*q0+w1*q1)
+
+
+def compose_matrices(q, t):
+    """
+    4x4 matrices ...x4x4 of rotation q ...x4 then translation t ...x3
+    """
+    shape=q.shape[:-1]
+    m=numpy.zeros(shape+(4, 4), numpy.result_type(q, t))
+    m[..., :3, :3]=quaternion_to_matrix(q)
+    m[..., 3, :3]=t
+    m[..., 3, 3]=1
+    return m
+
+
+def transform_points(m, p):
+    """
+    p ...x3 by 4x4 matrices ...x4x4
+    """
+    return numpy.einsum('...i,...ij->...j', p, m[..., :3, :3])+m[..., 3, :3]
+
+
+def transform_vectors(m, v):
+    """
+    v ...x3 by the rotation part of matrices ...x4x4(or ...x3x3)
+    """
+    return numpy.einsum('...i,...ij->...j', v, m[..., :3, :3])
+
+
+def quaternion_to_euler(q):
+    """
+    euler angles ...x3(x, y, z) in radian of quaternions ...x4.
+    rotation order is z, x, y(q=qy*qx*qz).
+    """
+    # column vector style
+    r=numpy.swapaxes(quaternion_to_matrix(q), -1, -2)
+    x=numpy.arcsin(numpy.clip(-r[..., 1, 2], -1.0, 1.0))
+    y=numpy.arctan2(r[..., 0, 2], r[..., 2, 2])
+    z=numpy.arctan2(r[..., 1, 0], r[..., 1, 1])
+    return numpy.stack([x, y, z], axis=-1)
+
+
+def quaternion_from_euler(euler):
+    """
+    quaternions ...x4 of euler angles ...x3(x, y, z) in radian.
+    inverse of quaternion_to_euler.
+    """
+    euler=numpy.asarray(euler)
+    half=euler*0.5
+    zeros=numpy.zeros_like(half[..., 0])
+    s=numpy.sin(half)
+    c=numpy.cos(half)
+    qx=numpy.stack([s[..., 0], zeros, zeros, c[..., 0]], axis=-1)
+    qy=numpy.stack([zeros, s[..., 1], zeros, c[..., 1]], axis=-1)
+    qz=numpy.stack([zeros, zeros, s[..., 2], c[..., 2]], axis=-1)
+    return quaternion_multiply(qy, quaternion_multiply(qx, qz))
+
+
+def triangulate_fans(starts, sizes):
+    """
+    return int64 Tx3 triangles of polygons triangulated as fans. the
+    polygon k is the corners starts[k]:starts[k]+sizes[k], and the
+    triangles index those corners. a polygon under 3 corners has none.
+    """
+    counts=numpy.maximum(numpy.asarray(sizes, numpy.int64)-2, 0)
+    first=numpy.repeat(numpy.asarray(starts, numpy.int64), counts)
+    k=numpy.arange(int(counts.sum()))-numpy.repeat(
+            numpy.cumsum(counts)-counts, counts)
+    return numpy.stack([first, first+k+1, first+k+2], axis=1)
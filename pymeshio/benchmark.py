@@ -0,0 +1,122 @@
+# coding: utf-8
+"""
+record decode micro benchmark.
+
+compare per field struct.unpack over io.BytesIO with the fused
+precompiled record of common.BinaryReader for each record type.
+
+usage::
+
+    python -m pymeshio.benchmark [record_count]
+
+"""
+import sys
+import io
+import struct
+import timeit
+from . import common
+from .pmx import reader as pmx_reader
+from .pmd import reader as pmd_reader
+from .vmd import reader as vmd_reader
+from .pmm import reader as pmm_reader
+
+
+class Record(object):
+    """
+    benchmark target
+
+    :IVariables:
+      name
+        record type name
+      fields
+        per field formats of the legacy reader
+      structs
+        fused struct.Struct list of the new reader
+      size
+        record size in bytes
+    """
+    __slots__=['name', 'fields', 'structs', 'size']
+    def __init__(self, name, fields, structs):
+        self.name=name
+        self.fields=[(fmt, struct.calcsize("<"+fmt)) for fmt in fields]
+        self.structs=structs
+        self.size=sum(compiled.size for compiled in structs)
+        assert(sum(size for _, size in self.fields)==self.size)
+
+    def __str__(self):
+        return '<Record %s %d bytes>' % (self.name, self.size)
+
+    def create_data(self, count):
+        return bytes(bytearray(
+            (i * 7 + 1) % 64 for i in range(self.size * count)))
+
+    def read_legacy(self, data, count):
+        ios=io.BytesIO(data)
+        unpack=struct.unpack
+        read=ios.read
+        for _ in range(count):
+            for fmt, size in self.fields:
+                unpack("<"+fmt, read(size))
+
+    def read_fused(self, data, count):
+        reader=common.BinaryReader(data)
+        read_struct=reader.read_struct
+        structs=self.structs
+        for _ in range(count):
+            for compiled in structs:
+                read_struct(compiled)
+
+
+# utf16, no extended uv, index sizes: vertex 2, texture 1, material 1,
+# bone 2, morph 1, rigidbody 1
+_pmx_reader=pmx_reader.Reader(b"", 0, 0, 2, 1, 1, 2, 1, 1)
+
+RECORDS=[
+        Record("pmx vertex(bdef2)",
+            ["f", "f", "f", "f", "f", "f", "f", "f",
+                "b", "h", "h", "f", "f"],
+            [_pmx_reader.vertex_struct, _pmx_reader.deform_structs[1]]),
+        Record("pmx material header",
+            ["f", "f", "f", "f", "f", "f", "f", "f", "f", "f", "f",
+                "b", "f", "f", "f", "f", "f", "b", "b", "b", "b"],
+            [_pmx_reader.material_struct]),
+        Record("pmd vertex",
+            ["f", "f", "f", "f", "f", "f", "f", "f", "H", "H", "B", "B"],
+            [pmd_reader.VERTEX_STRUCT]),
+        Record("vmd bone frame",
+            ["15s", "I", "f", "f", "f", "f", "f", "f", "f", "64s"],
+            [vmd_reader.BONE_FRAME_STRUCT]),
+        Record("pmm bone frame",
+            ["i", "i", "i"]+["B"]*16+["f", "f", "f", "f", "f", "f", "f", "B"],
+            [pmm_reader.BONE_FRAME_STRUCT]),
+        ]
+
+
+def run(count=10000, repeat=3):
+    """
+    return [(record, legacy_sec, fused_sec)]
+    """
+    results=[]
+    for record in RECORDS:
+        data=record.create_data(count)
+        legacy=min(timeit.repeat(
+            lambda: record.read_legacy(data, count), number=1, repeat=repeat))
+        fused=min(timeit.repeat(
+            lambda: record.read_fused(data, count), number=1, repeat=repeat))
+        results.append((record, legacy, fused))
+    return results
+
+
+def main():
+    count=int(sys.argv[1]) if len(sys.argv)>1 else 10000
+    print("%d records" % count)
+    print("%-24s %8s %12s %12s %8s" % (
+        "record", "bytes", "legacy(ms)", "fused(ms)", "speedup"))
+    for record, legacy, fused in run(count):
+        print("%-24s %8d %12.2f %12.2f %7.1fx" % (
+            record.name, record.size,
+            legacy*1000, fused*1000, legacy/fused))
+
+
+if __name__=='__main__':
+    main()
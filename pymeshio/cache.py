@@ -0,0 +1,330 @@
+# coding: utf-8
+"""
+on-disk parse cache
+
+cache the result of pmx/pmd/vmd read_from_file by the file content hash.
+
+an entry is a directory named by the key::
+
+    <key>/meta.pickle  the parsed model pickled without its numpy arrays
+    <key>/0.npy ...    the numpy arrays. loaded as copy-on-write mmap
+
+vertex lists of vertex_layout="object" are stored as the columns of
+VertexArray and rebuilt on load. creating the vertex objects costs about
+as much as parsing, so the cache pays off with vertex_layout="numpy",
+where a hit is a few mmaps.
+
+the key is the hash of the file content, the reader options and the
+pymeshio version, so an edited file or a new pymeshio never hits an old
+entry. the total size is capped and the least recently used entries are
+evicted.
+
+>>> import pymeshio.pmx.reader
+>>> m=pymeshio.pmx.reader.read_from_file('resources/初音ミクVer2.pmx',
+...         vertex_layout="numpy", cache=True)
+>>> print(pymeshio.cache.cache_stats())
+
+"""
+import os
+import io
+import sys
+import shutil
+import pickle
+import hashlib
+from . import __version__
+
+
+DEFAULT_MAX_BYTES=1024*1024*1024
+# smaller numpy arrays are pickled inline
+ARRAY_THRESHOLD=4096
+META_NAME="meta.pickle"
+
+
+def get_default_directory():
+    directory=os.environ.get("PYMESHIO_CACHE_DIR")
+    if directory:
+        return directory
+    base=os.environ.get("XDG_CACHE_HOME") or os.path.join(
+            os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pymeshio")
+
+
+def _is_ndarray(obj):
+    numpy=sys.modules.get("numpy")
+    return numpy is not None and type(obj) is numpy.ndarray
+
+
+class _Pickler(pickle.Pickler):
+    """
+    pickle large numpy arrays to .npy files beside the pickle.
+    """
+    def __init__(self, f, directory):
+        pickle.Pickler.__init__(self, f, pickle.HIGHEST_PROTOCOL)
+        self.directory=directory
+        self.count=0
+
+    def persistent_id(self, obj):
+        if type(obj) is list and obj:
+            # vertex lists are stored as the columns of VertexArray
+            converter=_get_vertex_array_converter(type(obj[0]))
+            if converter:
+                kind, create_vertex_array, get_columns=converter
+                columns=get_columns(create_vertex_array(obj))
+                return (kind, tuple(self.save_array(c) for c in columns))
+            return None
+        if (not _is_ndarray(obj) or obj.dtype.hasobject
+                or obj.nbytes<ARRAY_THRESHOLD):
+            return None
+        return self.save_array(obj)
+
+    def save_array(self, array):
+        import numpy
+        name="{0}.npy".format(self.count)
+        self.count+=1
+        numpy.save(os.path.join(self.directory, name),
+                numpy.ascontiguousarray(array), allow_pickle=False)
+        return name
+
+
+def _get_vertex_array_converter(vertex_class):
+    """
+    return (kind, create VertexArray from list, VertexArray to columns) or
+    None.
+    """
+    if vertex_class.__name__!="Vertex":
+        return None
+    try:
+        import numpy
+    except ImportError:
+        return None
+    from . import pmx
+    from . import pmd
+    if vertex_class is pmx.Vertex:
+        return ("pmx.VertexArray", pmx.create_vertex_array,
+                lambda array: [getattr(array, name)
+                    for name in pmx.VertexArray.__slots__])
+    if vertex_class is pmd.Vertex:
+        return ("pmd.VertexArray", pmd.create_vertex_array,
+                lambda array: [array.records])
+    return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, f, directory):
+        pickle.Unpickler.__init__(self, f)
+        self.directory=directory
+
+    def persistent_load(self, pid):
+        if isinstance(pid, tuple):
+            kind, names=pid
+            columns=[self.load_array(name) for name in names]
+            if kind=="pmx.VertexArray":
+                from . import pmx
+                return pmx.VertexArray(*columns).tolist()
+            if kind=="pmd.VertexArray":
+                from . import pmd
+                return pmd.VertexArray(*columns).tolist()
+            raise pickle.UnpicklingError("unknown id: {0}".format(kind))
+        return self.load_array(pid)
+
+    def load_array(self, name):
+        import numpy
+        # copy-on-write. the file is never modified
+        return numpy.load(os.path.join(self.directory, name),
+                mmap_mode="c", allow_pickle=False)
+
+
+class ParseCache(object):
+    """
+    content hash keyed cache directory.
+
+    :IVariables:
+        directory
+            cache root directory
+        max_bytes
+            size cap of all entries
+        hits, misses, stores, evictions
+            counters of this process
+    """
+    __slots__=[
+            'directory',
+            'max_bytes',
+            'hits',
+            'misses',
+            'stores',
+            'evictions',
+            ]
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory=directory or get_default_directory()
+        self.max_bytes=max_bytes
+        self.hits=0
+        self.misses=0
+        self.stores=0
+        self.evictions=0
+
+    def __str__(self):
+        return '<ParseCache %s hits: %d, misses: %d>' % (
+                self.directory, self.hits, self.misses)
+
+    def get_key(self, path, kind, options=()):
+        """
+        return the hex digest of the file content, kind(such as "pmx"),
+        reader options and pymeshio version.
+        """
+        h=hashlib.blake2b(digest_size=20)
+        h.update("{0}\0{1}\0{2}\0".format(
+            __version__, kind, repr(tuple(options))).encode("utf-8"))
+        with io.open(path, "rb") as f:
+            while True:
+                chunk=f.read(1024*1024)
+                if not chunk:
+                    break
+                h.update(chunk)
+        return h.hexdigest()
+
+    def get_entry(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key):
+        """
+        return the cached object or None.
+        """
+        entry=self.get_entry(key)
+        meta=os.path.join(entry, META_NAME)
+        try:
+            with io.open(meta, "rb") as f:
+                obj=_Unpickler(f, entry).load()
+        except (IOError, OSError):
+            return None
+        except Exception:
+            # broken entry
+            shutil.rmtree(entry, True)
+            return None
+        # mark as recently used
+        try:
+            os.utime(meta, None)
+        except OSError:
+            pass
+        return obj
+
+    def store(self, key, obj):
+        """
+        store the object, then evict over max_bytes.
+        """
+        entry=self.get_entry(key)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        tmp="{0}.tmp{1}".format(entry, os.getpid())
+        shutil.rmtree(tmp, True)
+        os.makedirs(tmp)
+        try:
+            with io.open(os.path.join(tmp, META_NAME), "wb") as f:
+                _Pickler(f, tmp).dump(obj)
+            try:
+                os.rename(tmp, entry)
+            except OSError:
+                # stored by another process
+                pass
+        finally:
+            shutil.rmtree(tmp, True)
+        self.stores+=1
+        self.evict()
+
+    def read(self, path, kind, options, parse):
+        """
+        return the cached object of the file, or parse(path) and store it.
+        """
+        key=self.get_key(path, kind, options)
+        obj=self.load(key)
+        if obj is not None:
+            self.hits+=1
+            return obj
+        self.misses+=1
+        obj=parse(path)
+        if obj is not None:
+            self.store(key, obj)
+        return obj
+
+    def get_entries(self):
+        """
+        return [(last used time, bytes, entry path)] sorted from the least
+        recently used.
+        """
+        entries=[]
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            entry=os.path.join(self.directory, name)
+            meta=os.path.join(entry, META_NAME)
+            if ".tmp" in name or not os.path.exists(meta):
+                continue
+            size=sum(os.path.getsize(os.path.join(entry, f))
+                    for f in os.listdir(entry))
+            entries.append((os.path.getmtime(meta), size, entry))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """
+        remove the least recently used entries over max_bytes.
+        """
+        entries=self.get_entries()
+        total=sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total<=self.max_bytes:
+                break
+            shutil.rmtree(entry, True)
+            total-=size
+            self.evictions+=1
+
+    def clear(self):
+        for _, _, entry in self.get_entries():
+            shutil.rmtree(entry, True)
+
+    def get_stats(self):
+        entries=self.get_entries()
+        return {
+                "directory": self.directory,
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                }
+
+
+_default_cache=None
+
+
+def get_default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache=ParseCache()
+    return _default_cache
+
+
+def set_default_cache(cache):
+    """
+    replace the cache used by read_from_file(cache=True).
+    """
+    global _default_cache
+    _default_cache=cache
+
+
+def get_cache(cache):
+    """
+    ParseCache of the cache argument of read_from_file. True is the default
+    cache.
+    """
+    if cache is True:
+        return get_default_cache()
+    return cache
+
+
+def cache_stats(cache=None):
+    """
+    return the stats dict of the cache(default cache if None).
+    """
+    return (cache or get_default_cache()).get_stats()
@@ -6,6 +6,9 @@ import math
 import struct
 import sys
 import io
+import os
+import array
+import mmap
 
 
 def unicode(src):
@@ -392,103 +395,246 @@ def readall(path):
         return f.read()
 
 
+def sequence_equal(lhs, rhs):
+    """compare list, array.array and numpy array by the values.
+    """
+    if len(lhs)!=len(rhs):
+        return False
+    if hasattr(lhs, 'dtype') or hasattr(rhs, 'dtype'):
+        import numpy
+        return bool(numpy.array_equal(lhs, rhs))
+    return list(lhs)==list(rhs)
+
+
+def mmap_file(path):
+    """map path read only, then return the memoryview of it.
+
+    the mapping is released when the memoryview and every numpy view
+    created from it are released.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size==0:
+            # empty file can not be mapped
+            return memoryview(b"")
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def truncate_zero(src):
+    """
+    drop after the first zero byte
+    """
+    pos=src.find(b"\x00")
+    if pos==-1:
+        return src
+    else:
+        return src[:pos]
+
+
+_struct_cache={}
+def get_struct(fmt):
+    """
+    return precompiled struct.Struct for fmt.
+
+    fmt without byte order is read as little endian.
+    """
+    try:
+        return _struct_cache[fmt]
+    except KeyError:
+        if fmt[0] in "@=<>!":
+            compiled=struct.Struct(fmt)
+        else:
+            compiled=struct.Struct("<"+fmt)
+        _struct_cache[fmt]=compiled
+        return compiled
+
+
+INT_STRUCTS={
+        1: get_struct("b"),
+        2: get_struct("h"),
+        4: get_struct("i"),
+        }
+UINT_STRUCTS={
+        1: get_struct("B"),
+        2: get_struct("H"),
+        4: get_struct("I"),
+        }
+FLOAT_STRUCT=get_struct("f")
+VECTOR2_STRUCT=get_struct("2f")
+VECTOR3_STRUCT=get_struct("3f")
+VECTOR4_STRUCT=get_struct("4f")
+
+
 class BinaryReader(object):
     """general BinaryReader
+
+    read from a memoryview with an offset cursor.
+
+    :Parameters:
+      ios
+        input stream (in io.IOBase), bytes-like object or BinaryReader.
+        io.BytesIO shares its bytes, other streams are read to the end.
+        BinaryReader continues from its cursor.
+      offset
+        start position in a bytes-like object.
+
+    :IVariables:
+      zero_copy
+        True when reading a bytes-like object(for example mmap_file).
+        read_numpy_array returns read only views of it.
     """
-    def __init__(self, ios):
-        current=ios.tell()
-        #ios.seek(0, io.SEEK_END)
-        ios.seek(0, 2)
-        self.end=ios.tell()
-        ios.seek(current)
-        self.ios=ios
+    def __init__(self, ios, offset=0):
+        if isinstance(ios, BinaryReader):
+            self.ios=ios.ios
+            self.base=ios.base
+            self.buffer=ios.buffer
+            self.offset=ios.offset
+            self.end=ios.end
+            self.zero_copy=ios.zero_copy
+            return
+        if isinstance(ios, io.IOBase):
+            self.ios=ios
+            self.zero_copy=False
+            if isinstance(ios, io.BytesIO):
+                self.base=0
+                offset=ios.tell()
+                data=ios.getvalue()
+            else:
+                self.base=ios.tell()
+                offset=0
+                data=ios.read()
+        else:
+            self.ios=None
+            self.base=0
+            self.zero_copy=True
+            data=ios
+        self.buffer=memoryview(data)
+        if self.buffer.ndim!=1 or self.buffer.itemsize!=1:
+            self.buffer=self.buffer.cast("B")
+        self.offset=offset
+        self.end=len(self.buffer)
 
     def __str__(self):
-        return "<BinaryReader %d/%d>" % (self.ios.tell(), self.end)
+        return "<BinaryReader %d/%d>" % (self.offset, self.end)
 
     def is_end(self):
-        #print(self.ios.tell(), self.end)
-        return self.ios.tell()>=self.end
-        #return not self.ios.readable()
-
-    def unpack(self, fmt, size):
-        result=struct.unpack(fmt, self.ios.read(size))
-        return result[0]
+        return self.offset>=self.end
+
+    def tell(self):
+        return self.offset
+
+    def seek(self, offset):
+        self.offset=offset
+
+    def sync(self):
+        """
+        move the input stream to the cursor position.
+        """
+        if self.ios and self.ios.seekable():
+            self.ios.seek(self.base+self.offset)
+
+    def skip(self, size):
+        self.offset+=size
+        if self.offset>self.end:
+            raise ParseException("unexpected eof: {0}/{1}".format(
+                self.offset, self.end))
+
+    def read_bytes(self, size):
+        """
+        return memoryview of size bytes without copy.
+        """
+        begin=self.offset
+        self.skip(size)
+        return self.buffer[begin:self.offset]
+
+    def read_struct(self, compiled):
+        """
+        unpack a precompiled struct.Struct at the cursor.
+        """
+        try:
+            result=compiled.unpack_from(self.buffer, self.offset)
+        except struct.error:
+            raise ParseException("unexpected eof: {0}+{1}/{2}".format(
+                self.offset, compiled.size, self.end))
+        self.offset+=compiled.size
+        return result
+
+    def read_record(self, fmt):
+        """
+        unpack fused record fmt at once, then return tuple.
+        """
+        return self.read_struct(get_struct(fmt))
+
+    def unpack(self, fmt, size=None):
+        return self.read_struct(get_struct(fmt))[0]
 
     def read_int(self, size):
-        if size==1:
-            return self.unpack("b", size)
-        if size==2:
-            return self.unpack("h", size)
-        if size==4:
-            return self.unpack("i", size)
-        print("not reach here")
-        raise ParseException("invalid int size: "+size)
+        try:
+            return self.read_struct(INT_STRUCTS[size])[0]
+        except KeyError:
+            raise ParseException("invalid int size: {0}".format(size))
 
     def read_uint(self, size):
-        if size==1:
-            return self.unpack("B", size)
-        if size==2:
-            return self.unpack("H", size)
-        if size==4:
-            return self.unpack("I", size)
-        print("not reach here")
-        raise ParseException("invalid int size: "+size)
+        try:
+            return self.read_struct(UINT_STRUCTS[size])[0]
+        except KeyError:
+            raise ParseException("invalid int size: {0}".format(size))
 
     def read_float(self):
-        return self.unpack("f", 4)
+        return self.read_struct(FLOAT_STRUCT)[0]
+
+    def read_array(self, typecode, count):
+        """
+        read count little endian values into array.array.
+        """
+        values=array.array(typecode)
+        data=self.read_bytes(values.itemsize*count)
+        if sys.version_info[0]<3:
+            values.fromstring(data.tobytes())
+        else:
+            values.frombytes(data)
+        if sys.byteorder=='big':
+            values.byteswap()
+        return values
+
+    def read_numpy_array(self, dtype, count, copy=None):
+        """
+        read count values into numpy array.
+
+        :Parameters:
+          dtype
+            numpy dtype. structured dtype reads records.
+          count
+            value count
+          copy
+            True returns a writable copy. False returns a read only view
+            of the source. None is not zero_copy.
+        """
+        import numpy
+        dtype=numpy.dtype(dtype)
+        values=numpy.frombuffer(self.read_bytes(dtype.itemsize*count), dtype)
+        if copy is None:
+            copy=not self.zero_copy
+        if copy:
+            return values.copy()
+        return values
 
     def read_vector2(self):
-        return Vector2(
-                self.read_float(), 
-                self.read_float()
-                )
+        return Vector2(*self.read_struct(VECTOR2_STRUCT))
 
     def read_vector3(self):
-        return Vector3(
-                self.read_float(), 
-                self.read_float(), 
-                self.read_float()
-                )
+        return Vector3(*self.read_struct(VECTOR3_STRUCT))
 
     def read_vector4(self):
-        return Vector4(
-                self.read_float(), 
-                self.read_float(), 
-                self.read_float(),
-                self.read_float()
-                )
-
-    def read_quaternion(self):
-        return Quaternion(
-                self.read_float(), 
-                self.read_float(), 
-                self.read_float(),
-                self.read_float()
-                )
+        return Vector4(*self.read_struct(VECTOR4_STRUCT))
 
     def read_quaternion(self):
-        return Quaternion(
-                self.read_float(), 
-                self.read_float(), 
-                self.read_float(),
-                self.read_float()
-                )
+        return Quaternion(*self.read_struct(VECTOR4_STRUCT))
 
     def read_rgba(self):
-        return RGBA(
-                self.read_float(), 
-                self.read_float(), 
-                self.read_float(),
-                self.read_float()
-                )
+        return RGBA(*self.read_struct(VECTOR4_STRUCT))
 
     def read_rgb(self):
-        return RGB(
-                self.read_float(), 
-                self.read_float(), 
-                self.read_float()
-                )
+        return RGB(*self.read_struct(VECTOR3_STRUCT))
 
 
 class WriteException(Exception):
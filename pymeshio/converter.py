@@ -3,11 +3,15 @@
 convert model
 """
 
+import io
+import os
 import math
 from . import common
 from .common import unicode as u
 from . import pmx
 from . import pmd
+from . import obj
+from . import mqo
 
 class ConvertException(Exception):
     """
@@ -16,14 +20,83 @@ class ConvertException(Exception):
     pass
 
 
-def pmd_to_pmx(src):
+def convert_vertices_numpy(vertices):
+    """
+    return pmx.VertexArray of pmd vertices(pmd.Vertex list or
+    pmd.VertexArray).
+
+    weight0 0 is Bdef1(bone1), 100 is Bdef1(bone0), otherwise
+    Bdef2(bone0, bone1, weight0*0.01).
+
+    requires numpy.
+    """
+    import numpy
+    vertices=pmd.create_vertex_array(vertices)
+    count=len(vertices)
+    bone0=vertices.bone0.astype(numpy.int32)
+    bone1=vertices.bone1.astype(numpy.int32)
+    only1=vertices.weight0==0
+    bdef1=only1 | (vertices.weight0==100)
+    weight0=vertices.weight0*0.01
+    deform_types=numpy.where(bdef1,
+            pmx.DEFORM_BDEF1, pmx.DEFORM_BDEF2).astype(numpy.int8)
+    bone_indices=numpy.full((count, 4), -1, numpy.int32)
+    bone_indices[:, 0]=numpy.where(only1, bone1, bone0)
+    bone_indices[:, 1]=numpy.where(bdef1, -1, bone1)
+    weights=numpy.zeros((count, 4), numpy.float32)
+    weights[:, 0]=numpy.where(bdef1, 1.0, weight0)
+    weights[:, 1]=numpy.where(bdef1, 0.0, 1.0-weight0)
+    return pmx.VertexArray(
+            numpy.array(vertices.positions, numpy.float32),
+            numpy.array(vertices.normals, numpy.float32),
+            numpy.array(vertices.uvs, numpy.float32),
+            deform_types,
+            bone_indices,
+            weights,
+            numpy.zeros((count, 3), numpy.float32),
+            numpy.zeros((count, 3), numpy.float32),
+            numpy.zeros((count, 3), numpy.float32),
+            (vertices.edge_flags==0).astype(numpy.float32))
+
+
+def convert_vertex_morph_offsets_numpy(base_indices, morph):
+    """
+    return pmx.VertexMorphOffsetArray of a pmd morph. the indices of the
+    morph refer to the base morph and are gathered to vertex indices.
+
+    :Parameters:
+        base_indices
+            int array. vertex indices of the base morph
+        morph
+            pmd.Morph
+    """
+    import numpy
+    indices=numpy.asarray(morph.indices, numpy.int64)
+    if len(indices) and (indices.min()<0
+            or indices.max()>=len(base_indices)):
+        raise ConvertException(
+                "morph index out of base: {0}".format(morph.name))
+    positions=numpy.array([(p.x, p.y, p.z) for p in morph.pos_list],
+            numpy.float32).reshape(-1, 3)
+    return pmx.VertexMorphOffsetArray(base_indices[indices], positions)
+
+
+def pmd_to_pmx(src, vertex_layout="object"):
     """
     return pymeshio.pmx.Model.
 
     :Parameters:
         src
             pymeshio.pmd.Model
+        vertex_layout
+            "object": vertices, indices and vertex morph offsets are
+            lists of pmx objects.
+            "numpy": vertices are a pmx.VertexArray, indices is a numpy
+            array and vertex morph offsets are pmx.VertexMorphOffsetArray,
+            converted in bulk without per vertex objects(requires numpy).
     """
+    if vertex_layout not in ("object", "numpy"):
+        raise ValueError("unknown vertex_layout: {0}".format(vertex_layout))
     dst=pmx.Model()
     # model info
     dst.name=src.name.decode("cp932")
@@ -40,7 +113,10 @@ def pmd_to_pmx(src):
             return pmx.Bdef1(bone0)
         else:
             return pmx.Bdef2(bone0, bone1, weight0*0.01)
-    dst.vertices=[
+    if vertex_layout=="numpy":
+        dst.vertices=convert_vertices_numpy(src.vertices)
+    else:
+        dst.vertices=[
             pmx.Vertex(
                 v.pos, 
                 v.normal, 
@@ -50,7 +126,11 @@ def pmd_to_pmx(src):
                 )
             for v in src.vertices]
     # indices
-    dst.indices=src.indices[:]
+    if vertex_layout=="numpy":
+        import numpy
+        dst.indices=numpy.array(src.indices, numpy.uint16)
+    else:
+        dst.indices=src.indices[:]
     # materials
     texture_map={}
     def get_flag(m):
@@ -295,14 +375,22 @@ def pmd_to_pmx(src):
     if len(src.morphs)>0:
         base=src.morphs[0]
         assert(base.name==b"base")
+        if vertex_layout=="numpy":
+            import numpy
+            base_indices=numpy.asarray(base.indices, numpy.int64)
+            def get_offsets(m):
+                return convert_vertex_morph_offsets_numpy(base_indices, m)
+        else:
+            def get_offsets(m):
+                return [pmx.VertexMorphOffset(base.indices[i], pos)
+                        for i, pos in zip(m.indices, m.pos_list)]
         dst.morphs=[
                 pmx.Morph(
                     name=m.name.decode('cp932'),
                     english_name=m.english_name.decode('cp932'),
                     panel=get_panel(m),
                     morph_type=1,
-                    offsets=[pmx.VertexMorphOffset(base.indices[i], pos)
-                        for i, pos in zip(m.indices, m.pos_list)]
+                    offsets=get_offsets(m)
                     )
                 for i, m in enumerate(src.morphs) if m.name!=b"base"]
 
@@ -384,10 +472,181 @@ def pmd_to_pmx(src):
     return dst
 
 
+def transcode_pmd_to_pmx(src_path, dst_path, chunk_size=65536,
+        text_encoding=0):
+    """
+    convert a pmd file to a pmx file section by section without the whole
+    pmd.Model in memory. the output is the same as writing
+    pmd_to_pmx(pmd.reader.read_from_file(src_path)).
+
+    the small sections(materials, bones, morph headers, rigidbodies ...)
+    are read with vertex_layout="skip" and converted by pmd_to_pmx, so the
+    mapping rules are shared. the vertex, index and vertex morph blocks
+    are read and written chunk_size records at a time, so the memory stays
+    flat regardless of the model size. the pmx index sizes are decided by
+    the counts in the pmd before any section is written.
+
+    requires numpy.
+
+    :Parameters:
+        src_path
+            pmd file path
+        dst_path
+            pmx file path
+        chunk_size
+            records of a chunk
+        text_encoding
+            see pmx.writer.write
+    """
+    import numpy
+    from .pmd import reader as pmd_reader
+    from .pmx import writer as pmx_writer
+    if chunk_size<1:
+        raise ValueError("invalid chunk_size: {0}".format(chunk_size))
+    sections={}
+    # the small sections are parsed from the mapping. the skipped blocks
+    # are never touched
+    data=common.mmap_file(src_path)
+    src=pmd_reader.read(data, "skip", sections)
+    if not src:
+        raise ConvertException("fail to read: {0}".format(src_path))
+    vertex_offset, vertex_count=sections["vertices"]
+    index_offset, index_count=sections["indices"]
+    # everything except the vertex, index and vertex morph blocks
+    dst=pmd_to_pmx(src)
+    morph_offset_dtype=numpy.dtype([
+        ("index", "<u4"), ("position", "<f4", (3,))])
+    base_indices=numpy.empty(0, numpy.int64)
+    if src.morphs:
+        offset, count=sections["morphs"][0]
+        base_indices=numpy.frombuffer(data, morph_offset_dtype,
+                count, offset)["index"]
+        if len(base_indices) and base_indices.max()>=vertex_count:
+            raise ConvertException("base morph index out of vertices")
+    # blocks of dst.morphs
+    morph_blocks=[block for morph, block in zip(src.morphs, sections["morphs"])
+            if morph.name!=b"base"]
+
+    with io.open(src_path, "rb") as src_file:
+        def read_chunks(offset, count, dtype):
+            dtype=numpy.dtype(dtype)
+            src_file.seek(offset)
+            for start in range(0, count, chunk_size):
+                size=min(chunk_size, count-start)
+                chunk=src_file.read(dtype.itemsize*size)
+                if len(chunk)!=dtype.itemsize*size:
+                    raise common.ParseException(
+                            "unexpected eof: {0}".format(src_path))
+                yield numpy.frombuffer(chunk, dtype)
+
+        tmp=dst_path+".tmp"
+        try:
+            with io.open(tmp, "wb") as f:
+                writer=pmx_writer.create_writer(f, dst.version,
+                        text_encoding, vertex_count, len(dst.textures),
+                        len(dst.materials), len(dst.bones),
+                        len(dst.morphs), len(dst.rigidbodies))
+                writer.write_text(dst.name)
+                writer.write_text(dst.english_name)
+                writer.write_text(dst.comment)
+                writer.write_text(dst.english_comment)
+
+                writer.write_int(vertex_count, 4)
+                for records in read_chunks(vertex_offset, vertex_count,
+                        pmd.VERTEX_DTYPE):
+                    writer.write_section(writer.pack_vertex_array(
+                        convert_vertices_numpy(pmd.VertexArray(records))))
+
+                writer.write_int(index_count, 4)
+                index_format="<"+pmx_writer.INDEX_FORMATS[
+                        writer.vertex_index_size]
+                for indices in read_chunks(index_offset, index_count, "<u2"):
+                    writer.write_section(
+                            indices.astype(index_format).tobytes())
+
+                writer.write_textures(dst.textures)
+                writer.write_materials(dst.materials)
+                writer.write_bones(dst.bones)
+
+                writer.write_int(len(dst.morphs), 4)
+                for m, (offset, count) in zip(dst.morphs, morph_blocks):
+                    writer.write_morph_header(m, count)
+                    for records in read_chunks(offset, count,
+                            morph_offset_dtype):
+                        indices=records["index"].astype(numpy.int64)
+                        if len(indices) and indices.max()>=len(base_indices):
+                            raise ConvertException(
+                                    "morph index out of base: {0}".format(
+                                        m.name))
+                        writer.write_vertex_morph_offsets(
+                                pmx.VertexMorphOffsetArray(
+                                    base_indices[indices],
+                                    records["position"]))
+                        writer.flush_section()
+
+                writer.write_display_slots(dst.display_slots)
+                writer.write_rigidbodies(dst.rigidbodies)
+                writer.write_joints(dst.joints)
+                writer.flush_section()
+            os.replace(tmp, dst_path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return True
+
+
+def create_obj_vertex_array(obj_model):
+    """
+    return (pmx.VertexArray, indices int32, vertex_count of each material)
+    of obj.Model read by vertex_layout="numpy".
+
+    faces are triangulated as fans and a pmx vertex is created for each
+    unique (v, vt, vn) triplet, so the result is an indexed mesh.
+
+    requires numpy.
+    """
+    import numpy
+    references=[]
+    vertex_counts=[]
+    for m in obj_model.materials:
+        faces=obj.create_face_array(m.faces)
+        corners=faces.references[faces.get_triangles().reshape(-1)]
+        references.append(corners)
+        vertex_counts.append(len(corners))
+    references=numpy.concatenate(references+[numpy.zeros((0, 3),
+        numpy.int64)])
+    # dedup (v, vt) then (v, vt, vn). each key fits in int64
+    _, pair_ids=numpy.unique(
+            references[:, 0]*(len(obj_model.uv)+1)+references[:, 1]+1,
+            return_inverse=True)
+    keys, indices=numpy.unique(
+            pair_ids.reshape(-1)*(len(obj_model.normals)+1)
+            +references[:, 2]+1, return_inverse=True)
+    first=numpy.zeros(len(keys), numpy.int64)
+    first[indices.reshape(-1)[::-1]]=numpy.arange(len(references))[::-1]
+    v, vt, vn=references[first].T
+    count=len(keys)
+
+    def gather(values, index, width):
+        result=numpy.zeros((count, width), numpy.float32)
+        values=numpy.asarray(values, numpy.float32).reshape(-1, width)
+        valid=index>=0
+        result[valid]=values[index[valid]]
+        return result
+    vertices=pmx.create_bdef1_vertex_array(
+            gather(obj_model.vertices, v, 3),
+            gather(obj_model.normals, vn, 3),
+            gather(obj_model.uv, vt, 2))
+    return vertices, indices.reshape(-1).astype(numpy.int32), vertex_counts
+
+
 def obj_to_pmx(obj_model, name, scale):
     """
     return pymeshio.pmx.Model.
 
+    obj.Model of vertex_layout="numpy" is converted to an indexed mesh by
+    create_obj_vertex_array, otherwise every face corner is a vertex.
+
     :Parameters:
         obj_model
             pymeshio.obj.Model
@@ -439,7 +698,7 @@ def obj_to_pmx(obj_model, name, scale):
                         "invalid face vertex count: {0}".format(face_vertex_count))
         return vertex_count
 
-    def create_material(i, m):
+    def create_material(m, vertex_count):
         return pmx.Material(m.name.decode("ascii")
                 , m.name.decode("ascii")
                 , m.Kd or common.RGB(0.5, 0.5, 1)
@@ -456,12 +715,168 @@ def obj_to_pmx(obj_model, name, scale):
                 , 1
                 , 0
                 , u"comment"
-                , get_vertex_count(m.faces)
+                , vertex_count
                 )
 
+    if hasattr(obj_model.vertices, "dtype"):
+        # numpy
+        dst.vertices, dst.indices, vertex_counts=create_obj_vertex_array(
+                obj_model)
+        dst.materials=[create_material(m, vertex_count)
+                for m, vertex_count in zip(obj_model.materials, vertex_counts)]
+        return dst
+
     dst.vertices=[create_vertex(obj_model.get_vertex(ref)) for ref in each_triangle(obj_model)]
     dst.indices=[i for i in range(len(dst.vertices))]
-    dst.materials=[create_material(i, m) for i, m in enumerate(obj_model.materials)]
+    dst.materials=[create_material(m, get_vertex_count(m.faces))
+            for m in obj_model.materials]
 
     return dst
 
+
+
+def create_mqo_vertex_array(mqo_model, scale=1.0):
+    """
+    return (pmx.VertexArray, indices int32, triangle material index of the
+    sorted triangles) of mqo.Model.
+
+    objects are merged. faces are triangulated as fans and sorted by
+    material, a pmx vertex is created for each unique (vertex, uv) pair and
+    the normals are smoothed over the faces sharing a mqo vertex. the
+    right handed coordinate is converted by (x, y, -z)*scale. both formats
+    have the clockwise front face, so the winding is kept. a material index
+    out of mqo_model.materials is len(mqo_model.materials).
+
+    requires numpy.
+    """
+    import numpy
+    material_count=len(mqo_model.materials)
+    positions=[numpy.zeros((0, 3), numpy.float32)]
+    references=[numpy.zeros(0, numpy.int64)]
+    uvs=[numpy.zeros((0, 2), numpy.float32)]
+    materials=[numpy.zeros(0, numpy.int64)]
+    offset=0
+    for o in mqo_model.objects:
+        vertices=numpy.asarray(o.vertices if hasattr(o.vertices, "dtype")
+                else [(v.x, v.y, v.z) for v in o.vertices],
+                numpy.float32).reshape(-1, 3)
+        faces=mqo.create_face_array(o.faces)
+        if len(faces.indices) and (faces.indices.min()<0
+                or faces.indices.max()>=len(vertices)):
+            raise ConvertException(
+                    "face index out of range: {0}".format(o.name))
+        corners=faces.get_triangles().reshape(-1)
+        face_indices=numpy.repeat(numpy.arange(len(faces)),
+                numpy.maximum(faces.sizes-2, 0))
+        material_indices=faces.material_indices[face_indices]
+        material_indices[(material_indices<0)
+                | (material_indices>=material_count)]=material_count
+        positions.append(vertices)
+        references.append(faces.indices[corners]+offset)
+        uvs.append(faces.uvs[corners])
+        materials.append(material_indices)
+        offset+=len(vertices)
+    positions=numpy.concatenate(positions)*numpy.array(
+            [scale, scale, -scale], numpy.float32)
+    references=numpy.concatenate(references)
+    uvs=numpy.concatenate(uvs).astype(numpy.float32)
+    materials=numpy.concatenate(materials)
+
+    # sort the triangles by material
+    order=numpy.argsort(materials, kind="stable")
+    materials=materials[order]
+    corners=(order[:, None]*3+numpy.arange(3)).reshape(-1)
+    references=references[corners]
+    uvs=uvs[corners]
+
+    # smooth normals. area weighted face normals summed on each mqo vertex
+    triangles=positions[references].reshape(-1, 3, 3)
+    face_normals=numpy.repeat(numpy.cross(triangles[:, 1]-triangles[:, 0],
+        triangles[:, 2]-triangles[:, 0]), 3, axis=0)
+    normals=numpy.stack([numpy.bincount(references,
+        face_normals[:, k], len(positions)) for k in range(3)], axis=1)
+    length=numpy.linalg.norm(normals, axis=1, keepdims=True)
+    normals=(normals/numpy.where(length>0, length, 1)).astype(numpy.float32)
+
+    # dedup (vertex, uv). each key fits in int64
+    uv_bits=uvs.view(numpy.uint32).astype(numpy.uint64)
+    _, uv_ids=numpy.unique(uv_bits[:, 0]<<numpy.uint64(32) | uv_bits[:, 1],
+            return_inverse=True)
+    keys, indices=numpy.unique(references*(int(uv_ids.max())+1 if len(
+        uv_ids) else 1)+uv_ids.reshape(-1), return_inverse=True)
+    indices=indices.reshape(-1)
+    first=numpy.zeros(len(keys), numpy.int64)
+    first[indices[::-1]]=numpy.arange(len(references))[::-1]
+    v=references[first]
+    vertices=pmx.create_bdef1_vertex_array(positions[v], normals[v],
+            uvs[first])
+    return vertices, indices.astype(numpy.int32), materials
+
+
+def mqo_to_pmx(mqo_model, name, scale=1.0):
+    """
+    return pymeshio.pmx.Model of the mesh. see create_mqo_vertex_array.
+
+    faces are read from the columns of mqo.FaceArray(vertex_layout="numpy"),
+    a mqo.Face list is converted to it first. edges, mirroring, vertex
+    colors and the smoothing angle(facet) are not converted. a default
+    material is added for the faces without a valid material.
+
+    requires numpy.
+
+    :Parameters:
+        mqo_model
+            pymeshio.mqo.Model
+        name
+            model name
+        scale
+            position scale
+    """
+    import numpy
+    dst=pmx.Model()
+    dst.name=name
+    dst.english_name=name
+    dst.vertices, dst.indices, materials=create_mqo_vertex_array(
+            mqo_model, scale)
+    triangle_counts=numpy.bincount(materials,
+            minlength=len(mqo_model.materials)+1)
+
+    textures={}
+    def get_texture_index(tex):
+        if not tex:
+            return -1
+        if tex not in textures:
+            textures[tex]=len(dst.textures)
+            dst.textures.append(tex.decode("cp932"))
+        return textures[tex]
+
+    def create_material(m, vertex_count):
+        color=m.color
+        return pmx.Material(m.name.decode("cp932")
+                , m.name.decode("cp932")
+                , common.RGB(color.r*m.diffuse, color.g*m.diffuse,
+                    color.b*m.diffuse)
+                , color.a
+                , m.power
+                , common.RGB(m.specular, m.specular, m.specular)
+                , common.RGB(color.r*m.ambient, color.g*m.ambient,
+                    color.b*m.ambient)
+                , 0
+                , common.RGBA(0, 0, 0, 1)
+                , 0
+                , get_texture_index(m.tex)
+                , -1
+                , pmx.MATERIALSPHERE_NONE
+                , 1
+                , 0
+                , u""
+                , vertex_count
+                )
+
+    dst.materials=[create_material(m, int(triangle_count)*3)
+            for m, triangle_count in zip(mqo_model.materials,
+                triangle_counts)]
+    if triangle_counts[-1]:
+        dst.materials.append(create_material(mqo.Material(b"default"),
+            int(triangle_counts[-1])*3))
+    return dst
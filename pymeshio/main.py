@@ -6,6 +6,12 @@
 import sys
 import os
 import io
+import glob
+import json
+import time
+import signal
+import argparse
+import concurrent.futures
 from .pmd import reader
 from .pmx import writer
 from . import converter
@@ -46,3 +52,273 @@ def pmd_validator():
     print("rigidbodies: %d" % len(pmd.rigidbodies))
     print("joints: %d" % len(pmd.joints))
 
+
+
+# seconds the parent waits after the timeout for the worker to report it
+TIMEOUT_GRACE=1.0
+# ProcessPoolExecutor limit on windows
+MAX_WORKERS=61
+
+
+class ConvertTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise ConvertTimeout("timeout")
+
+
+def convert_pmd_to_pmx(src, dst, timeout=None):
+    """
+    convert a pmd file to a pmx file in a worker process.
+    never raises. return a summary dict with per stage timings(seconds).
+
+    where SIGALRM is available the worker stops itself at the timeout and
+    reports the stage. convert_batch enforces the timeout from the parent
+    on every platform.
+
+    the pmx is written to a temporary file and renamed, so that an
+    interrupted conversion does not leave an output newer than the input.
+    """
+    result={"src": src, "dst": dst, "status": "converted", "error": None,
+            "timings": {}}
+    timings=result["timings"]
+    use_alarm=bool(timeout) and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    stage="read"
+    try:
+        start=time.perf_counter()
+        pmd=reader.read_from_file(src)
+        timings["read"]=time.perf_counter()-start
+
+        stage="convert"
+        start=time.perf_counter()
+        pmx=converter.pmd_to_pmx(pmd)
+        timings["convert"]=time.perf_counter()-start
+
+        stage="write"
+        start=time.perf_counter()
+        directory=os.path.dirname(dst)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        tmp=dst+".tmp"
+        try:
+            with io.open(tmp, "wb") as f:
+                writer.write(f, pmx)
+            os.replace(tmp, dst)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        timings["write"]=time.perf_counter()-start
+    except ConvertTimeout:
+        result["status"]="timeout"
+        result["error"]="timeout in {0} after {1}s".format(stage, timeout)
+    except Exception as e:
+        result["status"]="failed"
+        result["error"]="{0}: {1}: {2}".format(
+                stage, e.__class__.__name__, e)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return result
+
+
+def find_pmd_files(inputs, output_dir=None):
+    """
+    return [(pmd path, pmx path)] of directories(searched recursively),
+    glob patterns and files.
+
+    with output_dir the layout under an input directory is kept, else the
+    pmx is placed beside the pmd.
+    """
+    pairs=[]
+    seen=set()
+    def add(src, relative):
+        src=os.path.normpath(src)
+        if src in seen:
+            return
+        seen.add(src)
+        base=os.path.splitext(relative)[0]+".pmx"
+        if output_dir:
+            dst=os.path.join(output_dir, base)
+        else:
+            dst=os.path.splitext(src)[0]+".pmx"
+        pairs.append((src, dst))
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for root, dirs, files in os.walk(pattern):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(".pmd"):
+                        src=os.path.join(root, name)
+                        add(src, os.path.relpath(src, pattern))
+        elif os.path.isfile(pattern):
+            add(pattern, os.path.basename(pattern))
+        else:
+            for src in sorted(glob.glob(pattern, recursive=True)):
+                if os.path.isfile(src):
+                    add(src, os.path.basename(src))
+    return pairs
+
+
+def is_up_to_date(src, dst):
+    return (os.path.exists(dst)
+            and os.path.getmtime(dst)>=os.path.getmtime(src))
+
+
+def _timeout_result(src, dst, timeout):
+    return {"src": src, "dst": dst, "status": "timeout",
+            "error": "timeout after {0}s".format(timeout), "timings": {}}
+
+
+def _terminate_workers(executor):
+    """
+    kill the worker processes of executor. return False if they could not
+    be reached, then the hung workers are left to finish by themselves.
+
+    ProcessPoolExecutor has no public way to stop a running task before
+    python 3.14(terminate_workers). older versions fall back to the
+    private {pid: Process} dict of CPython, which may not exist elsewhere.
+    """
+    terminate=getattr(executor, "terminate_workers", None)
+    if terminate is not None:
+        terminate()
+        return True
+    processes=getattr(executor, "_processes", None)
+    if processes is None:
+        return False
+    for process in list(processes.values()):
+        process.terminate()
+    return True
+
+
+def _convert_in_pool(pending, workers, timeout, results):
+    """
+    convert [(pmd path, pmx path)] in one process pool, appending the file
+    summaries to results.
+
+    at most workers files are submitted at once, so a file starts running
+    when it is submitted and its deadline is counted from there. a file
+    over the deadline is recorded as timeout and the pool is killed, since
+    a running task can not be cancelled.
+
+    return ([(pmd path, pmx path, error)] of a broken pool,
+    [(pmd path, pmx path)] stopped or not started) to run in a new pool.
+    """
+    queue=list(pending)
+    running={}
+    broken=[]
+    hung=False
+    executor=concurrent.futures.ProcessPoolExecutor(workers)
+    try:
+        while queue or running:
+            while queue and len(running)<workers and not broken:
+                src, dst=queue.pop(0)
+                deadline=(time.monotonic()+timeout+TIMEOUT_GRACE
+                        if timeout else None)
+                future=executor.submit(convert_pmd_to_pmx, src, dst, timeout)
+                running[future]=(src, dst, deadline)
+            if not running:
+                break
+            wait=None
+            if timeout:
+                wait=max(0, min(deadline for _, _, deadline
+                    in running.values())-time.monotonic())
+            done, _=concurrent.futures.wait(running, wait,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                src, dst, _=running.pop(future)
+                try:
+                    results.append(future.result())
+                except concurrent.futures.process.BrokenProcessPool as e:
+                    broken.append((src, dst, e))
+            now=time.monotonic()
+            expired=[future for future, (_, _, deadline) in running.items()
+                    if deadline is not None and deadline<=now]
+            if expired:
+                for future in expired:
+                    src, dst, _=running.pop(future)
+                    results.append(_timeout_result(src, dst, timeout))
+                hung=not _terminate_workers(executor)
+                return broken, [(src, dst) for src, dst, _
+                        in running.values()]+queue
+        return broken, queue
+    finally:
+        executor.shutdown(wait=not hung)
+
+
+def convert_batch(pairs, jobs=None, timeout=None, force=False):
+    """
+    convert [(pmd path, pmx path)] in a process pool. return the summary
+    dict.
+
+    a failure of a file(parse error, timeout or a crashed worker) is
+    recorded in the summary and does not stop the other files.
+    """
+    start=time.perf_counter()
+    results=[]
+    pending=[]
+    for src, dst in pairs:
+        if not force and is_up_to_date(src, dst):
+            results.append({"src": src, "dst": dst, "status": "skipped",
+                "error": None, "timings": {}})
+        else:
+            pending.append((src, dst))
+
+    jobs=jobs or min(os.cpu_count() or 1, MAX_WORKERS)
+    workers=jobs
+    while pending:
+        # a crashed worker breaks the pool and every running file. retry
+        # them in a single worker pool, where the first broken file is the
+        # one that crashed
+        broken, rest=_convert_in_pool(pending, workers, timeout, results)
+        if broken and workers==1:
+            src, dst, e=broken.pop(0)
+            results.append({"src": src, "dst": dst, "status": "failed",
+                "error": "worker crashed: {0}".format(e), "timings": {}})
+            workers=jobs
+        elif broken:
+            workers=1
+        pending=[(src, dst) for src, dst, _ in broken]+rest
+
+    summary={
+            "total": len(results),
+            "elapsed": time.perf_counter()-start,
+            "stages": {},
+            "files": sorted(results, key=lambda r: r["src"]),
+            }
+    for status in ("converted", "skipped", "failed", "timeout"):
+        summary[status]=sum(1 for r in results if r["status"]==status)
+    for stage in ("read", "convert", "write"):
+        summary["stages"][stage]=sum(r["timings"].get(stage, 0)
+                for r in results)
+    return summary
+
+
+def pmd_to_pmx_batch(argv=None):
+    parser=argparse.ArgumentParser(
+            description="convert pmd files to pmx in parallel")
+    parser.add_argument("inputs", nargs="+",
+            help="pmd files, directories or glob patterns")
+    parser.add_argument("-o", "--output", help="output directory")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+            help="worker processes(default: cpu count)")
+    parser.add_argument("-t", "--timeout", type=float, default=None,
+            help="per file timeout in seconds")
+    parser.add_argument("-f", "--force", action="store_true",
+            help="convert even if the pmx is newer than the pmd")
+    parser.add_argument("-s", "--summary",
+            help="write the json summary to this path(default: stdout)")
+    args=parser.parse_args(argv)
+
+    summary=convert_batch(find_pmd_files(args.inputs, args.output),
+            args.jobs, args.timeout, args.force)
+    text=json.dumps(summary, indent=2, ensure_ascii=False)
+    if args.summary:
+        with io.open(args.summary, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 1 if summary["failed"] or summary["timeout"] else 0
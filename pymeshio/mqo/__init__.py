@@ -122,9 +122,9 @@ class Obj(object):
         color_type:
         mirror: mirroring
         mirror_axis:
-        vertices:
-        faces:
-        edges:
+        vertices: common.Vector3 list. float32 Nx3 of vertex_layout="numpy"
+        faces: mqo.Face list. mqo.FaceArray of vertex_layout="numpy"
+        edges: mqo.Face list. mqo.FaceArray of vertex_layout="numpy"
         smoothing:
     """
     __slots__=["name", "depth", "folding", 
@@ -233,6 +233,106 @@ class Face(object):
     def getUV(self, i): return self.uv[i] if i<len(self.uv) else common.Vector2(0, 0)
 
 
+class FaceArray(object):
+    """mqo face array
+
+    the face chunk of an object as flat corner arrays, read by
+    vertex_layout="numpy". indexing returns a mqo.Face.
+
+    Attributes:
+        sizes: int64 F. corner count of each face
+        starts: int64 F. first corner of each face
+        indices: int64 C. vertex index of each corner
+        material_indices: int64 F. 0 if the face has no M
+        uvs: float32 Cx2. 0 if the face has no UV
+        colors: uint32 C. packed as COL(R in the lowest byte).
+            0xFFFFFFFF if the face has no COL
+        has_colors: bool F. the face has COL
+    """
+    __slots__=[
+            "sizes", "starts",
+            "indices", "material_indices", "uvs", "colors", "has_colors",
+            ]
+    def __init__(self, sizes, indices, material_indices, uvs, colors,
+            has_colors):
+        import numpy
+        self.sizes=sizes
+        self.starts=numpy.cumsum(sizes)-sizes
+        self.indices=indices
+        self.material_indices=material_indices
+        self.uvs=uvs
+        self.colors=colors
+        self.has_colors=has_colors
+
+    def __str__(self):
+        return "<mqo.FaceArray %d faces>" % len(self)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        if index<0:
+            index+=len(self)
+        start=self.starts[index]
+        end=start+self.sizes[index]
+        face=Face(int(self.sizes[index]), b"")
+        face.indices=self.indices[start:end].tolist()
+        face.material_index=int(self.material_indices[index])
+        face.uv=[common.Vector2(u, v) for u, v in self.uvs[start:end].tolist()]
+        if self.has_colors[index]:
+            for d in self.colors[start:end].tolist():
+                face.col+=[d & 0xFF, d>>8 & 0xFF, d>>16 & 0xFF, d>>24 & 0xFF]
+        return face
+
+    def select(self, face_mask):
+        """
+        return a FaceArray of the faces where face_mask is True.
+        """
+        import numpy
+        corner_mask=numpy.repeat(face_mask, self.sizes)
+        return FaceArray(self.sizes[face_mask], self.indices[corner_mask],
+                self.material_indices[face_mask], self.uvs[corner_mask],
+                self.colors[corner_mask], self.has_colors[face_mask])
+
+    def get_triangles(self):
+        """
+        return corner indices(int64 Tx3) of the faces triangulated as fans.
+        """
+        from .. import arraymath
+        return arraymath.triangulate_fans(self.starts, self.sizes)
+
+
+def create_face_array(faces):
+    """
+    create mqo.FaceArray from mqo.Face list. FaceArray is returned as is.
+
+    requires numpy.
+    """
+    if isinstance(faces, FaceArray):
+        return faces
+    import numpy
+    sizes=numpy.array([f.index_count for f in faces], numpy.int64)
+    indices=numpy.array([i for f in faces for i in f.indices[:f.index_count]],
+            numpy.int64)
+    uvs=numpy.array([(uv.x, uv.y) for f in faces
+        for uv in (f.uv+[common.Vector2(0, 0)]*f.index_count)[:f.index_count]],
+        numpy.float32).reshape(-1, 2)
+    colors=numpy.full(len(indices), 0xFFFFFFFF, numpy.uint32)
+    i=0
+    for f in faces:
+        for k in range(min(len(f.col)//4, f.index_count)):
+            r, g, b, a=f.col[k*4:k*4+4]
+            colors[i+k]=r | g<<8 | b<<16 | a<<24
+        i+=f.index_count
+    return FaceArray(sizes, indices,
+            numpy.array([f.material_index for f in faces], numpy.int64),
+            uvs, colors, numpy.array([len(f.col)>0 for f in faces], bool))
+
+
 class Model(object):
     def __init__(self):
         self.has_mikoto=False
@@ -1,21 +1,107 @@
 # coding: utf-8
 """
 mqo reader
+
+vertex_layout="numpy" slices each vertex and face chunk out of the file
+content and parses it at once, so no object is created per vertex or face.
 """
 import io
+import re
 from .. import mqo
 from .. import common
 
 
+# face line fields in the order written by metasequoia
+FACE_PATTERN=re.compile(br"^[ \t]*(\d+)[ \t]+V\(([^)]*)\)"
+        br"(?:[ \t]+M\(([^)]*)\))?"
+        br"(?:[ \t]+UV\(([^)]*)\))?"
+        br"(?:[ \t]+COL\(([^)]*)\))?", re.M)
+FACE_KEYS=(b"M", b"UV", b"COL")
+# one key in any order. a missing key gives an empty group
+FACE_KEY_PATTERNS=dict((key, re.compile(
+    br"^[ \t]*\d+(?:[^\n]*?[ \t]"+key+br"\(([^)]*)\))?", re.M))
+    for key in FACE_KEYS)
+
+
+def parse_vertices(chunk):
+    """
+    return float32 Nx3 of the vertex chunk.
+    """
+    import numpy
+    values=numpy.fromstring(chunk, numpy.float32, sep=" ")
+    if len(values)%3!=0:
+        raise common.ParseException(
+                "invalid vertex chunk: {0} values".format(len(values)))
+    return values.reshape(-1, 3)
+
+
+def parse_faces(chunk):
+    """
+    return mqo.FaceArray of the face chunk.
+    """
+    import numpy
+
+    def parse_column(fields, dtype):
+        return numpy.fromstring(b" ".join(fields), dtype, sep=" ")
+
+    faces=FACE_PATTERN.findall(chunk)
+    sizes=parse_column([face[0] for face in faces], numpy.int64)
+    indices=parse_column([face[1] for face in faces], numpy.int64)
+    corner_count=int(sizes.sum())
+    if len(indices)!=corner_count:
+        raise common.ParseException(
+                "invalid face chunk: {0} indices for {1} corners".format(
+                    len(indices), corner_count))
+
+    def parse_key(k, default, dtype, count):
+        """
+        return the values of the key and bool F of the faces with the key.
+        """
+        key=FACE_KEYS[k]
+        fields=[face[2+k] for face in faces]
+        if chunk.count(key+b"(")!=len(fields)-fields.count(b""):
+            # not in the written order
+            fields=FACE_KEY_PATTERNS[key].findall(chunk)
+            if len(fields)!=len(faces):
+                raise common.ParseException(
+                        "invalid face chunk: {0} lines".format(len(fields)))
+        present=numpy.fromiter(map(bool, fields), bool, len(fields))
+        if not present.all():
+            # default(size) of the faces without the key
+            fields=[field or default(size)
+                    for field, size in zip(fields, sizes.tolist())]
+        values=parse_column(fields, dtype)
+        if len(values)!=count:
+            raise common.ParseException(
+                    "invalid face chunk: {0} {1} values".format(
+                        len(values), key.decode("ascii")))
+        return values, present
+
+    material_indices, _=parse_key(0, lambda size: b"0", numpy.int64,
+            len(faces))
+    uvs, _=parse_key(1, lambda size: b" 0"*(2*size), numpy.float32,
+            corner_count*2)
+    colors, has_colors=parse_key(2, lambda size: b" 4294967295"*size,
+            numpy.int64, corner_count)
+    return mqo.FaceArray(sizes, indices, material_indices, uvs.reshape(-1, 2),
+            colors.astype(numpy.uint32), has_colors)
+
+
 class Reader(common.TextReader):
     """mqo reader
     """
     __slots__=[
             "has_mikoto",
             "materials", "objects",
+            "vertex_layout", "data",
             ]
-    def __init__(self, ios):
+    def __init__(self, ios, vertex_layout="object"):
         super(Reader, self).__init__(ios)
+        self.vertex_layout=vertex_layout
+        if vertex_layout=="numpy":
+            # chunks are sliced from the content
+            self.data=ios.read()
+            self.ios=io.BytesIO(self.data)
 
     def __str__(self):
         return "<MQO %d lines, %d materials, %d objects>" % (
@@ -56,7 +142,33 @@ class Reader(common.TextReader):
         self.printError("readObject", "invalid eof")
         return False
 
+    def readChunkData(self):
+        """
+        return the bytes to the closing brace of the chunk and skip them.
+        None if eof.
+        """
+        start=self.ios.tell()
+        end=self.data.find(b"}", start)
+        if end==-1:
+            return None
+        chunk=self.data[start:end]
+        self.lines+=chunk.count(b"\n")
+        self.ios.seek(end)
+        # the brace line
+        self.getline()
+        return chunk
+
     def readFace(self, obj):
+        if self.vertex_layout=="numpy":
+            chunk=self.readChunkData()
+            if chunk is None:
+                self.printError("readFace", "invalid eof")
+                return False
+            faces=parse_faces(chunk)
+            is_edge=faces.sizes==2
+            obj.faces=faces.select(~is_edge)
+            obj.edges=faces.select(is_edge)
+            return True
         while(True):
             line=self.getline()
             if line==None:
@@ -81,6 +193,13 @@ class Reader(common.TextReader):
         return False
 
     def readVertex(self, obj):
+        if self.vertex_layout=="numpy":
+            chunk=self.readChunkData()
+            if chunk is None:
+                self.printError("readVertex", "invalid eof")
+                return False
+            obj.vertices=parse_vertices(chunk)
+            return True
         while(True):
             line=self.getline()
             if line==None:
@@ -203,26 +322,36 @@ class Reader(common.TextReader):
         raise ParseException("invalid eof")
 
 
-def read_from_file(path):
+def read_from_file(path, vertex_layout="object"):
     """
     read from file path, then return the pymeshio.mqo.Model.
 
     :Parameters:
       path
         file path
+      vertex_layout
+        see read
     """
     with io.open(path, 'rb') as ios:
-        return read(ios)
+        return read(ios, vertex_layout)
 
 
-def read(ios):
+def read(ios, vertex_layout="object"):
     """
     read from ios, then return the pymeshio.mqo.Model.
 
     :Parameters:
       ios
         input stream (in io.IOBase)
+      vertex_layout
+        "object": vertices are common.Vector3 lists and faces are mqo.Face
+        lists.
+        "numpy": vertices are float32 Nx3 and faces, edges are
+        mqo.FaceArray(requires numpy). faces may have more than 4
+        corners.
     """
     assert(isinstance(ios, io.IOBase))
-    return Reader(ios).read()
+    if vertex_layout not in ("object", "numpy"):
+        raise ValueError("unknown vertex_layout: {0}".format(vertex_layout))
+    return Reader(ios, vertex_layout).read()
 
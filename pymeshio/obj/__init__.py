@@ -14,6 +14,83 @@ class Face(object):
             ))
 
 
+class FaceArray(object):
+    """
+    columnar faces(numpy arrays). read by vertex_layout="numpy".
+
+    indexing returns an obj.Face.
+
+    :IVariables:
+        references
+            int64 Cx3. 0 based (v, vt, vn) index of each corner. -1 is
+            missing
+        sizes
+            int64 F. corner count of each face
+        starts
+            int64 F. first corner of each face
+    """
+    __slots__=[
+            "references",
+            "sizes",
+            "starts",
+            ]
+    def __init__(self, references, sizes):
+        import numpy
+        self.references=references
+        self.sizes=sizes
+        self.starts=numpy.cumsum(sizes)-sizes
+
+    def __str__(self):
+        return "<obj.FaceArray {0}faces>".format(len(self))
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        if index<0:
+            index+=len(self)
+        face=Face()
+        start=self.starts[index]
+        for reference in self.references[start:start+self.sizes[index]
+                ].tolist():
+            # 1 based, None is missing as the object layout
+            face.vertex_references.append(
+                    [(i+1 if i>=0 else None) for i in reference])
+        return face
+
+    def get_triangles(self):
+        """
+        return corner indices(int64 Tx3) of the faces triangulated as fans.
+        """
+        from .. import arraymath
+        return arraymath.triangulate_fans(self.starts, self.sizes)
+
+
+def create_face_array(faces):
+    """
+    create obj.FaceArray from obj.Face list. FaceArray is returned as is.
+
+    requires numpy.
+    """
+    if isinstance(faces, FaceArray):
+        return faces
+    import numpy
+    sizes=numpy.array([len(f.vertex_references) for f in faces], numpy.int64)
+    references=numpy.full((int(sizes.sum()), 3), -1, numpy.int64)
+    i=0
+    for f in faces:
+        for reference in f.vertex_references:
+            for k, index in enumerate(reference[:3]):
+                if index:
+                    references[i, k]=index-1
+            i+=1
+    return FaceArray(references, sizes)
+
+
 class Material(object):
     __slots__=[
             "name",
@@ -42,6 +119,20 @@ class Material(object):
 
 
 class Model(object):
+    """
+    obj model
+
+    :IVariables:
+        vertices
+            Vector3 list, or float32 Nx3 by vertex_layout="numpy"
+        uv
+            Vector2 list, or float32 Nx2 by vertex_layout="numpy"
+        normals
+            Vector3 list, or float32 Nx3 by vertex_layout="numpy"
+        materials
+            material list. faces of a material are a obj.Face list, or
+            obj.FaceArray by vertex_layout="numpy"
+    """
     __slots__=[
             "path",
             "comment",
@@ -79,7 +170,7 @@ class Model(object):
     def add_vt(self, vt):
         if len(self.uv)==0:
             self.order.append("vt")
-        self.uv.append(v)
+        self.uv.append(vt)
 
     def add_vn(self, vn):
         if len(self.normals)==0:
@@ -1,6 +1,10 @@
 # coding: utf-8
 """
 obj reader
+
+vertex_layout="numpy" reads the coordinates and faces in bulk. lines are
+only classified by the first token, then each kind is joined and parsed
+by numpy at once.
 """
 import io
 import os
@@ -79,16 +83,215 @@ class Reader(common.TextReader):
         return face
 
 
-def read_from_file(path):
+# line kinds of read_numpy
+LINE_OTHER=0
+LINE_V=1
+LINE_VT=2
+LINE_VN=3
+LINE_F=4
+# (kind, key) of the lines parsed in bulk
+BULK_KEYS=[
+        (LINE_V, b"v"),
+        (LINE_VT, b"vt"),
+        (LINE_VN, b"vn"),
+        (LINE_F, b"f"),
+        ]
+
+
+def classify_lines(buffer):
+    """
+    return (starts, ends, kinds) of the lines of a uint8 buffer. a kind is
+    decided by the first two bytes. ends exclude the newline.
+    """
+    import numpy
+    newlines=numpy.flatnonzero(buffer==10)
+    starts=numpy.concatenate([[0], newlines+1])
+    ends=numpy.concatenate([newlines, [len(buffer)]])
+    padded=numpy.concatenate([buffer, numpy.zeros(3, numpy.uint8)])
+    c0=padded[starts]
+    c1=padded[starts+1]
+    c2=padded[starts+2]
+    def is_space(c):
+        return (c==32) | (c==9)
+    kinds=numpy.full(len(starts), LINE_OTHER, numpy.int8)
+    kinds[(c0==ord("v")) & is_space(c1)]=LINE_V
+    kinds[(c0==ord("v")) & (c1==ord("t")) & is_space(c2)]=LINE_VT
+    kinds[(c0==ord("v")) & (c1==ord("n")) & is_space(c2)]=LINE_VN
+    kinds[(c0==ord("f")) & is_space(c1)]=LINE_F
+    return starts, ends, kinds
+
+
+def parse_floats(chunks, count, width):
+    """
+    return float32 count x width of the coordinate text chunks(lines
+    without the key). extra values(such as w) are dropped.
+    """
+    import numpy
+    if count==0:
+        return numpy.zeros((0, width), numpy.float32)
+    text=b"\n".join(chunks)
+    values=numpy.fromstring(text, numpy.float64, sep=" ")
+    if len(values)%count==0 and len(values)//count>=width:
+        values=values.reshape(count, -1)
+        if (count_tokens(text)==values.shape[1]).all():
+            return values[:, :width].astype(numpy.float32)
+    # a different value count on some lines
+    try:
+        return numpy.array([[float(t) for t in line.split()[:width]]
+            for line in text.split(b"\n")], numpy.float32).reshape(
+                    count, width)
+    except ValueError as e:
+        raise common.ParseException("invalid coordinate: {0}".format(e))
+
+
+def count_tokens(text):
+    """
+    return int64 token count of each line of text.
+    """
+    import numpy
+    buffer=numpy.frombuffer(text+b"\n", numpy.uint8)
+    separator=buffer<=32
+    # a token starts at a non separator after a separator
+    token_starts=numpy.flatnonzero(~separator[1:] & separator[:-1])+1
+    if len(buffer) and not separator[0]:
+        token_starts=numpy.concatenate([[0], token_starts])
+    newlines=numpy.flatnonzero(buffer==10)
+    return numpy.diff(numpy.concatenate([[0],
+        numpy.searchsorted(token_starts, newlines)]))
+
+
+def parse_faces(chunks, counts):
+    """
+    return (references int64 Cx3, sizes int64 F) of the face text chunks
+    (lines without the key). counts is the (v, vt, vn) count before the
+    faces to resolve negative indices.
+    """
+    import numpy
+    text=b"\n".join(chunks)
+    sizes=count_tokens(text)
+    corner_count=int(sizes.sum())
+    first=text.split(None, 1)[0] if corner_count else b""
+    width=first.count(b"/")+1
+    values=numpy.fromstring(text.replace(b"//", b"/0/").replace(b"/", b" "),
+            numpy.int64, sep=" ")
+    if len(values)==corner_count*width and 1<=width<=3:
+        references=numpy.zeros((corner_count, 3), numpy.int64)
+        references[:, :width]=values.reshape(-1, width)
+    else:
+        # mixed reference formats
+        references=numpy.zeros((corner_count, 3), numpy.int64)
+        i=0
+        try:
+            for corner in text.split():
+                for k, t in enumerate(corner.split(b"/")[:3]):
+                    if t:
+                        references[i, k]=int(t)
+                i+=1
+        except ValueError as e:
+            raise common.ParseException("invalid face: {0}".format(e))
+    # 1 based, negative is relative to the end, 0 is missing
+    counts=numpy.array(counts, numpy.int64)
+    references=numpy.where(references>0, references-1,
+            numpy.where(references<0, references+counts, -1))
+    if (references<-1).any():
+        raise common.ParseException("face index out of range")
+    return references, sizes
+
+
+def read_numpy(data):
+    """
+    read obj bytes into obj.Model of vertex_layout="numpy".
+
+    lines are classified with numpy. a run of v, vt, vn or f lines is
+    sliced as is, so only the other lines(usemtl, comments ...) are
+    handled one by one.
+    """
+    import numpy
+    model=obj.Model()
+    buffer=numpy.frombuffer(data, numpy.uint8)
+    starts, ends, kinds=classify_lines(buffer)
+    # runs of the same kind
+    boundaries=numpy.flatnonzero(numpy.diff(kinds))+1
+    run_starts=numpy.concatenate([[0], boundaries]).tolist()
+    run_ends=numpy.concatenate([boundaries, [len(kinds)]]).tolist()
+
+    # text chunks and line count of each kind
+    chunks=dict((kind, []) for kind, _ in BULK_KEYS)
+    counts=dict((kind, 0) for kind, _ in BULK_KEYS)
+    keys=dict(BULK_KEYS)
+    def add_chunk(kind, text, line_count):
+        if kind==LINE_F:
+            # (material, (v, vt, vn) count, text)
+            chunks[kind].append((material, (counts[LINE_V],
+                counts[LINE_VT], counts[LINE_VN]), text))
+        else:
+            chunks[kind].append(text)
+        counts[kind]+=line_count
+
+    material=model.get_or_create_material(b"default")
+    for begin, end in zip(run_starts, run_ends):
+        kind=kinds[begin]
+        if kind!=LINE_OTHER:
+            key=keys[kind]
+            text=data[starts[begin]:ends[end-1]]
+            # drop the keys. a key letter never appears in a number
+            add_chunk(kind, text.replace(key, b" "*len(key)), end-begin)
+            continue
+        for line in range(begin, end):
+            token=data[starts[line]:ends[line]].split(None, 1)
+            if not token:
+                continue
+            key=token[0]
+            if key[0]==ord("#"):
+                if not model.comment:
+                    model.comment=data[starts[line]:ends[line]].strip(
+                            )[1:].strip()
+            elif key==b"mtllib":
+                model.mtl=token[1].strip()
+            elif key==b"usemtl":
+                material=model.get_or_create_material(token[1].strip())
+            elif key==b"s":
+                material.s=token[1].strip()
+            else:
+                # with leading spaces
+                for kind, bulk_key in BULK_KEYS:
+                    if key==bulk_key and len(token)>1:
+                        add_chunk(kind, token[1], 1)
+
+    model.vertices=parse_floats(chunks[LINE_V], counts[LINE_V], 3)
+    model.uv=parse_floats(chunks[LINE_VT], counts[LINE_VT], 2)
+    model.normals=parse_floats(chunks[LINE_VN], counts[LINE_VN], 3)
+    totals=numpy.array([counts[LINE_V], counts[LINE_VT], counts[LINE_VN]])
+    model.order=[name for name, kind in (
+        ("v", LINE_V), ("vt", LINE_VT), ("vn", LINE_VN)) if counts[kind]]
+    for m in model.materials:
+        parsed=[parse_faces([text], face_counts)
+                for material, face_counts, text in chunks[LINE_F]
+                if material is m]
+        m.faces=obj.FaceArray(
+                numpy.concatenate([r for r, _ in parsed]
+                    +[numpy.zeros((0, 3), numpy.int64)]),
+                numpy.concatenate([sizes for _, sizes in parsed]
+                    +[numpy.zeros(0, numpy.int64)]))
+        if (m.faces.references>=totals).any():
+            raise common.ParseException("face index out of range")
+    if len(model.materials[0].faces)==0:
+        del model.materials[0]
+    return model
+
+
+def read_from_file(path, vertex_layout="object"):
     """
-    read from file path, then return the pymeshio.mqo.Model.
+    read from file path, then return the pymeshio.obj.Model.
 
     :Parameters:
       path
         file path
+      vertex_layout
+        see read
     """
     with io.open(path, 'rb') as ios:
-        model=read(ios)
+        model=read(ios, vertex_layout)
         if model:
             model.path=path
             if model.mtl:
@@ -97,19 +300,32 @@ def read_from_file(path):
                     obj_dir, model.mtl.decode("utf-8"))
                 #print(path)
                 material_from_file(path, model)
+                if vertex_layout=="numpy":
+                    # materials without faces in the obj
+                    for m in model.materials:
+                        m.faces=obj.create_face_array(m.faces)
             return model
 
 
-def read(ios):
+def read(ios, vertex_layout="object"):
     """
-    read from ios, then return the pymeshio.mqo.Model.
+    read from ios, then return the pymeshio.obj.Model.
 
     :Parameters:
       ios
         input stream (in io.IOBase)
+      vertex_layout
+        "object": vertices, uv and normals are lists of common.Vector3
+        and common.Vector2, faces are obj.Face lists.
+        "numpy": vertices, uv and normals are float32 arrays and faces are
+        obj.FaceArray(requires numpy).
     """
     assert(isinstance(ios, io.IOBase))
-    return Reader(ios).read()
+    if vertex_layout=="numpy":
+        return read_numpy(ios.read())
+    elif vertex_layout=="object":
+        return Reader(ios).read()
+    raise ValueError("unknown vertex_layout: {0}".format(vertex_layout))
 
 
 class MaterialReader(common.TextReader):
@@ -91,6 +91,136 @@ class Vertex(common.Diff):
             assert(False)
 
 
+# numpy dtype of the 38 bytes vertex record
+VERTEX_DTYPE=[
+        ('pos', '<f4', (3,)),
+        ('normal', '<f4', (3,)),
+        ('uv', '<f4', (2,)),
+        ('bone0', '<u2'),
+        ('bone1', '<u2'),
+        ('weight0', 'u1'),
+        ('edge_flag', 'u1'),
+        ]
+
+
+class VertexArray(object):
+    """
+    ================
+    pmd vertex array
+    ================
+    columnar vertices(numpy arrays). read by vertex_layout="numpy".
+
+    indexing returns a pmd.Vertex and slicing returns a VertexArray of
+    the sliced records, so the array can be used like the vertex list.
+
+    :IVariables:
+        records
+            structured array of VERTEX_DTYPE
+        positions
+            float32 Nx3
+        normals
+            float32 Nx3
+        uvs
+            float32 Nx2
+        bone0
+            uint16 N
+        bone1
+            uint16 N
+        weight0
+            uint8 N.  min: 0, max: 100
+        edge_flags
+            uint8 N
+    """
+    __slots__=[
+            'records',
+            'positions',
+            'normals',
+            'uvs',
+            'bone0',
+            'bone1',
+            'weight0',
+            'edge_flags',
+            ]
+    def __init__(self, records):
+        self.records=records
+        self.positions=records['pos']
+        self.normals=records['normal']
+        self.uvs=records['uv']
+        self.bone0=records['bone0']
+        self.bone1=records['bone1']
+        self.weight0=records['weight0']
+        self.edge_flags=records['edge_flag']
+
+    def __str__(self):
+        return "<pmd.VertexArray {0}vertices>".format(len(self))
+
+    def __eq__(self, rhs):
+        if not isinstance(rhs, VertexArray):
+            if not isinstance(rhs, (list, tuple)):
+                return NotImplemented
+            return self.tolist()==list(rhs)
+        import numpy
+        return all(numpy.array_equal(getattr(self, key), getattr(rhs, key))
+                for key in self.__slots__[1:])
+
+    def __ne__(self, rhs):
+        return not self.__eq__(rhs)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return VertexArray(self.records[index])
+        if index<0:
+            index+=len(self)
+        return Vertex(
+                common.Vector3(*self.positions[index].tolist()),
+                common.Vector3(*self.normals[index].tolist()),
+                common.Vector2(*self.uvs[index].tolist()),
+                int(self.bone0[index]),
+                int(self.bone1[index]),
+                int(self.weight0[index]),
+                int(self.edge_flags[index]))
+
+    def tolist(self):
+        """
+        return the pmd.Vertex list. faster than indexing one by one.
+        """
+        Vector2=common.Vector2
+        Vector3=common.Vector3
+        return [Vertex(Vector3(*pos), Vector3(*normal), Vector2(*uv),
+            bone0, bone1, weight0, edge_flag)
+            for pos, normal, uv, bone0, bone1, weight0, edge_flag in zip(
+                self.positions.tolist(), self.normals.tolist(),
+                self.uvs.tolist(), self.bone0.tolist(), self.bone1.tolist(),
+                self.weight0.tolist(), self.edge_flags.tolist())]
+
+
+def create_vertex_array(vertices):
+    """
+    create pmd.VertexArray from pmd.Vertex list. VertexArray is returned as is.
+
+    requires numpy.
+    """
+    if isinstance(vertices, VertexArray):
+        return vertices
+    import numpy
+    records=numpy.zeros(len(vertices), VERTEX_DTYPE)
+    records['pos']=[(v.pos.x, v.pos.y, v.pos.z) for v in vertices]
+    records['normal']=[(v.normal.x, v.normal.y, v.normal.z) for v in vertices]
+    records['uv']=[(v.uv.x, v.uv.y) for v in vertices]
+    records['bone0']=[v.bone0 for v in vertices]
+    records['bone1']=[v.bone1 for v in vertices]
+    records['weight0']=[v.weight0 for v in vertices]
+    records['edge_flag']=[v.edge_flag for v in vertices]
+    return VertexArray(records)
+
+
 class Material(common.Diff):
     """
     ============
@@ -441,7 +571,7 @@ class Morph(common.Diff):
         return (
                 self.name==rhs.name
                 and self.type==rhs.type
-                and self.indices==rhs.indices
+                and common.sequence_equal(self.indices, rhs.indices)
                 and self.pos_list==rhs.pos_list
                 and self.english_name==rhs.english_name
                 and self.vertex_count==rhs.vertex_count
@@ -680,7 +810,7 @@ class Model(common.Diff):
                 and self.english_name==rhs.english_name
                 and self.english_comment==rhs.english_comment
                 and self.vertices==rhs.vertices
-                and self.indices==rhs.indices
+                and common.sequence_equal(self.indices, rhs.indices)
                 and self.materials==rhs.materials
                 and self.bones==rhs.bones
                 and self.ik_list==rhs.ik_list
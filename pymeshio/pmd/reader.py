@@ -4,7 +4,20 @@ pmd reader
 """
 import io
 from .. import common
+from ..common import truncate_zero
 from .. import pmd
+from ..cache import get_cache
+
+
+# fused record structs
+VERTEX_STRUCT=common.get_struct("8fHHBB")
+MATERIAL_STRUCT=common.get_struct("3ff f3f3fbBI20s")
+BONE_STRUCT=common.get_struct("20sHHBH3f")
+IK_STRUCT=common.get_struct("HHBHf")
+MORPH_STRUCT=common.get_struct("20sIB")
+MORPH_OFFSET_STRUCT=common.get_struct("I3f")
+RIGIDBODY_STRUCT=common.get_struct("20shbhB9f5fB")
+JOINT_STRUCT=common.get_struct("20sII24f")
 
 
 class Reader(common.BinaryReader):
@@ -17,117 +30,162 @@ class Reader(common.BinaryReader):
     def read_text(self, size):
         """read cp932 text
         """
-        src=self.unpack("%ds" % size, size)
-        assert(type(src)==bytes)
-        pos = src.find(b"\x00")
-        if pos==-1:
-            return src
-        else:
-            return src[:pos]
+        return truncate_zero(self.read_bytes(size).tobytes())
 
     def read_vertex(self):
+        """
+        (38 bytes)
+        """
+        record=self.read_struct(VERTEX_STRUCT)
         return pmd.Vertex(
-                self.read_vector3(),
-                self.read_vector3(),
-                self.read_vector2(),
-                self.read_uint(2),
-                self.read_uint(2),
-                self.read_uint(1),
-                self.read_uint(1))
+                common.Vector3(*record[0:3]),
+                common.Vector3(*record[3:6]),
+                common.Vector2(*record[6:8]),
+                *record[8:12])
+
+    def read_vertices_numpy(self, vertex_count):
+        """
+        read vertex block into pmd.VertexArray.
+        """
+        return pmd.VertexArray(
+                self.read_numpy_array(pmd.VERTEX_DTYPE, vertex_count))
+
+    def skip_block(self, record_size, count):
+        """
+        skip count records. return (offset, count) of the block.
+        """
+        offset=self.tell()
+        self.skip(record_size*count)
+        return (offset, count)
+
+    def skip_morph(self):
+        """
+        read the morph header and skip the offsets. return (morph, (offset,
+        count) of the offsets).
+        """
+        name, morph_size, morph_type=self.read_struct(MORPH_STRUCT)
+        morph=pmd.Morph(truncate_zero(name))
+        morph.type = morph_type
+        return morph, self.skip_block(MORPH_OFFSET_STRUCT.size, morph_size)
 
     def read_material(self):
+        """
+        (70 bytes)
+        """
+        record=self.read_struct(MATERIAL_STRUCT)
         return pmd.Material(
-                diffuse_color=self.read_rgb(),
-                alpha=self.read_float(),
-                specular_factor=self.read_float(),
-                specular_color=self.read_rgb(),
-                ambient_color=self.read_rgb(),
-                toon_index=self.read_int(1),
-                edge_flag=self.read_uint(1),
-                vertex_count=self.read_uint(4),
-                texture_file=self.read_text(20)
+                diffuse_color=common.RGB(*record[0:3]),
+                alpha=record[3],
+                specular_factor=record[4],
+                specular_color=common.RGB(*record[5:8]),
+                ambient_color=common.RGB(*record[8:11]),
+                toon_index=record[11],
+                edge_flag=record[12],
+                vertex_count=record[13],
+                texture_file=truncate_zero(record[14])
                 )
 
     def read_bone(self):
-        name=self.read_text(20)
-        parent_index=self.read_uint(2)
-        tail_index=self.read_uint(2)
-        bone=pmd.createBone(name, self.read_uint(1))
+        """
+        (39 bytes)
+        """
+        (name, parent_index, tail_index, bone_type, ik_index, x, y, z
+                )=self.read_struct(BONE_STRUCT)
+        bone=pmd.createBone(truncate_zero(name), bone_type)
         bone.parent_index=parent_index
         bone.tail_index=tail_index
-        bone.ik_index = self.read_uint(2)
-        bone.pos = self.read_vector3()
+        bone.ik_index = ik_index
+        bone.pos = common.Vector3(x, y, z)
         return bone
 
     def read_ik(self):
-        ik=pmd.IK(self.read_uint(2), self.read_uint(2))
-        ik.length = self.read_uint(1)
-        ik.iterations = self.read_uint(2)
-        ik.weight = self.read_float()
-        ik.children=[self.read_uint(2) for _ in range(ik.length)]
+        index, target, length, iterations, weight=self.read_struct(IK_STRUCT)
+        ik=pmd.IK(index, target)
+        ik.length = length
+        ik.iterations = iterations
+        ik.weight = weight
+        ik.children=self.read_array("H", ik.length).tolist()
         return ik
 
     def read_morph(self):
-        morph=pmd.Morph(self.read_text(20))
-        morph_size = self.read_uint(4)
-        morph.type = self.read_uint(1)
-        for j in range(morph_size):
-            morph.indices.append(self.read_uint(4))
-            morph.pos_list.append(self.read_vector3())
+        name, morph_size, morph_type=self.read_struct(MORPH_STRUCT)
+        morph=pmd.Morph(truncate_zero(name))
+        morph.type = morph_type
+        for index, x, y, z in MORPH_OFFSET_STRUCT.iter_unpack(
+                self.read_bytes(MORPH_OFFSET_STRUCT.size*morph_size)):
+            morph.indices.append(index)
+            morph.pos_list.append(common.Vector3(x, y, z))
         return morph
 
     def read_rigidbody(self):
+        record=self.read_struct(RIGIDBODY_STRUCT)
         return pmd.RigidBody(
-                name=self.read_text(20), 
-                bone_index=self.read_int(2),
-                collision_group=self.read_int(1),
-                no_collision_group=self.read_int(2),
-                shape_type=self.read_uint(1),
-                shape_size=self.read_vector3(),
-                shape_position=self.read_vector3(),
-                shape_rotation=self.read_vector3(),
-                mass=self.read_float(),
-                linear_damping=self.read_float(),
-                angular_damping=self.read_float(),
-                restitution=self.read_float(),
-                friction=self.read_float(),
-                mode=self.read_uint(1)
+                name=truncate_zero(record[0]), 
+                bone_index=record[1],
+                collision_group=record[2],
+                no_collision_group=record[3],
+                shape_type=record[4],
+                shape_size=common.Vector3(*record[5:8]),
+                shape_position=common.Vector3(*record[8:11]),
+                shape_rotation=common.Vector3(*record[11:14]),
+                mass=record[14],
+                linear_damping=record[15],
+                angular_damping=record[16],
+                restitution=record[17],
+                friction=record[18],
+                mode=record[19]
                 )
 
     def read_joint(self):
+        record=self.read_struct(JOINT_STRUCT)
         return pmd.Joint(
-                name=self.read_text(20),
-                rigidbody_index_a=self.read_uint(4),
-                rigidbody_index_b=self.read_uint(4),
-                position=self.read_vector3(),
-                rotation=self.read_vector3(),
-                translation_limit_min=self.read_vector3(),
-                translation_limit_max=self.read_vector3(),
-                rotation_limit_min=self.read_vector3(),
-                rotation_limit_max=self.read_vector3(),
-                spring_constant_translation=self.read_vector3(),
-                spring_constant_rotation=self.read_vector3())
+                name=truncate_zero(record[0]),
+                rigidbody_index_a=record[1],
+                rigidbody_index_b=record[2],
+                position=common.Vector3(*record[3:6]),
+                rotation=common.Vector3(*record[6:9]),
+                translation_limit_min=common.Vector3(*record[9:12]),
+                translation_limit_max=common.Vector3(*record[12:15]),
+                rotation_limit_min=common.Vector3(*record[15:18]),
+                rotation_limit_max=common.Vector3(*record[18:21]),
+                spring_constant_translation=common.Vector3(*record[21:24]),
+                spring_constant_rotation=common.Vector3(*record[24:27]))
 
 
 
-def __read(reader, model):
+def __read(reader, model, vertex_layout, sections):
     # model info
     model.name=reader.read_text(20)
     model.comment=reader.read_text(256) 
 
     # model data
-    model.vertices=[reader.read_vertex()
-            for _ in range(reader.read_uint(4))]
-    model.indices=[reader.read_uint(2)
-            for _ in range(reader.read_uint(4))]
+    if vertex_layout=="skip":
+        sections["vertices"]=reader.skip_block(
+                VERTEX_STRUCT.size, reader.read_uint(4))
+        sections["indices"]=reader.skip_block(2, reader.read_uint(4))
+    elif vertex_layout=="numpy":
+        model.vertices=reader.read_vertices_numpy(reader.read_uint(4))
+        model.indices=reader.read_numpy_array("<u2", reader.read_uint(4))
+    else:
+        model.vertices=[reader.read_vertex()
+                for _ in range(reader.read_uint(4))]
+        model.indices=reader.read_array("H", reader.read_uint(4))
     model.materials=[reader.read_material()
             for _ in range(reader.read_uint(4))]
     model.bones=[reader.read_bone()
             for _ in range(reader.read_uint(2))]
     model.ik_list=[reader.read_ik()
             for _ in range(reader.read_uint(2))]
-    model.morphs=[reader.read_morph()
-            for _ in range(reader.read_uint(2))]
+    if vertex_layout=="skip":
+        model.morphs=[]
+        sections["morphs"]=[]
+        for _ in range(reader.read_uint(2)):
+            morph, block=reader.skip_morph()
+            model.morphs.append(morph)
+            sections["morphs"].append(block)
+    else:
+        model.morphs=[reader.read_morph()
+                for _ in range(reader.read_uint(2))]
     model.morph_indices=[reader.read_uint(2)
             for _ in range(reader.read_uint(1))]
     model.bone_group_list=[pmd.BoneGroup(reader.read_text(50))
@@ -180,13 +238,22 @@ def __read(reader, model):
     return True
 
 
-def read_from_file(path):
+def read_from_file(path, vertex_layout="object", use_mmap=False, cache=None):
     """
     read from file path, then return the pymeshio.pmd.Model.
 
     :Parameters:
       path
         file path
+      vertex_layout
+        see read
+      use_mmap
+        read from a memory mapped file instead of a copy of it.
+        with vertex_layout="numpy" vertices and indices become read only
+        views of the mapping.
+      cache
+        True or pymeshio.cache.ParseCache. load the parsed model from the
+        cache, or parse and store it.
 
     >>> import pymeshio.pmd.reader
     >>> m=pymeshio.pmd.reader.read_from_file('resources/初音ミクVer2.pmd')
@@ -194,18 +261,36 @@ def read_from_file(path):
     <pmd-2.0 "Miku Hatsune" 12354vertices>
 
     """
-    pmd=read(io.BytesIO(common.readall(path)))
+    if cache:
+        pmd=get_cache(cache).read(path, "pmd", (vertex_layout,),
+                lambda path: read_from_file(path, vertex_layout, use_mmap))
+        pmd.path=path
+        return pmd
+    if use_mmap:
+        pmd=read(common.mmap_file(path), vertex_layout)
+    else:
+        pmd=read(io.BytesIO(common.readall(path)), vertex_layout)
     pmd.path=path
     return pmd
 
 
-def read(ios):
+def read(ios, vertex_layout="object", sections=None):
     """
     read from ios, then return the pymeshio.pmd.Model.
 
     :Parameters:
       ios
-        input stream (in io.IOBase)
+        input stream (in io.IOBase) or bytes-like object
+      vertex_layout
+        "object": model.vertices is a list of pmd.Vertex.
+        "numpy": model.vertices is a pmd.VertexArray and indices is a
+        numpy array(requires numpy).
+        "skip": vertices, indices and morph offsets are skipped and left
+        empty. their (offset, count) in the input are stored to sections.
+      sections
+        dict filled by vertex_layout="skip". "vertices" and "indices" are
+        (offset, count), "morphs" is the list of (offset, count) of each
+        morph.
 
     >>> import pymeshio.pmd.reader
     >>> m=pymeshio.pmd.reader.read(io.open('resources/初音ミクVer2.pmd', 'rb'))
@@ -213,7 +298,10 @@ def read(ios):
     <pmd-2.0 "Miku Hatsune" 12354vertices>
 
     """
-    assert(isinstance(ios, io.IOBase))
+    if vertex_layout not in ("object", "numpy", "skip"):
+        raise ValueError("unknown vertex_layout: {0}".format(vertex_layout))
+    if sections is None:
+        sections={}
     reader=common.BinaryReader(ios)
 
     # header
@@ -224,8 +312,9 @@ def read(ios):
     version=reader.read_float()
 
     model=pmd.Model(version)
-    reader=Reader(reader.ios, version)
-    if(__read(reader, model)):
+    reader=Reader(reader, version)
+    if(__read(reader, model, vertex_layout, sections)):
+        reader.sync()
         # check eof
         if not reader.is_end():
             #print("can not reach eof.")
@@ -93,8 +93,6 @@ class Model(common.Diff):
         self.bones=[]
 
     def __str__(self):
-        print(self.name, len(self.name))
-        print(self.path, len(self.path))
         return u"<pmm.Model %s:%s>" % (self.name, self.path)
 
     def get_next_bone_by_next_frame_index(self, frame_index):
@@ -104,6 +102,46 @@ class Model(common.Diff):
                     return b
 
 
+class FrameTable(object):
+    """
+    frames of the linked frame lists as one numpy structured array sorted
+    by (track, frame_number). a track is a bone, a morph, the model state,
+    the camera or the light.
+
+    :IVariables:
+        records
+            numpy structured array. fields of the frame record, such as
+            frame_number, position and rotation of the bone frames
+        tracks
+            int64. track index of each record
+        starts
+            int64 track_count+1. frames of the track i are
+            records[starts[i]:starts[i+1]]
+    """
+    __slots__=[
+            'records',
+            'tracks',
+            'starts',
+            ]
+    def __init__(self, records, tracks, starts):
+        self.records=records
+        self.tracks=tracks
+        self.starts=starts
+
+    def __str__(self):
+        return "<pmm.FrameTable %d tracks, %d frames>" % (
+                len(self), len(self.records))
+
+    def __len__(self):
+        return len(self.starts)-1
+
+    def get_track(self, index):
+        """
+        records of the track sorted by frame_number.
+        """
+        return self.records[self.starts[index]:self.starts[index+1]]
+
+
 class Project(common.Diff):
     __slots__=[
             'path',
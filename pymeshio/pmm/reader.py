@@ -1,13 +1,81 @@
 # coding: utf-8
+"""
+pmm reader
+
+read parses every referenced pmd and the frames one by one.
+
+scan skips through the file recording the byte offset of each frame table,
+then returns pmm.reader.LazyProject. a referenced pmd is parsed on first
+access through PmdLoader, which shares one parsed model among the models
+of the same file. the frame tables are decoded on first access into
+pmm.FrameTable.
+"""
 import io
 import os
 import sys
 from .. import common
+from ..common import truncate_zero
 from .. import pmm
 from .. import pmd
 from ..pmd import reader as pmd_reader
 
 
+# fused record structs
+BONE_FRAME_STRUCT=common.get_struct("iii16x3f4fB")
+MORPH_FRAME_STRUCT=common.get_struct("iiifB")
+STATE_FRAME_HEADER_STRUCT=common.get_struct("iiiB")
+BONE_EDIT_STRUCT=common.get_struct("3f4fiBB")
+CAMERA_FRAME_STRUCT=common.get_struct("iii3f4f24xBBi")
+LIGHT_FRAME_STRUCT=common.get_struct("iii25x")
+
+# numpy record fields of the frames. same layout as the structs
+LINK_FIELDS=[
+        ("frame_number", "<i4"),
+        ("prev_frame_index", "<i4"),
+        ("next_frame_index", "<i4"),
+        ]
+BONE_FRAME_FIELDS=LINK_FIELDS+[
+        ("interpolation", "u1", (16,)),
+        ("position", "<f4", (3,)),
+        ("rotation", "<f4", (4,)),
+        ("is_selected", "u1"),
+        ]
+MORPH_FRAME_FIELDS=LINK_FIELDS+[
+        ("weight", "<f4"),
+        ("is_selected", "u1"),
+        ]
+CAMERA_FRAME_FIELDS=LINK_FIELDS+[
+        ("position", "<f4", (3,)),
+        ("rotation", "<f4", (4,)),
+        ("interpolation", "u1", (24,)),
+        ("is_selected", "u1"),
+        ("fovy", "u1"),
+        ("unknown", "<i4"),
+        ]
+LIGHT_FRAME_FIELDS=LINK_FIELDS+[
+        ("data", "u1", (25,)),
+        ]
+
+
+def get_state_frame_fields(ik_count):
+    return LINK_FIELDS+[
+            ("is_visible", "u1"),
+            ("ik_enables", "u1", (ik_count,)),
+            ("is_selected", "u1"),
+            ]
+
+
+def get_state_frame_size(ik_count):
+    return STATE_FRAME_HEADER_STRUCT.size+ik_count+1
+
+
+def get_bone_edit_size(bone_count, morph_count, ik_count):
+    """
+    bytes of the edit block(pose, morph weights and ik enables).
+    """
+    return BONE_EDIT_STRUCT.size*bone_count+4*morph_count+ik_count
+
+
 class Reader(common.BinaryReader):
     """pmx reader
     """
@@ -17,13 +85,272 @@ class Reader(common.BinaryReader):
     def read_text(self, size):
         """read cp932 text
         """
-        src=self.unpack("%ds" % size, size)
-        assert(type(src)==bytes)
-        pos = src.find(b"\x00")
-        if pos==-1:
-            return src
-        else:
-            return src[:pos]
+        return truncate_zero(self.read_bytes(size).tobytes())
+
+    def skip_frames(self, size, initial_count):
+        """
+        skip initial_count frames of size bytes, then the frame count and
+        the indexed frames. return ((offset, count) of the initial frames,
+        (offset, count) of the indexed frames).
+        """
+        initial=(self.tell(), initial_count)
+        self.skip(size*initial_count)
+        count=self.read_int(4)
+        indexed=(self.tell(), count)
+        self.skip((4+size)*count)
+        return initial, indexed
+
+    def read_frame_table(self, fields, initial, indexed):
+        """
+        decode the frames recorded by skip_frames into pmm.FrameTable.
+        """
+        import numpy
+        dtype=numpy.dtype(fields)
+        offset, count=initial
+        self.seek(offset)
+        initial_records=self.read_numpy_array(dtype, count, copy=True)
+        offset, count=indexed
+        self.seek(offset)
+        indexed_records=self.read_numpy_array(
+                numpy.dtype([("frame_index", "<i4")]+fields), count,
+                copy=True)
+        return link_frames(initial_records, indexed_records)
+
+
+def link_frames(initial, indexed):
+    """
+    return pmm.FrameTable of the frame lists.
+
+    frame i of initial is the head of the track i. the other frames are
+    linked to it by prev_frame_index. the track of every frame is found
+    by pointer jumping over the prev links at once, then the frames are
+    sorted by (track, frame_number). frames not linked to a head are
+    dropped.
+
+    :Parameters:
+      initial
+        numpy records of the first frame of each track
+      indexed
+        numpy records with frame_index of the other frames
+    """
+    import numpy
+    track_count=len(initial)
+    total=track_count+len(indexed)
+    records=numpy.empty(total, initial.dtype)
+    records[:track_count]=initial
+    for name in initial.dtype.names:
+        records[name][track_count:]=indexed[name]
+    ids=numpy.concatenate([numpy.arange(track_count),
+        indexed["frame_index"].astype(numpy.int64)])
+    lookup=numpy.full(int(ids.max())+1 if total else 0, -1, numpy.int64)
+    lookup[ids]=numpy.arange(total)
+
+    prev=records["prev_frame_index"].astype(numpy.int64)
+    valid=(prev>=0) & (prev<len(lookup))
+    parent=numpy.where(valid, lookup[numpy.where(valid, prev, 0)], -1)
+    jump=numpy.where(parent>=0, parent, numpy.arange(total))
+    jump[:track_count]=numpy.arange(track_count)
+    # a chain of length n reaches the head in log2(n) jumps
+    for _ in range(int(total).bit_length()+1):
+        next_jump=jump[jump]
+        if (next_jump==jump).all():
+            break
+        jump=next_jump
+    tracks=numpy.where((jump<track_count) & (jump[jump]==jump), jump, -1)
+
+    keep=numpy.flatnonzero(tracks>=0)
+    order=keep[numpy.lexsort((records["frame_number"][keep], tracks[keep]))]
+    tracks=tracks[order]
+    return pmm.FrameTable(records[order], tracks,
+            numpy.searchsorted(tracks, numpy.arange(track_count+1)))
+
+
+def get_model_path(path, base_dir):
+    """
+    path of the referenced pmd. the part after UserFile of the saved path is
+    relative to base_dir.
+    """
+    pos=path.find("\\UserFile\\")
+    if pos!=-1:
+        path=path[pos+10:]
+    return os.path.join(base_dir, path.replace("\\", os.sep))
+
+
+class PmdLoader(object):
+    """
+    load each referenced pmd once and share the parsed model.
+
+    :IVariables:
+        vertex_layout
+            see pmd.reader.read
+        models
+            {normalized path: pmd.Model}
+        counts
+            {normalized path: (bone count, morph count, ik count)}
+    """
+    __slots__=[
+            'vertex_layout',
+            'models',
+            'counts',
+            ]
+    def __init__(self, vertex_layout="object"):
+        self.vertex_layout=vertex_layout
+        self.models={}
+        self.counts={}
+
+    def __str__(self):
+        return "<pmm.reader.PmdLoader %d models>" % len(self.models)
+
+    def get_key(self, path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def load(self, path):
+        """
+        return the parsed pmd.Model of path.
+        """
+        key=self.get_key(path)
+        model=self.models.get(key)
+        if model is None:
+            model=pmd_reader.read_from_file(path, self.vertex_layout)
+            self.models[key]=model
+        return model
+
+    def get_counts(self, path):
+        """
+        return (bone count, morph count, ik count) of path. the vertices,
+        indices and morph offsets are skipped if the model is not loaded.
+        """
+        key=self.get_key(path)
+        counts=self.counts.get(key)
+        if counts is None:
+            model=self.models.get(key)
+            if model is None:
+                model=pmd_reader.read_from_file(path, "skip", use_mmap=True)
+            counts=(len(model.bones), len(model.morphs), len(model.ik_list))
+            self.counts[key]=counts
+        return counts
+
+
+class LazyModel(pmm.Model):
+    """
+    pmm model returned by scan.
+
+    :IVariables:
+        reader
+            pmm.reader.Reader over the whole file
+        loader
+            PmdLoader shared by the project
+        pmd_path
+            resolved path of the referenced pmd
+        bone_count, morph_count, ik_count
+            counts of the referenced pmd
+        sections
+            {name: (byte offset, count)}. bone_frames, indexed_bone_frames,
+            morph_frames, indexed_morph_frames, state_frames,
+            indexed_state_frames, edit
+        frame_tables
+            {name: pmm.FrameTable} decoded
+    """
+    __slots__=[
+            'is_visible',
+            'reader',
+            'loader',
+            'pmd_path',
+            'bone_count',
+            'morph_count',
+            'ik_count',
+            'sections',
+            'frame_tables',
+            ]
+    def __init__(self, reader, loader):
+        super(LazyModel, self).__init__()
+        self.reader=reader
+        self.loader=loader
+        self.sections={}
+        self.frame_tables={}
+
+    def get_pmd(self):
+        """
+        the referenced pmd.Model, parsed on first access.
+        """
+        return self.loader.load(self.pmd_path)
+
+    def get_frame_table(self, name, fields):
+        table=self.frame_tables.get(name)
+        if table is None:
+            table=self.reader.read_frame_table(fields, self.sections[name],
+                    self.sections["indexed_"+name])
+            self.frame_tables[name]=table
+        return table
+
+    def get_bone_frames(self):
+        """
+        pmm.FrameTable of the bone frames. track i is the bone i of the pmd.
+        """
+        return self.get_frame_table("bone_frames", BONE_FRAME_FIELDS)
+
+    def get_morph_frames(self):
+        """
+        pmm.FrameTable of the morph frames. track i is the morph i of the
+        pmd.
+        """
+        return self.get_frame_table("morph_frames", MORPH_FRAME_FIELDS)
+
+    def get_state_frames(self):
+        """
+        pmm.FrameTable of the visible and ik enable frames. one track.
+        """
+        return self.get_frame_table("state_frames",
+                get_state_frame_fields(self.ik_count))
+
+
+class LazyProject(pmm.Project):
+    """
+    pmm project returned by scan.
+
+    :IVariables:
+        reader
+            pmm.reader.Reader over the whole file
+        loader
+            PmdLoader
+        sections
+            {name: (byte offset, count)}. camera_frames,
+            indexed_camera_frames, light_frames, indexed_light_frames
+        frame_tables
+            {name: pmm.FrameTable} decoded
+    """
+    __slots__=[
+            'reader',
+            'loader',
+            'sections',
+            'frame_tables',
+            ]
+    def __init__(self, reader, loader):
+        super(LazyProject, self).__init__()
+        self.reader=reader
+        self.loader=loader
+        self.sections={}
+        self.frame_tables={}
+
+    def get_frame_table(self, name, fields):
+        table=self.frame_tables.get(name)
+        if table is None:
+            table=self.reader.read_frame_table(fields, self.sections[name],
+                    self.sections["indexed_"+name])
+            self.frame_tables[name]=table
+        return table
+
+    def get_camera_frames(self):
+        """
+        pmm.FrameTable of the camera frames. one track.
+        """
+        return self.get_frame_table("camera_frames", CAMERA_FRAME_FIELDS)
+
+    def get_light_frames(self):
+        """
+        pmm.FrameTable of the light frames. one track.
+        """
+        return self.get_frame_table("light_frames", LIGHT_FRAME_FIELDS)
 
 
 def read_from_file(path):
@@ -45,29 +372,72 @@ def read_from_file(path):
     return pmm
 
 
-def read(ios, base_dir):
+def scan(path, use_mmap=True, loader=None):
     """
-    read from ios
+    skip through the file recording the byte offset of each frame table,
+    then return the pmm.reader.LazyProject.
+
+    only the bone, morph and ik counts of the referenced pmd are read, to
+    know the size of the model blocks. the pmd is parsed by
+    LazyModel.get_pmd and the frame tables are decoded by
+    LazyModel.get_bone_frames etc.
 
     :Parameters:
-      ios
-        input stream (in io.IOBase)
+      path
+        file path
+      use_mmap
+        read from a memory mapped file instead of a copy of it
+      loader
+        PmdLoader. share it to share the pmd models among projects
 
     >>> import pmm.reader
-    >>> m=pmm.reader.read(io.open('resources/UserFile/きしめん.pmm', 'rb'))
-    >>> print(m)
+    >>> p=pmm.reader.scan('resources/UserFile/きしめん.pmm')
+    >>> frames=p.models[0].get_bone_frames()
+    >>> print(frames.get_track(0)["frame_number"])
 
     """
-    assert(isinstance(ios, io.IOBase))
-    reader=Reader(ios)
+    if use_mmap:
+        data=common.mmap_file(path)
+    else:
+        data=common.readall(path)
+    base_dir=os.path.dirname(path)
+    reader=Reader(data)
+    p=LazyProject(reader, loader or PmdLoader())
+    p.path=path
+    model_count=read_project_header(reader, p)
+    for _ in range(model_count):
+        model=LazyModel(reader, p.loader)
+        read_model_header(reader, model)
+        model.pmd_path=get_model_path(model.path, base_dir)
+        model.bone_count, model.morph_count, model.ik_count=(
+                p.loader.get_counts(model.pmd_path))
+        sections=model.sections
+        (sections["bone_frames"], sections["indexed_bone_frames"]
+                )=reader.skip_frames(BONE_FRAME_STRUCT.size,
+                        model.bone_count)
+        (sections["morph_frames"], sections["indexed_morph_frames"]
+                )=reader.skip_frames(MORPH_FRAME_STRUCT.size,
+                        model.morph_count)
+        (sections["state_frames"], sections["indexed_state_frames"]
+                )=reader.skip_frames(get_state_frame_size(model.ik_count), 1)
+        size=get_bone_edit_size(model.bone_count, model.morph_count,
+                model.ik_count)
+        sections["edit"]=(reader.tell(), size)
+        reader.skip(size)
+        p.models.append(model)
+    read_scene(reader, p, model_count, p.sections)
+    return p
 
-    # header
+
+def read_project_header(reader, p):
+    """
+    read the header to the model names, then return the model count.
+    """
     signature=reader.read_text(30)
     if signature!=b"Polygon Movie maker 0001":
         raise common.ParseException(
-                "invalid signature", signature)
+                "invalid signature: {0}".format(signature))
 
-    p=pmm.Project()
     p.screen_width=reader.read_int(4)
     p.screen_height=reader.read_int(4)
     p.timeline_view_width=reader.read_int(4)
@@ -84,48 +454,69 @@ def read(ios, base_dir):
 
     model_count=reader.read_uint(1)
     model_names=[reader.read_text(20).decode('cp932') for _ in range(model_count)]
-    for i in range(model_count):
-        print('model', reader)
+    return model_count
 
-        n=reader.read_uint(1)
 
-        model=pmm.Model()
-        model.name=reader.read_text(20).decode('cp932')
-        print('name', model.name)
-        model.path=reader.read_text(256).decode('cp932')
-        # path - base_dir
-        pos=model.path.index("\\UserFile\\")
-        model.path=model.path[pos+10:]
-        # 該当pmd読み込み
-        pmd_model=pmd_reader.read_from_file(os.path.join(base_dir, model.path))
+def read_model_header(reader, model):
+    """
+    read the model block to the bone frames.
+    """
+    n=reader.read_uint(1)
+
+    model.name=reader.read_text(20).decode('cp932')
+    model.path=reader.read_text(256).decode('cp932')
+
+    # unknown
+    reader.read_uint(1)
+
+    model.is_visible=reader.read_uint(1)
+
+    # unknown
+    reader.read_int(4)
+    n=reader.read_int(4)
+    #assert(n==1)
+    reader.read_int(4)
+    reader.read_int(4)
+    reader.read_int(4)
+
+    # nazo
+    nazo_count=reader.read_uint(1)
+    nazo=[reader.read_uint(1) for _ in range(nazo_count)]
+
+    # ?
+    reader.read_uint(1)
+    reader.read_uint(1)
+    reader.read_uint(1)
+    reader.read_uint(1)
+
+    max_frame_number=reader.read_uint(4)
 
-        # unknown
-        reader.read_uint(1)
 
-        model.is_visible=reader.read_uint(1)
+def read(ios, base_dir):
+    """
+    read from ios
 
-        # unknown
-        reader.read_int(4)
-        n=reader.read_int(4)
-        #assert(n==1)
-        reader.read_int(4)
-        reader.read_int(4)
-        reader.read_int(4)
+    :Parameters:
+      ios
+        input stream (in io.IOBase)
 
-        # nazo
-        nazo_count=reader.read_uint(1)
-        print('nazo_count', nazo_count)
-        nazo=[reader.read_uint(1) for _ in range(nazo_count)]
-        print(nazo)
+    >>> import pmm.reader
+    >>> m=pmm.reader.read(io.open('resources/UserFile/きしめん.pmm', 'rb'))
+    >>> print(m)
 
-        # ?
-        reader.read_uint(1)
-        reader.read_uint(1)
-        reader.read_uint(1)
-        reader.read_uint(1)
+    """
+    assert(isinstance(ios, io.IOBase))
+    reader=Reader(ios)
 
-        max_frame_number=reader.read_uint(4)
-        print('max_frame_number', max_frame_number, reader)
+    p=pmm.Project()
+    model_count=read_project_header(reader, p)
+    for i in range(model_count):
+        model=pmm.Model()
+        read_model_header(reader, model)
+        # path - base_dir
+        model.path=get_model_path(model.path, '')
+        # 該当pmd読み込み
+        pmd_model=pmd_reader.read_from_file(os.path.join(base_dir, model.path))
 
         ############################################################
         # ボーン情報
@@ -135,37 +526,16 @@ def read(ios, base_dir):
             f=pmm.BoneFrame(frame_index)
 
             # 57 byte
-            f.frame_number=reader.read_int(4)
-            f.prev_frame_index=reader.read_int(4)
-            f.next_frame_index=reader.read_int(4)
+            record=reader.read_struct(BONE_FRAME_STRUCT)
+            f.frame_number=record[0]
+            f.prev_frame_index=record[1]
+            f.next_frame_index=record[2]
             # next_frame_index!=0の場合次のフレームがある
+            # icrv1-4(16 byte)は読み飛ばす
+            f.pos=common.Vector3(*record[3:6])
+            f.rot=common.Quaternion(*record[6:10])
+            f.is_selected=record[10]
 
-            # icrv1
-            reader.read_uint(1)
-            reader.read_uint(1)
-            reader.read_uint(1)
-            reader.read_uint(1)
-            # icrv2
-            reader.read_uint(1)
-            reader.read_uint(1)
-            reader.read_uint(1)
-            reader.read_uint(1)
-            # icrv3
-            reader.read_uint(1)
-            reader.read_uint(1)
-            reader.read_uint(1)
-            reader.read_uint(1)
-            # icrv4
-            reader.read_uint(1)
-            reader.read_uint(1)
-            reader.read_uint(1)
-            reader.read_uint(1)
-
-            f.pos=reader.read_vector3()
-            f.rot=reader.read_quaternion()
-            f.is_selected=reader.read_uint(1)
-
-            #print(f)
             return f
 
         # ボーンの初期位置
@@ -174,7 +544,6 @@ def read(ios, base_dir):
 
         # 後続のボーンフレーム数
         remain_bone_frame_count=reader.read_int(4)
-        print('remain_bone_frame_count', remain_bone_frame_count)
 
         # ボーンのフレーム情報
         for i in range(remain_bone_frame_count):
@@ -188,21 +557,16 @@ def read(ios, base_dir):
             f=pmm.MorphFrame(frame_index)
 
             # 17byte
-            f.frame_number=reader.read_int(4)
-            f.prev_frame_index=reader.read_int(4)
-            f.next_frame_index=reader.read_int(4)
+            (f.frame_number, f.prev_frame_index, f.next_frame_index,
+                    f.expression, f.is_selected
+                    )=reader.read_struct(MORPH_FRAME_STRUCT)
             # next_frame_index!=0の場合次のフレームがある
-            f.expression=reader.read_float()
-            f.is_selected=reader.read_uint(1)
-
-            #print(f)
 
         for i, m in enumerate(pmd_model.morphs):
             # morph(frames)
             read_morphframe(i)
 
         remain_morph_frame_count=reader.read_int(4)
-        print('remain_morph_frame_count', remain_morph_frame_count)
 
         for i in range(remain_morph_frame_count):
             index=reader.read_int(4)
@@ -210,140 +574,67 @@ def read(ios, base_dir):
 
         ############################################################
         # model state
-        print(reader)
-
         def read_stateframe(frame_index):
             f=pmm.StateFrame(frame_index)
-            f.frame_number=reader.read_int(4)
-            f.prev_frame_index=reader.read_int(4)
-            f.next_frame_index=reader.read_int(4)
-
-            f.is_visible=reader.read_uint(1)
+            (f.frame_number, f.prev_frame_index, f.next_frame_index,
+                    f.is_visible
+                    )=reader.read_struct(STATE_FRAME_HEADER_STRUCT)
             f.ik_enables=[reader.read_uint(1) for ik in pmd_model.ik_list]
             f.is_selected=reader.read_uint(1)
 
-            print(f)
-
         read_stateframe(0)
 
         model_state_frame_count=reader.read_int(4)
-        print('model_state_frame_count', model_state_frame_count)
         for i in range(model_state_frame_count):
             index=reader.read_int(4)
             read_stateframe(index)
-        
+
         ############################################################
         # edit
         # pose
-        print('bone', reader)
         for i, b in enumerate(pmd_model.bones):
             # 34 byte
-            edit_pos=reader.read_vector3()
-            edit_rot=reader.read_quaternion()
-            reader.read_int(4)
-            is_changed=reader.read_uint(1)
-            is_selected=reader.read_uint(1)
+            record=reader.read_struct(BONE_EDIT_STRUCT)
+            edit_pos=common.Vector3(*record[0:3])
+            edit_rot=common.Quaternion(*record[3:7])
+            is_changed=record[8]
+            is_selected=record[9]
 
         # morph
-        print('morph', reader)
         for i, m in enumerate(pmd_model.morphs):
-            #print i, m
             expression=reader.read_float()
 
         # ik
-        print('ik', reader)
         for i, ik in enumerate(pmd_model.ik_list):
             is_enable=reader.read_uint(1)
 
-        print(reader)
-        print()
+        p.models.append(model)
+
+    read_scene(reader, p, model_count, {})
+    return p
+
 
+def read_scene(reader, p, model_count, sections):
+    """
+    read the camera, light, accessories and the settings after the models.
+    the camera and light frames are skipped and recorded to sections.
+    """
     ############################################################
     # camera
-    def read_cameraframe(frame_index):
-        f=pmm.CameraFrame(frame_index)
-        f.frame_number=reader.read_int(4)
-        f.prev_frame_index=reader.read_int(4)
-        f.next_frame_index=reader.read_int(4)
-        f.pos=reader.read_vector3()
-        f.rot=reader.read_quaternion()
-        # icrv1
-        reader.read_uint(1)
-        reader.read_uint(1)
-        reader.read_uint(1)
-        reader.read_uint(1)
-        # icrv2
-        reader.read_uint(1)
-        reader.read_uint(1)
-        reader.read_uint(1)
-        reader.read_uint(1)
-        # icrv3
-        reader.read_uint(1)
-        reader.read_uint(1)
-        reader.read_uint(1)
-        reader.read_uint(1)
-        # icrv4
-        reader.read_uint(1)
-        reader.read_uint(1)
-        reader.read_uint(1)
-        reader.read_uint(1)
-        # icrv5
-        reader.read_uint(1)
-        reader.read_uint(1)
-        reader.read_uint(1)
-        reader.read_uint(1)
-        # icrvr
-        reader.read_uint(1)
-        reader.read_uint(1)
-        reader.read_uint(1)
-        reader.read_uint(1)
-
-        is_selected=reader.read_uint(1)
-        fovy=reader.read_uint(1)
-
-        reader.read_int(4)
-
-        print(f)
-
-    read_cameraframe(0)
-
-    camera_frame_count=reader.read_int(4)
-    print('camera_frame_count', camera_frame_count)
-    for i in range(camera_frame_count):
-        index=reader.read_int(4)
-        read_cameraframe(index)
- 
-    print(reader)
+    (sections["camera_frames"], sections["indexed_camera_frames"]
+            )=reader.skip_frames(CAMERA_FRAME_STRUCT.size, 1)
 
     ############################################################
     # light
     reader.read_text(37)
-    print(reader)
-
-    def read_lightframe(frame_index):
-        f=pmm.LightFrame(frame_index)
-        f.frame_number=reader.read_int(4)
-        f.prev_frame_index=reader.read_int(4)
-        f.next_frame_index=reader.read_int(4)
 
-        reader.read_text(25)
-        print(f)
-
-    read_lightframe(0)
-
-    light_frame_count=reader.read_int(4)
-    print('light_frame_count', light_frame_count)
-    for i in range(light_frame_count):
-        index=reader.read_int(4)
-        read_lightframe(index)
- 
+    (sections["light_frames"], sections["indexed_light_frames"]
+            )=reader.skip_frames(LIGHT_FRAME_STRUCT.size, 1)
 
     # light panel
     light_color=reader.read_vector3()
     light_xyz=reader.read_vector3()
 
-    print(reader)
-
     ############################################################
     # accessory
     n=reader.read_uint(1)
@@ -352,22 +643,15 @@ def read(ios, base_dir):
     assert(n==3)
 
     accessory_count=reader.read_uint(1)
-    print('accessory_count', accessory_count)
     for i in range(accessory_count):
         name=reader.read_text(100).decode('cp932')
-        print(i, name)
-    print(reader)
     for i in range(accessory_count):
         # 451 byte
         n=reader.read_uint(1)
         name=reader.read_text(100).decode('cp932')
-        #print i, name
         path=reader.read_text(256).decode('cp932')
-        print(i, path)
         reader.read_text(94)
 
-    print(reader)
-
     reader.read_text(55)
 
     ############################################################
@@ -383,40 +667,30 @@ def read(ios, base_dir):
     p.use_start=reader.read_uint(1)
     p.start=reader.read_uint(4)
     p.end=reader.read_uint(4)
-    print("playinfo: repeat(%d) start: %d(%d) -> end: %d(%d)" % (p.use_repeat, 
-            p.start, p.use_start, p.end, p.use_end))
     reader.read_text(2)
-    print(reader)
 
     ############################################################
     # Wav
     p.use_wav=reader.read_uint(1)
     p.wav_path=reader.read_text(256)
-    print('wav', p.use_wav, p.wav_path)
     reader.read_text(12)
 
     ############################################################
     # 背景動画
     p.bgmovie_path=reader.read_text(256)
     p.use_bgmovie=reader.read_uint(1)
-    print('bgmovie', p.use_bgmovie, p.bgmovie_path)
     reader.read_text(15)
 
     ############################################################
     # 背景画像
     p.bgimage_path=reader.read_text(256)
     p.use_bgimage=reader.read_uint(1)
-    print('bgimage', p.use_bgimage, p.bgimage_path)
     ############################################################
 
-    print(reader)
-
     p.show_info=reader.read_uint(1)
     p.show_grid=reader.read_uint(1)
     p.show_groundshadow=reader.read_uint(1)
     n=reader.read_uint(1)
-    print('情報: %d, グリッド: %d, 地面影: %d' % (
-            p.show_info, p.show_grid, p.show_groundshadow))
 
     n=reader.read_uint(1)
     assert(n==0x70)
@@ -424,7 +698,6 @@ def read(ios, base_dir):
     assert(n==0x42)
 
     p.screencapture_flag=reader.read_uint(1)
-    print('screencapture_flag', p.screencapture_flag)
     n=reader.read_uint(1)
     n=reader.read_uint(1)
     n=reader.read_uint(1)
@@ -432,17 +705,14 @@ def read(ios, base_dir):
     assert(n==1)
 
     p.groundshadow_color=reader.read_float()
-    print(p.groundshadow_color)
 
     for i in range(model_count+accessory_count):
         n=reader.read_uint(1)
 
-    print(reader)
     f=reader.read_float()
     assert(f==1)
 
     p.use_groundshadow_transparency=reader.read_uint(1)
-    print(p.use_groundshadow_transparency)
     n=reader.read_uint(1)
     assert(n==1)
 
@@ -452,13 +722,11 @@ def read(ios, base_dir):
     n=reader.read_uint(1)
     assert(n==1)
 
-    print('Gravity', reader)
     p.physics_flag=reader.read_uint(1)
     p.gravity=reader.read_float()
     p.physics_noise=reader.read_uint(4)
     p.gravity_orientation=reader.read_vector3()
     p.physics_use_noise=reader.read_uint(1)
-    print(p.physics_flag, p.gravity_orientation, p.gravity, p.physics_noise, p.physics_use_noise)
 
     n=reader.read_uint(1)
     assert(n==1)
@@ -468,20 +736,17 @@ def read(ios, base_dir):
     ############################################################
     # self shadow
     f=reader.read_float()
-    print(f)
 
     reader.read_text(14)
     for j in range(model_count):
         n=reader.read_uint(1)
 
     f=reader.read_float()
-    print(f)
 
     n=reader.read_uint(1)
     assert(n==0)
 
     selfshadow_frame_count=reader.read_uint(4)
-    print(selfshadow_frame_count)
     for i in range(selfshadow_frame_count):
         n=reader.read_uint(1)
         for j in range(model_count):
@@ -493,15 +758,9 @@ def read(ios, base_dir):
     assert(n==1)
 
     p.edge_color=[reader.read_uint(4) for _ in range(3)]
-    print(p.edge_color)
 
     # unknown
     n=reader.read_uint(1)
     assert(n==1)
 
     p.use_black_background=reader.read_uint(1)
-    print('use_black_background', p.use_black_background)
-    print(reader)
-
-    return p
-
@@ -557,6 +557,251 @@ class Vertex(common.Diff):
         self._diff(rhs, "edge_factor")
 
 
+DEFORM_BDEF1=0
+DEFORM_BDEF2=1
+DEFORM_BDEF4=2
+DEFORM_SDEF=3
+
+
+class VertexArray(object):
+    """
+    ================
+    pmx vertex array
+    ================
+    columnar vertices(numpy arrays). read by vertex_layout="numpy".
+
+    indexing returns a pmx.Vertex and slicing returns a VertexArray of
+    the sliced columns, so the array can be used like the vertex list.
+
+    :IVariables:
+        positions
+            float32 Nx3
+        normals
+            float32 Nx3
+        uvs
+            float32 Nx2
+        deform_types
+            int8 N. DEFORM_BDEF1, DEFORM_BDEF2, DEFORM_BDEF4 or DEFORM_SDEF
+        bone_indices
+            int32 Nx4. unused slot is -1
+        weights
+            float32 Nx4. Bdef1 is (1, 0, 0, 0), Bdef2 and Sdef are (w, 1-w, 0, 0)
+        sdef_c
+            float32 Nx3
+        sdef_r0
+            float32 Nx3
+        sdef_r1
+            float32 Nx3
+        edge_factors
+            float32 N
+    """
+    __slots__=[
+            'positions',
+            'normals',
+            'uvs',
+            'deform_types',
+            'bone_indices',
+            'weights',
+            'sdef_c',
+            'sdef_r0',
+            'sdef_r1',
+            'edge_factors',
+            ]
+    def __init__(self,
+            positions,
+            normals,
+            uvs,
+            deform_types,
+            bone_indices,
+            weights,
+            sdef_c,
+            sdef_r0,
+            sdef_r1,
+            edge_factors):
+        self.positions=positions
+        self.normals=normals
+        self.uvs=uvs
+        self.deform_types=deform_types
+        self.bone_indices=bone_indices
+        self.weights=weights
+        self.sdef_c=sdef_c
+        self.sdef_r0=sdef_r0
+        self.sdef_r1=sdef_r1
+        self.edge_factors=edge_factors
+
+    def __str__(self):
+        return "<pmx.VertexArray {0}vertices>".format(len(self))
+
+    def __eq__(self, rhs):
+        if not isinstance(rhs, VertexArray):
+            if not isinstance(rhs, (list, tuple)):
+                return NotImplemented
+            return self.tolist()==list(rhs)
+        import numpy
+        return all(numpy.array_equal(getattr(self, key), getattr(rhs, key))
+                for key in self.__slots__)
+
+    def __ne__(self, rhs):
+        return not self.__eq__(rhs)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return VertexArray(*[getattr(self, key)[index]
+                for key in self.__slots__])
+        if index<0:
+            index+=len(self)
+        return Vertex(
+                common.Vector3(*self.positions[index].tolist()),
+                common.Vector3(*self.normals[index].tolist()),
+                common.Vector2(*self.uvs[index].tolist()),
+                self.get_deform(index),
+                float(self.edge_factors[index])
+                )
+
+    def tolist(self):
+        """
+        return the pmx.Vertex list. faster than indexing one by one.
+        """
+        Vector2=common.Vector2
+        Vector3=common.Vector3
+        edge_factors=self.edge_factors.tolist()
+        bone_indices=self.bone_indices.tolist()
+        weights=self.weights.tolist()
+        vertices=[]
+        append=vertices.append
+        for i, (position, normal, uv, deform_type) in enumerate(zip(
+                self.positions.tolist(), self.normals.tolist(),
+                self.uvs.tolist(), self.deform_types.tolist())):
+            index=bone_indices[i]
+            weight=weights[i]
+            if deform_type==DEFORM_BDEF1:
+                deform=Bdef1(index[0])
+            elif deform_type==DEFORM_BDEF2:
+                deform=Bdef2(index[0], index[1], weight[0])
+            elif deform_type==DEFORM_BDEF4:
+                deform=Bdef4(index[0], index[1], index[2], index[3],
+                        weight[0], weight[1], weight[2], weight[3])
+            else:
+                deform=self.get_deform(i)
+            append(Vertex(Vector3(*position), Vector3(*normal),
+                Vector2(*uv), deform, edge_factors[i]))
+        return vertices
+
+    def get_deform(self, index):
+        deform_type=self.deform_types[index]
+        i=self.bone_indices[index].tolist()
+        w=self.weights[index].tolist()
+        if deform_type==DEFORM_BDEF1:
+            return Bdef1(i[0])
+        elif deform_type==DEFORM_BDEF2:
+            return Bdef2(i[0], i[1], w[0])
+        elif deform_type==DEFORM_BDEF4:
+            return Bdef4(i[0], i[1], i[2], i[3], w[0], w[1], w[2], w[3])
+        elif deform_type==DEFORM_SDEF:
+            return Sdef(i[0], i[1], w[0],
+                    common.Vector3(*self.sdef_c[index].tolist()),
+                    common.Vector3(*self.sdef_r0[index].tolist()),
+                    common.Vector3(*self.sdef_r1[index].tolist()))
+        else:
+            raise common.ParseException(
+                    "unknown deform type: {0}".format(deform_type))
+
+
+def create_vertex_array(vertices):
+    """
+    create pmx.VertexArray from pmx.Vertex list. VertexArray is returned as is.
+
+    requires numpy.
+    """
+    if isinstance(vertices, VertexArray):
+        return vertices
+    import numpy
+    count=len(vertices)
+    positions=numpy.zeros((count, 3), numpy.float32)
+    normals=numpy.zeros((count, 3), numpy.float32)
+    uvs=numpy.zeros((count, 2), numpy.float32)
+    deform_types=numpy.zeros(count, numpy.int8)
+    bone_indices=numpy.full((count, 4), -1, numpy.int32)
+    weights=numpy.zeros((count, 4), numpy.float32)
+    sdef_c=numpy.zeros((count, 3), numpy.float32)
+    sdef_r0=numpy.zeros((count, 3), numpy.float32)
+    sdef_r1=numpy.zeros((count, 3), numpy.float32)
+    edge_factors=numpy.zeros(count, numpy.float32)
+    for i, v in enumerate(vertices):
+        positions[i]=(v.position.x, v.position.y, v.position.z)
+        normals[i]=(v.normal.x, v.normal.y, v.normal.z)
+        uvs[i]=(v.uv.x, v.uv.y)
+        edge_factors[i]=v.edge_factor
+        d=v.deform
+        if isinstance(d, Bdef1):
+            deform_types[i]=DEFORM_BDEF1
+            bone_indices[i, 0]=d.index0
+            weights[i, 0]=1.0
+        elif isinstance(d, Bdef2):
+            deform_types[i]=DEFORM_BDEF2
+            bone_indices[i, 0:2]=(d.index0, d.index1)
+            weights[i, 0:2]=(d.weight0, 1.0-d.weight0)
+        elif isinstance(d, Bdef4):
+            deform_types[i]=DEFORM_BDEF4
+            bone_indices[i]=(d.index0, d.index1, d.index2, d.index3)
+            weights[i]=(d.weight0, d.weight1, d.weight2, d.weight3)
+        elif isinstance(d, Sdef):
+            deform_types[i]=DEFORM_SDEF
+            bone_indices[i, 0:2]=(d.index0, d.index1)
+            weights[i, 0:2]=(d.weight0, 1.0-d.weight0)
+            sdef_c[i]=(d.sdef_c.x, d.sdef_c.y, d.sdef_c.z)
+            sdef_r0[i]=(d.sdef_r0.x, d.sdef_r0.y, d.sdef_r0.z)
+            sdef_r1[i]=(d.sdef_r1.x, d.sdef_r1.y, d.sdef_r1.z)
+        else:
+            raise ValueError("unknown deform: {0}".format(d))
+    return VertexArray(positions, normals, uvs, deform_types, 
+            bone_indices, weights, sdef_c, sdef_r0, sdef_r1, edge_factors)
+
+
+def create_bdef1_vertex_array(positions, normals, uvs, bone_index=0):
+    """
+    create pmx.VertexArray of Bdef1 vertices, all on bone_index, from
+    positions Nx3, normals Nx3 and uvs Nx2. edge factors are 0.
+
+    requires numpy.
+    """
+    import numpy
+    count=len(positions)
+    bone_indices=numpy.full((count, 4), -1, numpy.int32)
+    bone_indices[:, 0]=bone_index
+    weights=numpy.zeros((count, 4), numpy.float32)
+    weights[:, 0]=1.0
+    return VertexArray(
+            numpy.asarray(positions, numpy.float32),
+            numpy.asarray(normals, numpy.float32),
+            numpy.asarray(uvs, numpy.float32),
+            numpy.full(count, DEFORM_BDEF1, numpy.int8),
+            bone_indices,
+            weights,
+            numpy.zeros((count, 3), numpy.float32),
+            numpy.zeros((count, 3), numpy.float32),
+            numpy.zeros((count, 3), numpy.float32),
+            numpy.zeros(count, numpy.float32))
+
+
+MORPH_GROUP=0
+MORPH_VERTEX=1
+MORPH_BONE=2
+MORPH_UV=3
+MORPH_EXTENDED_UV1=4
+MORPH_EXTENDED_UV2=5
+MORPH_EXTENDED_UV3=6
+MORPH_EXTENDED_UV4=7
+MORPH_MATERIAL=8
+
+
 class Morph(common.Diff):
     """pmx morph
 
@@ -630,6 +875,61 @@ class VertexMorphOffset(common.Diff):
         self._diff(rhs, 'position_offset')
 
 
+class VertexMorphOffsetArray(object):
+    """
+    columnar vertex morph offsets(numpy arrays). read by vertex_layout="numpy".
+
+    indexing returns a pmx.VertexMorphOffset and slicing returns a
+    VertexMorphOffsetArray.
+
+    :IVariables:
+        vertex_indices
+            int N
+        position_offsets
+            float32 Nx3
+    """
+    __slots__=[
+            'vertex_indices',
+            'position_offsets',
+            ]
+    def __init__(self, vertex_indices, position_offsets):
+        self.vertex_indices=vertex_indices
+        self.position_offsets=position_offsets
+
+    def __str__(self):
+        return "<pmx.VertexMorphOffsetArray {0}offsets>".format(len(self))
+
+    def __eq__(self, rhs):
+        if not isinstance(rhs, VertexMorphOffsetArray):
+            if not isinstance(rhs, (list, tuple)):
+                return NotImplemented
+            return list(self)==list(rhs)
+        import numpy
+        return (numpy.array_equal(self.vertex_indices, rhs.vertex_indices)
+                and numpy.array_equal(self.position_offsets,
+                    rhs.position_offsets))
+
+    def __ne__(self, rhs):
+        return not self.__eq__(rhs)
+
+    def __len__(self):
+        return len(self.vertex_indices)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return VertexMorphOffsetArray(self.vertex_indices[index],
+                    self.position_offsets[index])
+        if index<0:
+            index+=len(self)
+        return VertexMorphOffset(
+                int(self.vertex_indices[index]),
+                common.Vector3(*self.position_offsets[index].tolist()))
+
+
 class BoneMorphData(common.Diff):
     """pmx bone morph data
 
@@ -1047,6 +1347,8 @@ class Model(common.Diff):
             comment
         vertices
             vertex list
+        indices
+            vertex index array(array.array, or numpy array by vertex_layout="numpy")
         textures
             texture list
         materials
@@ -1145,7 +1447,7 @@ class Model(common.Diff):
                 and self.comment==rhs.comment
                 and self.english_comment==rhs.english_comment
                 and self.vertices==rhs.vertices
-                and self.indices==rhs.indices
+                and common.sequence_equal(self.indices, rhs.indices)
                 and self.textures==rhs.textures
                 and self.materials==rhs.materials
                 and self.bones==rhs.bones
@@ -0,0 +1,312 @@
+# coding: utf-8
+"""
+pmx forward kinematics
+
+compute global bone matrices of pmx.Model for a batch of poses.
+
+a pose is local rotations(quaternion) and translations of every bone
+relative to the bind pose. matrices follow pymeshio.arraymath convention.
+
+evaluation order
+~~~~~~~~~~~~~~~~
+bones are ordered by (after physics flag, layer, index) as in MMD. a bone is
+always evaluated after its parent and its effect(grant) bone, even if
+those have a later layer. consecutive bones that do not depend on each
+other are evaluated together in one group.
+
+not supported: external parent deform(external_key).
+
+>>> import pymeshio.pmx.reader
+>>> from pymeshio.pmx import fk
+>>> m=pymeshio.pmx.reader.read_from_file('resources/初音ミクVer2.pmx')
+>>> solver=fk.ForwardKinematics(m)
+>>> global_matrices=solver.evaluate(rotations, translations)
+
+"""
+import heapq
+import numpy
+from .. import arraymath
+
+
+def sort_bones(bones):
+    """
+    return bone indices in evaluation order. parent and effect bone come
+    first, then the (after physics flag, layer, index) order.
+    """
+    count=len(bones)
+    dependents=[[] for _ in range(count)]
+    waiting=[0]*count
+    for i, b in enumerate(bones):
+        for dependency in get_dependencies(b, count):
+            if dependency==i:
+                continue
+            dependents[dependency].append(i)
+            waiting[i]+=1
+    def key(i):
+        b=bones[i]
+        return (1 if b.getAfterPhysicsDeformFlag() else 0, b.layer, i)
+    queue=[key(i) for i in range(count) if waiting[i]==0]
+    heapq.heapify(queue)
+    order=[]
+    while queue:
+        i=heapq.heappop(queue)[2]
+        order.append(i)
+        for dependent in dependents[i]:
+            waiting[dependent]-=1
+            if waiting[dependent]==0:
+                heapq.heappush(queue, key(dependent))
+    if len(order)!=count:
+        raise ValueError("bone hierarchy has a cycle")
+    return order
+
+
+def get_dependencies(bone, count):
+    """
+    indices of the bones that must be evaluated before the bone.
+    """
+    dependencies=[]
+    if 0<=bone.parent_index<count:
+        dependencies.append(bone.parent_index)
+    if (bone.getExternalRotationFlag() or bone.getExternalTranslationFlag()
+            ) and 0<=bone.effect_index<count:
+        dependencies.append(bone.effect_index)
+    return dependencies
+
+
+def group_bones(bones, order):
+    """
+    split the evaluation order into groups. a bone depends only on the bones
+    of the former groups, and a phase(after physics flag, layer) change
+    starts a new group.
+    """
+    count=len(bones)
+    levels=[0]*count
+    floor=0
+    top=-1
+    phase=None
+    for i in order:
+        b=bones[i]
+        bone_phase=(b.getAfterPhysicsDeformFlag(), b.layer)
+        if bone_phase!=phase:
+            phase=bone_phase
+            floor=top+1
+        level=floor
+        for dependency in get_dependencies(b, count):
+            level=max(level, levels[dependency]+1)
+        levels[i]=level
+        top=max(top, level)
+    groups=[[] for _ in range(top+1)]
+    for i in order:
+        groups[levels[i]].append(i)
+    return [numpy.array(g, numpy.int64) for g in groups if g]
+
+
+def project_to_axis(q, axis):
+    """
+    twist of quaternions ...x4 around unit axis ...x3.
+    """
+    twist=numpy.concatenate([
+        numpy.sum(q[..., :3]*axis, axis=-1, keepdims=True)*axis,
+        q[..., 3:]], axis=-1)
+    norm=numpy.linalg.norm(twist, axis=-1, keepdims=True)
+    identity=numpy.zeros_like(twist)
+    identity[..., 3]=1
+    return numpy.where(norm>1e-8, twist/numpy.where(norm>1e-8, norm, 1),
+            identity)
+
+
+class ForwardKinematics(object):
+    """
+    batched forward kinematics over the pmx bone hierarchy.
+
+    :IVariables:
+        parents
+            int B. -1 is root
+        offsets
+            float32 Bx3. bind pose position from the parent
+        groups
+            list of bone index arrays in evaluation order
+    """
+    __slots__=[
+            'parents',
+            'offsets',
+            'groups',
+            'fixed_axes',
+            'has_fixed_axis',
+            'effect_indices',
+            'effect_factors',
+            'has_effect_rotation',
+            'has_effect_translation',
+            ]
+    def __init__(self, model):
+        bones=model.bones
+        count=len(bones)
+        positions=numpy.array([(b.position.x, b.position.y, b.position.z)
+            for b in bones], numpy.float32).reshape(-1, 3)
+        self.parents=numpy.array([b.parent_index
+            if 0<=b.parent_index<count else -1 for b in bones], numpy.int64)
+        parent_positions=numpy.where((self.parents>=0)[:, None],
+                positions[self.parents], 0)
+        self.offsets=(positions-parent_positions).astype(numpy.float32)
+        self.groups=group_bones(bones, sort_bones(bones))
+
+        self.has_fixed_axis=numpy.array([b.getFixedAxisFlag()
+            for b in bones], bool)
+        self.fixed_axes=arraymath.normalize(numpy.array([
+            (b.fixed_axis.x, b.fixed_axis.y, b.fixed_axis.z)
+            for b in bones], numpy.float32).reshape(-1, 3))
+
+        def has_effect(b):
+            return 0<=b.effect_index<count
+        self.has_effect_rotation=numpy.array([
+            b.getExternalRotationFlag() and has_effect(b) for b in bones],
+            bool)
+        self.has_effect_translation=numpy.array([
+            b.getExternalTranslationFlag() and has_effect(b) for b in bones],
+            bool)
+        self.effect_indices=numpy.array([b.effect_index if has_effect(b) else 0
+            for b in bones], numpy.int64)
+        self.effect_factors=numpy.array([b.effect_factor for b in bones],
+                numpy.float32)
+
+    def __str__(self):
+        return '<pmx.ForwardKinematics %d bones, %d groups>' % (
+                len(self.parents), len(self.groups))
+
+    def create_pose(self, pose_count=None):
+        """
+        identity rotations and zero translations.
+        (pose_count)xBx4, (pose_count)xBx3.
+        """
+        shape=(len(self.parents),) if pose_count is None else (
+                pose_count, len(self.parents))
+        rotations=numpy.zeros(shape+(4,), numpy.float32)
+        rotations[..., 3]=1
+        return rotations, numpy.zeros(shape+(3,), numpy.float32)
+
+    def apply_constraints(self, rotations, translations):
+        """
+        return local rotations PxBx4 and translations PxBx3 with fixed axis
+        and effect(grant) applied.
+        """
+        rotations=numpy.array(rotations, numpy.float32)
+        translations=numpy.array(translations, numpy.float32)
+        # fixed axis
+        fixed=self.has_fixed_axis
+        if fixed.any():
+            rotations[:, fixed]=project_to_axis(rotations[:, fixed],
+                    self.fixed_axes[fixed])
+        if not (self.has_effect_rotation.any()
+                or self.has_effect_translation.any()):
+            return rotations, translations
+        identity=numpy.array([0, 0, 0, 1], numpy.float32)
+        for group in self.groups:
+            rotate=group[self.has_effect_rotation[group]]
+            if len(rotate):
+                effect=arraymath.slerp(
+                        numpy.broadcast_to(identity,
+                            rotations[:, rotate].shape),
+                        rotations[:, self.effect_indices[rotate]],
+                        numpy.broadcast_to(self.effect_factors[rotate],
+                            rotations.shape[:1]+rotate.shape))
+                rotations[:, rotate]=arraymath.quaternion_multiply(
+                        effect, rotations[:, rotate])
+            translate=group[self.has_effect_translation[group]]
+            if len(translate):
+                translations[:, translate]+=(
+                        translations[:, self.effect_indices[translate]]
+                        *self.effect_factors[translate][:, None])
+        return rotations, translations
+
+    def compute_globals(self, rotations, translations):
+        """
+        return global matrices PxBx4x4 of local rotations PxBx4 and
+        translations PxBx3.
+        """
+        local_matrices=arraymath.compose_matrices(rotations,
+                translations+self.offsets).astype(numpy.float32)
+        global_matrices=numpy.empty_like(local_matrices)
+        for group in self.groups:
+            roots=self.parents[group]<0
+            global_matrices[:, group[roots]]=local_matrices[:, group[roots]]
+            children=group[~roots]
+            if len(children):
+                global_matrices[:, children]=numpy.matmul(
+                        local_matrices[:, children],
+                        global_matrices[:, self.parents[children]])
+        return global_matrices
+
+    def evaluate(self, rotations=None, translations=None):
+        """
+        return global matrices of poses.
+
+        :Parameters:
+          rotations
+            local rotations (P)xBx4. None is identity
+          translations
+            local translations (P)xBx3. None is zero
+        """
+        rotations, translations=self.broadcast_pose(rotations, translations)
+        single=rotations.ndim==2
+        if single:
+            rotations=rotations[None]
+            translations=translations[None]
+        global_matrices=self.compute_globals(
+                *self.apply_constraints(rotations, translations))
+        if single:
+            return global_matrices[0]
+        return global_matrices
+
+    def broadcast_pose(self, rotations, translations):
+        """
+        return float32 rotations (P)xBx4 and translations (P)xBx3. None is
+        filled with the identity pose of the other shape.
+        """
+        if rotations is None and translations is None:
+            return self.create_pose()
+        if rotations is None:
+            translations=numpy.asarray(translations, numpy.float32)
+            rotations=self.create_pose(
+                    *translations.shape[:-2])[0]
+        elif translations is None:
+            rotations=numpy.asarray(rotations, numpy.float32)
+            translations=self.create_pose(
+                    *rotations.shape[:-2])[1]
+        rotations=numpy.asarray(rotations, numpy.float32)
+        translations=numpy.asarray(translations, numpy.float32)
+        if rotations.shape[:-1]!=translations.shape[:-1]:
+            raise ValueError("pose shape mismatch: {0} {1}".format(
+                rotations.shape, translations.shape))
+        if rotations.shape[-2]!=len(self.parents):
+            raise ValueError("bone count mismatch: {0}".format(
+                rotations.shape))
+        return rotations, translations
+
+
+def create_pose_from_samples(model, bone_samples, frame_count):
+    """
+    return rotations PxBx4 and translations PxBx3 in the model bone order
+    from vmd.sampler.PoseSampler.sample_bones. bones without track are
+    identity.
+
+    :Parameters:
+      model
+        pmx.Model
+      bone_samples
+        {bone name(bytes cp932 or str): (translations Px3, rotations Px4)}
+      frame_count
+        P
+    """
+    count=len(model.bones)
+    rotations=numpy.zeros((frame_count, count, 4), numpy.float32)
+    rotations[..., 3]=1
+    translations=numpy.zeros((frame_count, count, 3), numpy.float32)
+    samples={}
+    for name, value in bone_samples.items():
+        if isinstance(name, bytes):
+            name=name.decode('cp932', 'replace')
+        samples[name]=value
+    for i, b in enumerate(model.bones):
+        if b.name in samples:
+            translations[:, i], rotations[:, i]=samples[b.name]
+    return rotations, translations
@@ -0,0 +1,311 @@
+# coding: utf-8
+"""
+pmx ik
+
+solve the ik chains of pmx.Model by CCD(cyclic coordinate descent) for a
+batch of poses, on top of pymeshio.pmx.fk.
+
+each chain moves the target bone(Ik.target_index) to the ik bone. links are
+rotated from the target side in Ik.link order, the rotation angle of a step
+is limited by Ik.limit_radian, and a link with IkLink.limit_angle is clamped
+to limit_min, limit_max as euler angles(see arraymath.quaternion_to_euler).
+a link limited to one axis(knee) is solved as a hinge around the axis, so
+that it can bend over 90 degrees.
+chains are solved in the evaluation order of the ik bones.
+
+not supported: effect(grant) on the link bones.
+
+>>> import pymeshio.pmx.reader
+>>> from pymeshio.pmx import ik
+>>> m=pymeshio.pmx.reader.read_from_file('resources/初音ミクVer2.pmx')
+>>> solver=ik.IkSolver(m)
+>>> global_matrices, rotations, metrics=solver.solve(rotations, translations)
+>>> print(metrics)
+
+"""
+import numpy
+from .. import arraymath
+from . import fk
+
+
+class IkChain(object):
+    """
+    precomputed index arrays of a pmx.Ik.
+
+    :IVariables:
+        bone_index
+            the ik bone. the goal position
+        target_index
+            the bone moved to the goal
+        loop
+            iteration count
+        limit_radian
+            angle limit of a step
+        links
+            int L. link bone indices from the target side
+        has_limits
+            bool L
+        limit_mins
+            float32 Lx3
+        limit_maxs
+            float32 Lx3
+        hinge_axes
+            int L. 0, 1, 2 for a link limited to one axis, else -1
+        path
+            int. bones from the root side link to the target in evaluation
+            order. globals of these are updated while solving
+    """
+    __slots__=[
+            'bone_index',
+            'target_index',
+            'loop',
+            'limit_radian',
+            'links',
+            'has_limits',
+            'limit_mins',
+            'limit_maxs',
+            'hinge_axes',
+            'path',
+            ]
+    def __init__(self, bones, bone_index):
+        ik=bones[bone_index].ik
+        count=len(bones)
+        self.bone_index=bone_index
+        self.target_index=ik.target_index
+        self.loop=ik.loop
+        self.limit_radian=ik.limit_radian
+        if not 0<=self.target_index<count:
+            raise ValueError("invalid ik target: {0}".format(
+                self.target_index))
+        self.links=numpy.array([l.bone_index for l in ik.link], numpy.int64)
+        self.has_limits=numpy.array([l.limit_angle==1 for l in ik.link],
+                bool)
+        self.limit_mins=numpy.array([
+            (l.limit_min.x, l.limit_min.y, l.limit_min.z) for l in ik.link],
+            numpy.float32).reshape(-1, 3)
+        self.limit_maxs=numpy.array([
+            (l.limit_max.x, l.limit_max.y, l.limit_max.z) for l in ik.link],
+            numpy.float32).reshape(-1, 3)
+        free=self.limit_mins!=self.limit_maxs
+        fixed=(self.limit_mins==0) & (self.limit_maxs==0)
+        self.hinge_axes=numpy.where(self.has_limits
+                & (free.sum(axis=1)==1) & (fixed.sum(axis=1)==2),
+                numpy.argmax(free, axis=1), -1)
+        # ancestors of the target up to the root side link
+        ancestors=[]
+        index=self.target_index
+        while 0<=index<count and len(ancestors)<=count:
+            ancestors.append(index)
+            index=bones[index].parent_index
+        for link in self.links:
+            if link not in ancestors[1:]:
+                raise ValueError(
+                        "ik link {0} is not an ancestor of target {1}".format(
+                            link, self.target_index))
+        top=max(ancestors.index(link) for link in self.links) if len(
+                self.links) else 0
+        self.path=numpy.array(ancestors[top::-1], numpy.int64)
+
+    def __str__(self):
+        return '<pmx.IkChain %d -> %d, %d links, loop %d>' % (
+                self.target_index, self.bone_index, len(self.links),
+                self.loop)
+
+
+class IkMetrics(object):
+    """
+    result of IkSolver.solve.
+
+    :IVariables:
+        iterations
+            int C. iterations run for each chain
+        errors
+            float32 PxC. distance from the target to the goal after solving
+        converged
+            bool PxC. error is within the tolerance
+    """
+    __slots__=[
+            'iterations',
+            'errors',
+            'converged',
+            ]
+    def __init__(self, iterations, errors, converged):
+        self.iterations=iterations
+        self.errors=errors
+        self.converged=converged
+
+    def __str__(self):
+        return '<pmx.IkMetrics chains: %d, iterations: %d, converged: %d/%d, max error: %g>' % (
+                len(self.iterations), int(self.iterations.sum()),
+                int(self.converged.sum()), self.converged.size,
+                float(self.errors.max()) if self.errors.size else 0.0)
+
+    def get_convergence_rate(self):
+        """
+        ratio of the converged (pose, chain) pairs.
+        """
+        if self.converged.size==0:
+            return 1.0
+        return float(self.converged.mean())
+
+
+class IkSolver(object):
+    """
+    CCD ik solver over pmx.fk.ForwardKinematics.
+
+    :IVariables:
+        fk
+            pmx.fk.ForwardKinematics
+        chains
+            list of IkChain in evaluation order
+        tolerance
+            a pose stops iterating when the target is within this distance
+            of the goal
+    """
+    __slots__=[
+            'fk',
+            'chains',
+            'tolerance',
+            ]
+    def __init__(self, model, tolerance=1e-4, kinematics=None):
+        self.fk=kinematics or fk.ForwardKinematics(model)
+        self.tolerance=tolerance
+        order=[i for group in self.fk.groups for i in group]
+        self.chains=[IkChain(model.bones, i) for i in order
+                if model.bones[i].getIkFlag() and model.bones[i].ik]
+
+    def __str__(self):
+        return '<pmx.IkSolver %d chains>' % len(self.chains)
+
+    def solve(self, rotations=None, translations=None, max_loop=None):
+        """
+        return (global matrices (P)xBx4x4, solved local rotations (P)xBx4,
+        IkMetrics).
+
+        :Parameters:
+          rotations
+            local rotations (P)xBx4. None is identity
+          translations
+            local translations (P)xBx3. None is zero
+          max_loop
+            cap the iteration count of every chain
+        """
+        rotations, translations=self.fk.broadcast_pose(
+                rotations, translations)
+        single=rotations.ndim==2
+        rotations=numpy.array(rotations[None] if single else rotations)
+        translations=translations[None] if single else translations
+        pose_count=len(rotations)
+
+        iterations=numpy.zeros(len(self.chains), numpy.int64)
+        errors=numpy.zeros((pose_count, len(self.chains)), numpy.float32)
+        constrained, constrained_translations=self.fk.apply_constraints(
+                rotations, translations)
+        global_matrices=self.fk.compute_globals(
+                constrained, constrained_translations)
+        for i, chain in enumerate(self.chains):
+            loop=chain.loop if max_loop is None else min(chain.loop, max_loop)
+            iterations[i], errors[:, i]=self.solve_chain(chain, loop,
+                    constrained, constrained_translations, global_matrices)
+            rotations[:, chain.links]=constrained[:, chain.links]
+            constrained, constrained_translations=self.fk.apply_constraints(
+                    rotations, translations)
+            global_matrices=self.fk.compute_globals(
+                    constrained, constrained_translations)
+
+        metrics=IkMetrics(iterations, errors, errors<=self.tolerance)
+        if single:
+            return global_matrices[0], rotations[0], metrics
+        return global_matrices, rotations, metrics
+
+    def solve_chain(self, chain, loop, rotations, translations,
+            global_matrices):
+        """
+        rotate the links of the chain in place. return (iteration count,
+        errors P).
+        """
+        goal=global_matrices[:, chain.bone_index, 3, :3].copy()
+        target=global_matrices[:, chain.target_index, 3]
+        errors=numpy.linalg.norm(target[:, :3]-goal, axis=-1)
+        active=errors>self.tolerance
+        iteration=0
+        while iteration<loop and active.any():
+            iteration+=1
+            for k, link in enumerate(chain.links):
+                self.__rotate_link(chain, k, link, goal, active,
+                        rotations, translations, global_matrices)
+            errors=numpy.linalg.norm(target[:, :3]-goal, axis=-1)
+            active&=errors>self.tolerance
+        return iteration, errors
+
+    def __rotate_link(self, chain, k, link, goal, active,
+            rotations, translations, global_matrices):
+        link_matrix=global_matrices[:, link]
+        origin=link_matrix[:, 3, :3]
+        # world to link space. the rotation part is orthonormal
+        inverse=numpy.swapaxes(link_matrix[:, :3, :3], -1, -2)
+        to_target=arraymath.normalize(numpy.einsum('pi,pij->pj',
+            global_matrices[:, chain.target_index, 3, :3]-origin, inverse))
+        to_goal=arraymath.normalize(numpy.einsum('pi,pij->pj',
+            goal-origin, inverse))
+        if chain.hinge_axes[k]>=0:
+            self.__rotate_hinge(chain, k, link, to_target, to_goal, active,
+                    rotations)
+            self.__update_path(chain, link, rotations, translations,
+                    global_matrices)
+            return
+        axis=numpy.cross(to_target, to_goal)
+        axis_length=numpy.linalg.norm(axis, axis=-1)
+        # atan2 keeps the precision of small angles
+        angle=numpy.arctan2(axis_length,
+                numpy.sum(to_target*to_goal, axis=-1))
+        angle=numpy.minimum(angle, chain.limit_radian)
+        moving=active & (axis_length>1e-8) & (angle>1e-8)
+        if not moving.any():
+            return
+        delta=arraymath.quaternion_from_axis_angle(
+                arraymath.normalize(axis), numpy.where(moving, angle, 0))
+        rotation=arraymath.quaternion_multiply(rotations[:, link], delta)
+        if chain.has_limits[k]:
+            rotation=arraymath.quaternion_from_euler(numpy.clip(
+                arraymath.quaternion_to_euler(rotation),
+                chain.limit_mins[k], chain.limit_maxs[k]))
+        rotations[:, link]=numpy.where(moving[:, None],
+                arraymath.normalize(rotation), rotations[:, link])
+        self.__update_path(chain, link, rotations, translations,
+                global_matrices)
+
+    def __rotate_hinge(self, chain, k, link, to_target, to_goal, active,
+            rotations):
+        hinge=chain.hinge_axes[k]
+        axis=numpy.zeros(3, numpy.float32)
+        axis[hinge]=1
+        # signed angle around the axis in the plane perpendicular to it
+        delta=numpy.arctan2(
+                numpy.sum(numpy.cross(to_target, to_goal)*axis, axis=-1),
+                numpy.sum(to_target*to_goal, axis=-1)
+                -to_target[:, hinge]*to_goal[:, hinge])
+        delta=numpy.clip(delta, -chain.limit_radian, chain.limit_radian)
+        twist=fk.project_to_axis(rotations[:, link], axis)
+        current=2*numpy.arctan2(twist[:, hinge], twist[:, 3])
+        current=numpy.arctan2(numpy.sin(current), numpy.cos(current))
+        angle=numpy.clip(current+delta, chain.limit_mins[k, hinge],
+                chain.limit_maxs[k, hinge])
+        rotations[:, link]=numpy.where(active[:, None],
+                arraymath.quaternion_from_axis_angle(axis, angle),
+                rotations[:, link])
+
+    def __update_path(self, chain, link, rotations, translations,
+            global_matrices):
+        kinematics=self.fk
+        start=int(numpy.flatnonzero(chain.path==link)[0])
+        bones=chain.path[start:]
+        local_matrices=arraymath.compose_matrices(rotations[:, bones],
+                translations[:, bones]+kinematics.offsets[bones])
+        for i, bone in enumerate(bones):
+            parent=kinematics.parents[bone]
+            if parent<0:
+                global_matrices[:, bone]=local_matrices[:, i]
+            else:
+                global_matrices[:, bone]=numpy.matmul(local_matrices[:, i],
+                        global_matrices[:, parent])
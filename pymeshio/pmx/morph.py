@@ -0,0 +1,534 @@
+# coding: utf-8
+"""
+pmx morph engine
+
+compile the morphs of pmx.Model into sparse arrays and evaluate a weight
+vector(one weight per model.morphs) at once.
+
+each morph type is a CSR matrix(CsrMatrix). a row is a morph, a column is
+a vertex, bone or material index, and a value is the offset. evaluation is
+the product of the weight vector and the matrix.
+
+* group morphs are flattened into the weights of their leaf morphs
+  (nested groups multiply the factors). a cycle raises ValueError.
+* bone rotation is the normalized sum of w*(q-identity)(nlerp). for a
+  single morph this is nlerp(identity, q, w).
+* material multiply is 1+sum(w*(m-1)), add is sum(w*a). material index -1
+  applies to every material.
+
+>>> import pymeshio.pmx.reader
+>>> from pymeshio.pmx import morph
+>>> m=pymeshio.pmx.reader.read_from_file('resources/初音ミクVer2.pmx')
+>>> engine=morph.MorphEngine(m)
+>>> result=engine.evaluate(engine.create_weights({u'あ': 1.0}))
+>>> positions=vertices.positions+result.position_offsets
+
+"""
+import numpy
+from .. import pmx
+
+
+# (name, width) of the material morph parameters in the column order
+MATERIAL_MORPH_FIELDS=[
+        ('diffuse', 4),
+        ('specular', 3),
+        ('specular_factor', 1),
+        ('ambient', 3),
+        ('edge_color', 4),
+        ('edge_size', 1),
+        ('texture_factor', 4),
+        ('sphere_texture_factor', 4),
+        ('toon_texture_factor', 4),
+        ]
+MATERIAL_MORPH_WIDTH=sum(width for _, width in MATERIAL_MORPH_FIELDS)
+
+UV_MORPH_TYPES=[
+        pmx.MORPH_UV,
+        pmx.MORPH_EXTENDED_UV1,
+        pmx.MORPH_EXTENDED_UV2,
+        pmx.MORPH_EXTENDED_UV3,
+        pmx.MORPH_EXTENDED_UV4,
+        ]
+
+
+class CsrMatrix(object):
+    """
+    compressed sparse rows of offsets.
+
+    :IVariables:
+        indptr
+            int64 R+1. offsets of the row r are [indptr[r], indptr[r+1])
+        indices
+            int64 nnz. column(target) indices
+        data
+            float32 nnzxC
+        size
+            column count
+    """
+    __slots__=[
+            'indptr',
+            'indices',
+            'data',
+            'size',
+            ]
+    def __init__(self, indptr, indices, data, size):
+        self.indptr=indptr
+        self.indices=indices
+        self.data=data
+        self.size=size
+
+    def __str__(self):
+        return '<CsrMatrix %dx%d nnz: %d>' % (
+                len(self.indptr)-1, self.size, len(self.indices))
+
+    def __len__(self):
+        return len(self.indptr)-1
+
+    @staticmethod
+    def create(rows, size, width):
+        """
+        :Parameters:
+          rows
+            list of (indices, data nxwidth) for each row
+          size
+            column count
+          width
+            C
+        """
+        counts=[len(indices) for indices, _ in rows]
+        indptr=numpy.zeros(len(rows)+1, numpy.int64)
+        numpy.cumsum(counts, out=indptr[1:])
+        indices=numpy.concatenate([numpy.asarray(indices, numpy.int64)
+            for indices, _ in rows]+[numpy.zeros(0, numpy.int64)])
+        data=numpy.concatenate([
+            numpy.asarray(data, numpy.float32).reshape(-1, width)
+            for _, data in rows]+[numpy.zeros((0, width), numpy.float32)])
+        if len(indices) and (indices.min()<0 or indices.max()>=size):
+            raise ValueError("morph offset index out of range")
+        return CsrMatrix(indptr, indices, data, size)
+
+    def get_entries(self, rows):
+        """
+        return the entry indices of the rows and the position of each entry
+        in rows.
+        """
+        starts=self.indptr[rows]
+        counts=self.indptr[rows+1]-starts
+        total=int(counts.sum())
+        owners=numpy.repeat(numpy.arange(len(rows)), counts)
+        # entry=start of the owner row+rank in the row
+        ranks=numpy.arange(total)-numpy.repeat(
+                numpy.cumsum(counts)-counts, counts)
+        return starts[owners]+ranks, owners
+
+    def count_entries(self, rows):
+        """
+        return the offset count of the rows.
+        """
+        return int((self.indptr[rows+1]-self.indptr[rows]).sum())
+
+    def accumulate(self, out, weights, rows):
+        """
+        add weights(R) times the rows of the matrix to out(sizexC) in place.
+        the cost is proportional to the offsets of the rows.
+        """
+        entries, owners=self.get_entries(rows)
+        if len(entries)==0:
+            return
+        scaled=self.data[entries]*numpy.asarray(
+                weights, numpy.float64)[rows][owners][:, None]
+        targets, inverse=numpy.unique(self.indices[entries],
+                return_inverse=True)
+        width=self.data.shape[1]
+        flat=(inverse.reshape(-1)[:, None]*width+numpy.arange(width)).ravel()
+        out[targets]+=numpy.bincount(flat, weights=scaled.ravel(),
+                minlength=len(targets)*width).reshape(-1, width)
+
+    def multiply(self, weights, rows=None):
+        """
+        return weights(R) times the matrix(float32 sizexC).
+
+        :Parameters:
+          weights
+            float R
+          rows
+            only these rows are evaluated. default is the nonzero weights
+        """
+        weights=numpy.asarray(weights, numpy.float64)
+        if rows is None:
+            rows=numpy.flatnonzero(weights)
+        width=self.data.shape[1]
+        entries, owners=self.get_entries(rows)
+        if len(entries)==0:
+            return numpy.zeros((self.size, width), numpy.float32)
+        scaled=self.data[entries]*weights[rows][owners][:, None]
+        # one bincount over (column index, component)
+        flat=(self.indices[entries][:, None]*width
+                +numpy.arange(width)).ravel()
+        return numpy.bincount(flat, weights=scaled.ravel(),
+                minlength=self.size*width).reshape(
+                        self.size, width).astype(numpy.float32)
+
+
+def flatten_groups(morphs):
+    """
+    return CsrMatrix(morph count x morph count, width 1). the row of a group
+    morph holds the factors of its leaf(non group) morphs.
+
+    raise ValueError if group morphs have a cycle.
+    """
+    count=len(morphs)
+    flattened={}
+    visiting=set()
+
+    def flatten(index):
+        if index in flattened:
+            return flattened[index]
+        if index in visiting:
+            raise ValueError("group morph cycle: {0}".format(
+                morphs[index].name))
+        visiting.add(index)
+        leaves={}
+        for data in morphs[index].offsets:
+            child=data.morph_index
+            if not 0<=child<count:
+                raise ValueError("group morph index out of range: {0}".format(
+                    child))
+            if morphs[child].morph_type==pmx.MORPH_GROUP:
+                for leaf, factor in flatten(child).items():
+                    leaves[leaf]=leaves.get(leaf, 0)+factor*data.value
+            else:
+                leaves[child]=leaves.get(child, 0)+data.value
+        visiting.discard(index)
+        flattened[index]=leaves
+        return leaves
+
+    rows=[]
+    for i, m in enumerate(morphs):
+        if m.morph_type==pmx.MORPH_GROUP:
+            leaves=flatten(i)
+            rows.append((list(leaves.keys()), list(leaves.values())))
+        else:
+            rows.append(([], []))
+    return CsrMatrix.create(rows, count, 1)
+
+
+def get_vertex_offsets(morph):
+    offsets=morph.offsets
+    if isinstance(offsets, pmx.VertexMorphOffsetArray):
+        return offsets.vertex_indices, offsets.position_offsets
+    return ([o.vertex_index for o in offsets],
+            [(o.position_offset.x, o.position_offset.y, o.position_offset.z)
+                for o in offsets])
+
+
+def get_material_values(data):
+    return (data.diffuse.r, data.diffuse.g, data.diffuse.b, data.diffuse.a,
+            data.specular.r, data.specular.g, data.specular.b,
+            data.specular_factor,
+            data.ambient.r, data.ambient.g, data.ambient.b,
+            data.edge_color.r, data.edge_color.g, data.edge_color.b,
+            data.edge_color.a,
+            data.edge_size)+tuple(
+                    value for color in (data.texture_factor,
+                        data.sphere_texture_factor, data.toon_texture_factor)
+                    for value in (color.r, color.g, color.b, color.a))
+
+
+class MorphResult(object):
+    """
+    evaluated morph offsets.
+
+    :IVariables:
+        position_offsets
+            float32 Nx3
+        uv_offsets
+            float32 5xNx4. uv and extended uv 1-4
+        bone_translations
+            float32 Bx3
+        bone_rotations
+            float32 Bx4. identity for bones without morph
+        material_multiply
+            float32 KxMATERIAL_MORPH_WIDTH
+        material_add
+            float32 KxMATERIAL_MORPH_WIDTH
+    """
+    __slots__=[
+            'position_offsets',
+            'uv_offsets',
+            'bone_translations',
+            'bone_rotations',
+            'material_multiply',
+            'material_add',
+            ]
+    def __init__(self, position_offsets, uv_offsets,
+            bone_translations, bone_rotations,
+            material_multiply, material_add):
+        self.position_offsets=position_offsets
+        self.uv_offsets=uv_offsets
+        self.bone_translations=bone_translations
+        self.bone_rotations=bone_rotations
+        self.material_multiply=material_multiply
+        self.material_add=material_add
+
+    def apply_material(self, values):
+        """
+        return values(KxMATERIAL_MORPH_WIDTH)*multiply+add
+        """
+        return numpy.asarray(values, numpy.float32)*self.material_multiply+(
+                self.material_add)
+
+
+class MorphEngine(object):
+    """
+    compiled morphs of a pmx.Model.
+
+    :IVariables:
+        names
+            morph names in the model order
+        groups
+            CsrMatrix of flatten_groups
+        vertices
+            CsrMatrix of position offsets(width 3)
+        uvs
+            CsrMatrix list of uv and extended uv 1-4(width 4)
+        bones
+            CsrMatrix of bone translation and rotation-identity(width 7)
+        material_multiply
+            CsrMatrix of multiply material morph m-1
+        material_add
+            CsrMatrix of add material morph
+    """
+    __slots__=[
+            'names',
+            'groups',
+            'vertices',
+            'uvs',
+            'bones',
+            'material_multiply',
+            'material_add',
+            ]
+    def __init__(self, model):
+        morphs=model.morphs
+        vertex_count=len(model.vertices)
+        bone_count=len(model.bones)
+        material_count=len(model.materials)
+        self.names=[m.name for m in morphs]
+        self.groups=flatten_groups(morphs)
+
+        empty=([], [])
+        def rows(morph_type, get_row):
+            return [get_row(m) if m.morph_type==morph_type else empty
+                    for m in morphs]
+        self.vertices=CsrMatrix.create(
+                rows(pmx.MORPH_VERTEX, get_vertex_offsets), vertex_count, 3)
+        self.uvs=[CsrMatrix.create(rows(morph_type, lambda m: (
+            [o.vertex_index for o in m.offsets],
+            [(o.uv.x, o.uv.y, o.uv.z, o.uv.w) for o in m.offsets])),
+            vertex_count, 4)
+            for morph_type in UV_MORPH_TYPES]
+        self.bones=CsrMatrix.create(rows(pmx.MORPH_BONE, lambda m: (
+            [o.bone_index for o in m.offsets],
+            [self.__bone_values(o) for o in m.offsets])),
+            bone_count, 7)
+
+        def material_row(calc_mode, to_value):
+            def get_row(m):
+                indices=[]
+                values=[]
+                for o in m.offsets:
+                    if o.calc_mode!=calc_mode:
+                        continue
+                    targets=(range(material_count) if o.material_index<0
+                            else [o.material_index])
+                    value=to_value(numpy.array(get_material_values(o),
+                        numpy.float32))
+                    for target in targets:
+                        indices.append(target)
+                        values.append(value)
+                return indices, values
+            return get_row
+        self.material_multiply=CsrMatrix.create(rows(pmx.MORPH_MATERIAL,
+            material_row(0, lambda value: value-1)),
+            material_count, MATERIAL_MORPH_WIDTH)
+        self.material_add=CsrMatrix.create(rows(pmx.MORPH_MATERIAL,
+            material_row(1, lambda value: value)),
+            material_count, MATERIAL_MORPH_WIDTH)
+
+    def __str__(self):
+        return '<pmx.MorphEngine %d morphs, vertex offsets: %d>' % (
+                len(self.names), len(self.vertices.indices))
+
+    def __bone_values(self, data):
+        rotation=data.rotation
+        q=numpy.array([rotation.x, rotation.y, rotation.z, rotation.w],
+                numpy.float64)
+        # shortest path
+        if q[3]<0:
+            q=-q
+        q-=(0, 0, 0, 1)
+        return (data.position.x, data.position.y, data.position.z)+tuple(q)
+
+    def create_weights(self, weights=None):
+        """
+        return float32 weight vector from {morph name: weight}.
+        unknown names are ignored.
+        """
+        vector=numpy.zeros(len(self.names), numpy.float32)
+        if weights:
+            index=dict((name, i) for i, name in enumerate(self.names))
+            for name, weight in weights.items():
+                if name in index:
+                    vector[index[name]]=weight
+        return vector
+
+    def expand_weights(self, weights):
+        """
+        return the weights of the leaf morphs. the weight of a group morph
+        is moved to its leaves.
+        """
+        weights=numpy.asarray(weights, numpy.float32)
+        if weights.shape!=(len(self.names),):
+            raise ValueError("weights shape must be {0}: {1}".format(
+                (len(self.names),), weights.shape))
+        group_rows=self.groups.indptr[1:]>self.groups.indptr[:-1]
+        expanded=numpy.where(group_rows, 0, weights)
+        expanded+=self.groups.multiply(
+                numpy.where(group_rows, weights, 0))[:, 0]
+        return expanded
+
+    def evaluate(self, weights):
+        """
+        return MorphResult of the weight vector(model.morphs order).
+        """
+        weights=self.expand_weights(weights)
+        rows=numpy.flatnonzero(weights)
+        return MorphResult(
+                self.vertices.multiply(weights, rows),
+                numpy.stack([uv.multiply(weights, rows) for uv in self.uvs]),
+                *(self.evaluate_bones(weights, rows)
+                    +self.evaluate_materials(weights, rows)))
+
+    def evaluate_bones(self, weights, rows):
+        """
+        return bone translations and rotations of leaf weights.
+        """
+        bones=self.bones.multiply(weights, rows)
+        rotations=bones[:, 3:]
+        rotations[:, 3]+=1
+        norm=numpy.linalg.norm(rotations, axis=-1, keepdims=True)
+        return bones[:, :3], rotations/numpy.where(norm>0, norm, 1)
+
+    def evaluate_materials(self, weights, rows):
+        """
+        return material multiply and add parameters of leaf weights.
+        """
+        return (self.material_multiply.multiply(weights, rows)+1,
+                self.material_add.multiply(weights, rows))
+
+
+class IncrementalMorphEvaluator(object):
+    """
+    stateful MorphEngine evaluation for playback.
+
+    the accumulated vertex and uv offsets are kept, and update applies only
+    the weight differences of the changed leaf morphs, so the cost follows
+    the offsets of the changed morphs, not the model. a full recompute runs
+    every full_interval updates to bound float error, or when the changed
+    offsets exceed the half of all offsets.
+
+    the arrays of the returned MorphResult are updated in place by the next
+    update. copy them to keep.
+
+    :IVariables:
+        engine
+            MorphEngine
+        full_interval
+            updates between full recomputes
+        changed_offset_count
+            offsets applied by the last update
+        recomputed
+            the last update was a full recompute
+    """
+    __slots__=[
+            'engine',
+            'full_interval',
+            'weights',
+            'result',
+            'update_count',
+            'changed_offset_count',
+            'recomputed',
+            ]
+    def __init__(self, engine, full_interval=256):
+        self.engine=engine
+        self.full_interval=full_interval
+        self.reset()
+
+    def __str__(self):
+        return '<pmx.IncrementalMorphEvaluator %d updates>' % (
+                self.update_count)
+
+    def reset(self):
+        """
+        clear all weights.
+        """
+        self.weights=numpy.zeros(len(self.engine.names), numpy.float32)
+        self.result=self.engine.evaluate(self.weights)
+        self.update_count=0
+        self.changed_offset_count=0
+        self.recomputed=True
+
+    def get_total_offset_count(self):
+        engine=self.engine
+        return len(engine.vertices.indices)+sum(
+                len(uv.indices) for uv in engine.uvs)
+
+    def update(self, weights):
+        """
+        return MorphResult of the weight vector(model.morphs order).
+        """
+        engine=self.engine
+        weights=engine.expand_weights(weights)
+        rows=numpy.flatnonzero(weights!=self.weights)
+        difference=weights.astype(numpy.float64)-self.weights
+        changed=engine.vertices.count_entries(rows)+sum(
+                uv.count_entries(rows) for uv in engine.uvs)
+        self.update_count+=1
+        if (self.update_count>=self.full_interval
+                or changed*2>self.get_total_offset_count()):
+            return self.__recompute(weights)
+        self.recomputed=False
+        self.changed_offset_count=changed
+        if len(rows)==0:
+            return self.result
+        result=self.result
+        engine.vertices.accumulate(result.position_offsets, difference, rows)
+        for uv, offsets in zip(engine.uvs, result.uv_offsets):
+            uv.accumulate(offsets, difference, rows)
+        # bones and materials are few. recompute if touched
+        if engine.bones.count_entries(rows):
+            (result.bone_translations, result.bone_rotations
+                    )=engine.evaluate_bones(weights, numpy.flatnonzero(
+                        weights))
+        if (engine.material_multiply.count_entries(rows)
+                or engine.material_add.count_entries(rows)):
+            (result.material_multiply, result.material_add
+                    )=engine.evaluate_materials(weights, numpy.flatnonzero(
+                        weights))
+        self.weights=weights
+        return result
+
+    def __recompute(self, weights):
+        result=self.engine.evaluate(weights)
+        # keep the arrays of the previous result
+        self.result.position_offsets[...]=result.position_offsets
+        self.result.uv_offsets[...]=result.uv_offsets
+        self.result.bone_translations=result.bone_translations
+        self.result.bone_rotations=result.bone_rotations
+        self.result.material_multiply=result.material_multiply
+        self.result.material_add=result.material_add
+        self.weights=weights
+        self.update_count=0
+        self.changed_offset_count=self.get_total_offset_count()
+        self.recomputed=True
+        return self.result
@@ -0,0 +1,534 @@
+# coding: utf-8
+"""
+pmx mesh optimization
+
+optimize pmx.Model in place.
+
+welding
+~~~~~~~
+two vertices are welded when they are within the epsilons on position,
+normal, uv, sdef parameters, edge factor and deform weights, have the same
+deform type and bone indices, and have the same vertex and uv morph
+offsets. candidates are found by a uniform grid of the positions hashed
+by the cell index, so the pass is linear in the vertex count instead of
+comparing every pair.
+
+welding keeps the first vertex of a group. indices and the vertex
+indices of vertex and uv morphs are remapped, triangles that became
+degenerate are removed and material vertex_count is updated.
+
+vertex cache
+~~~~~~~~~~~~
+triangles are reordered within each material by Tipsify(Sander et al.
+2007) for the post-transform vertex cache, then vertices are renumbered
+in the order of the first use for the vertex fetch. the efficiency is
+measured by simulating a FIFO cache:
+
+* ACMR: transformed vertices per triangle. 0.5 is ideal, 3 is worst
+* ATVR: transformed vertices per referenced vertex. 1 is ideal
+
+weld first for a model with a vertex per corner(obj_to_pmx), otherwise
+no vertex is shared and the cache can not help.
+
+>>> import pymeshio.pmx.reader
+>>> from pymeshio.pmx import optimize
+>>> m=pymeshio.pmx.reader.read_from_file('resources/初音ミクVer2.pmx')
+>>> remap=optimize.weld_vertices(m, position_epsilon=1e-4)
+>>> print(optimize.optimize_vertex_cache(m))
+
+"""
+import numpy
+from .. import pmx
+from . import morph
+
+
+# the own cell and half of the 26 neighbor cells. the other half is the
+# same pairs seen from the neighbor
+NEIGHBOR_CELLS=[(x, y, z)
+    for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)
+    if (x, y, z)>=(0, 0, 0)]
+# grid resolution limit of an axis. the cell key fits in int64
+MAX_CELLS=1<<20
+# vectorized rounds of resolve_representatives before the sequential loop
+MAX_ROUNDS=16
+
+
+def expand_ranges(starts, counts):
+    """
+    concatenation of range(start, start+count).
+    """
+    total=int(counts.sum())
+    return numpy.repeat(starts-(numpy.cumsum(counts)-counts), counts
+            )+numpy.arange(total)
+
+
+def find_pairs(positions, epsilon):
+    """
+    return (i, j) int64 arrays of the vertex pairs(i<j) in the neighbor
+    cells of the grid. every pair within epsilon on each axis is included
+    once.
+
+    the cell size is epsilon, or larger for a huge extent. a cell is keyed
+    by its linear index and the sorted keys are the hash table, so the
+    neighbor cell of every cell is found by one searchsorted. a pair of
+    different cells is visited from one side only, and a pair in the same
+    cell in the order of the cell, so no pair is repeated.
+    """
+    empty=numpy.empty(0, numpy.int64)
+    if len(positions)==0 or epsilon<=0:
+        return empty, empty
+    positions=numpy.asarray(positions, numpy.float64)
+    lower=positions.min(axis=0)
+    extent=float((positions.max(axis=0)-lower).max())
+    cell_size=max(epsilon, extent/MAX_CELLS)
+    # one cell margin so that a neighbor key never wraps
+    cells=numpy.floor((positions-lower)/cell_size).astype(numpy.int64)+1
+    dims=cells.max(axis=0)+2
+    keys=(cells[:, 0]*dims[1]+cells[:, 1])*dims[2]+cells[:, 2]
+    # vertices of the cell k are order[starts[k]:starts[k]+counts[k]]
+    order=numpy.argsort(keys, kind='stable')
+    cell_keys, starts, counts=numpy.unique(keys[order],
+            return_index=True, return_counts=True)
+    lhs=[]
+    rhs=[]
+    for x, y, z in NEIGHBOR_CELLS:
+        query=cell_keys+(x*dims[1]+y)*dims[2]+z
+        found=numpy.minimum(numpy.searchsorted(cell_keys, query),
+                len(cell_keys)-1)
+        a=numpy.flatnonzero(cell_keys[found]==query)
+        b=found[a]
+        # every vertex of the cell a with every vertex of the cell b
+        sizes=counts[a]*counts[b]
+        pair=numpy.repeat(numpy.arange(len(a)), sizes)
+        k=expand_ranges(numpy.zeros(len(a), numpy.int64), sizes)
+        p=k//counts[b][pair]
+        q=k%counts[b][pair]
+        if (x, y, z)==(0, 0, 0):
+            pair=pair[p<q]
+            p, q=p[p<q], q[p<q]
+        i=order[starts[a][pair]+p]
+        j=order[starts[b][pair]+q]
+        lhs.append(numpy.minimum(i, j))
+        rhs.append(numpy.maximum(i, j))
+    return numpy.concatenate(lhs), numpy.concatenate(rhs)
+
+
+def get_morph_signatures(model, count, position_epsilon, uv_epsilon):
+    """
+    uint64 hash of the vertex and uv morph offsets of each vertex.
+    vertices with different signatures must not be welded.
+    """
+    signatures=numpy.zeros(count, numpy.uint64)
+    for i, m in enumerate(model.morphs):
+        if m.morph_type==pmx.MORPH_VERTEX:
+            indices, values=morph.get_vertex_offsets(m)
+            epsilon=position_epsilon
+        elif pmx.MORPH_UV<=m.morph_type<=pmx.MORPH_EXTENDED_UV4:
+            indices=[o.vertex_index for o in m.offsets]
+            values=[(o.uv.x, o.uv.y, o.uv.z, o.uv.w) for o in m.offsets]
+            epsilon=uv_epsilon
+        else:
+            continue
+        indices=numpy.asarray(indices, numpy.int64)
+        if len(indices)==0:
+            continue
+        values=numpy.asarray(values, numpy.float64).reshape(len(indices), -1)
+        quantized=numpy.round(values/max(epsilon, 1e-12)).astype(numpy.int64)
+        h=numpy.full(len(indices), i*2654435761+1, numpy.uint64)
+        for k in range(quantized.shape[1]):
+            h=h*numpy.uint64(1099511628211)^quantized[:, k].astype(
+                    numpy.uint64)
+        numpy.add.at(signatures, indices, h)
+    return signatures
+
+
+def find_representatives(vertices, signatures,
+        position_epsilon, normal_epsilon, uv_epsilon, weight_epsilon):
+    """
+    return int64 N. the index of the vertex each vertex is welded to.
+    a representative points to itself.
+    """
+    count=len(vertices)
+    representatives=numpy.arange(count)
+    if count==0:
+        return representatives
+    positions=numpy.asarray(vertices.positions, numpy.float64)
+    i, j=find_pairs(positions, position_epsilon)
+    if len(i)==0:
+        return representatives
+
+    def close(column, epsilon):
+        column=numpy.asarray(column, numpy.float64)
+        if column.ndim==1:
+            return numpy.abs(column[i]-column[j])<=epsilon
+        return numpy.all(numpy.abs(column[i]-column[j])<=epsilon, axis=1)
+    deform_types=numpy.asarray(vertices.deform_types)
+    bone_indices=numpy.asarray(vertices.bone_indices)
+    matched=(close(positions, position_epsilon)
+            & close(vertices.normals, normal_epsilon)
+            & close(vertices.uvs, uv_epsilon)
+            & close(vertices.edge_factors, weight_epsilon)
+            & close(vertices.weights, weight_epsilon)
+            & (deform_types[i]==deform_types[j])
+            & numpy.all(bone_indices[i]==bone_indices[j], axis=1)
+            & (signatures[i]==signatures[j]))
+    sdef=matched & (deform_types[i]==pmx.DEFORM_SDEF)
+    if sdef.any():
+        for column in (vertices.sdef_c, vertices.sdef_r0, vertices.sdef_r1):
+            matched&=~sdef | close(column, position_epsilon)
+    return resolve_representatives(count, i[matched], j[matched])
+
+
+def resolve_representatives(count, i, j):
+    """
+    return int64 N. the vertex j of the pairs(i<j) is welded to its
+    smallest i which is a representative itself, the same as visiting the
+    pairs in the order of (j, i). so a group never spans more than epsilon
+    from its first vertex.
+
+    a vertex is decided when its first candidate not welded is a
+    representative(welded to it) or it has none(a representative). a round
+    decides all of them at once. a vertex waits only for a smaller one, so
+    a round decides at least the smallest. a long chain left after
+    MAX_ROUNDS is finished by visiting the pairs one by one.
+    """
+    representatives=numpy.arange(count)
+    order=numpy.lexsort((i, j))
+    i=i[order]
+    j=j[order]
+    UNDECIDED, REPRESENTATIVE, WELDED=0, 1, 2
+    state=numpy.full(count, REPRESENTATIVE, numpy.int8)
+    state[j]=UNDECIDED
+    for _ in range(MAX_ROUNDS):
+        if len(j)==0:
+            break
+        # pairs of the vertex j[starts[k]] are starts[k]:starts[k+1]
+        starts=numpy.flatnonzero(numpy.concatenate([[True], j[1:]!=j[:-1]]))
+        candidates=numpy.where(state[i]!=WELDED, numpy.arange(len(i)), len(i))
+        first=numpy.minimum.reduceat(candidates, starts)
+        b=j[starts]
+        alone=first==len(i)
+        state[b[alone]]=REPRESENTATIVE
+        a=i[numpy.where(alone, 0, first)]
+        welded=~alone & (state[a]==REPRESENTATIVE)
+        representatives[b[welded]]=a[welded]
+        state[b[welded]]=WELDED
+        undecided=state[j]==UNDECIDED
+        i=i[undecided]
+        j=j[undecided]
+    for a, b in zip(i.tolist(), j.tolist()):
+        if representatives[b]==b and representatives[a]==a:
+            representatives[b]=a
+    return representatives
+
+
+def remap_vertices(model, remap, sources, merge=False):
+    """
+    renumber the vertices of the model in place.
+
+    :Parameters:
+      model
+        pmx.Model
+      remap
+        int N. new index of each old vertex
+      sources
+        int M. old vertex of each new vertex
+      merge
+        old vertices were merged(welded). the vertex and uv morph offsets
+        of a merged vertex are the same, so only the first is kept.
+        otherwise every offset is kept
+    """
+    remap=numpy.asarray(remap, numpy.int64)
+    sources=numpy.asarray(sources, numpy.int64)
+    vertices=model.vertices
+    if isinstance(vertices, pmx.VertexArray):
+        model.vertices=pmx.VertexArray(*[
+            numpy.asarray(getattr(vertices, name))[sources]
+            for name in pmx.VertexArray.__slots__])
+    else:
+        model.vertices=[vertices[k] for k in sources.tolist()]
+
+    indices=model.indices
+    if hasattr(indices, "astype"):
+        # numpy
+        model.indices=remap[indices].astype(indices.dtype)
+    else:
+        model.indices=remap[numpy.asarray(indices, numpy.int64)].tolist()
+
+    for m in model.morphs:
+        if m.morph_type==pmx.MORPH_VERTEX and isinstance(m.offsets,
+                pmx.VertexMorphOffsetArray):
+            vertex_indices=remap[numpy.asarray(m.offsets.vertex_indices,
+                numpy.int64)]
+            position_offsets=numpy.asarray(m.offsets.position_offsets)
+            if merge:
+                _, first=numpy.unique(vertex_indices, return_index=True)
+                first.sort()
+                vertex_indices=vertex_indices[first]
+                position_offsets=position_offsets[first]
+            m.offsets=pmx.VertexMorphOffsetArray(vertex_indices,
+                    position_offsets)
+        elif m.morph_type==pmx.MORPH_VERTEX:
+            m.offsets=remap_offsets(m.offsets, remap,
+                    lambda o, index: pmx.VertexMorphOffset(
+                        index, o.position_offset), merge)
+        elif pmx.MORPH_UV<=m.morph_type<=pmx.MORPH_EXTENDED_UV4:
+            m.offsets=remap_offsets(m.offsets, remap,
+                    lambda o, index: pmx.UVMorphData(index, o.uv), merge)
+
+
+def remap_offsets(offsets, remap, create, merge=False):
+    """
+    return the offset list with remapped vertex_index. with merge only the
+    first offset of a new vertex is kept.
+    """
+    remapped=[]
+    used=set()
+    for o in offsets:
+        index=int(remap[o.vertex_index])
+        if merge:
+            if index in used:
+                continue
+            used.add(index)
+        remapped.append(create(o, index))
+    return remapped
+
+
+def remove_degenerate_triangles(model):
+    """
+    remove triangles with a repeated vertex in place and update material
+    vertex_count. return the removed triangle count.
+    """
+    indices=model.indices
+    is_numpy=hasattr(indices, "astype")
+    triangles=numpy.asarray(indices, numpy.int64)
+    triangles=triangles[:len(triangles)//3*3].reshape(-1, 3)
+    valid=((triangles[:, 0]!=triangles[:, 1])
+            & (triangles[:, 1]!=triangles[:, 2])
+            & (triangles[:, 2]!=triangles[:, 0]))
+    removed=int(len(valid)-valid.sum())
+    if removed==0:
+        return 0
+    # triangle range of each material
+    end=0
+    for m in model.materials:
+        begin=end
+        end=begin+m.vertex_count//3
+        m.vertex_count=int(valid[begin:end].sum())*3
+    kept=triangles[valid].reshape(-1)
+    if is_numpy:
+        model.indices=kept.astype(indices.dtype)
+    else:
+        model.indices=kept.tolist()
+    return removed
+
+
+def weld_vertices(model, position_epsilon=1e-5, normal_epsilon=1e-3,
+        uv_epsilon=1e-5, weight_epsilon=1e-3):
+    """
+    weld the vertices of the model in place. return the new index of each
+    old vertex(int64 N).
+
+    :Parameters:
+      model
+        pmx.Model
+      position_epsilon
+        max difference of position, sdef parameters and vertex morph
+        offsets on each axis. also the cell size of the hash grid
+      normal_epsilon
+        max difference of normal on each axis
+      uv_epsilon
+        max difference of uv and uv morph offsets
+      weight_epsilon
+        max difference of deform weights and edge factor
+    """
+    if position_epsilon<=0:
+        raise ValueError("invalid position_epsilon: {0}".format(
+            position_epsilon))
+    vertices=pmx.create_vertex_array(model.vertices)
+    count=len(vertices)
+    signatures=get_morph_signatures(model, count,
+            position_epsilon, uv_epsilon)
+    representatives=find_representatives(vertices, signatures,
+            position_epsilon, normal_epsilon, uv_epsilon, weight_epsilon)
+    is_representative=representatives==numpy.arange(count)
+    new_indices=numpy.cumsum(is_representative)-1
+    remap=new_indices[representatives]
+    if is_representative.all():
+        return remap
+    remap_vertices(model, remap, numpy.flatnonzero(is_representative),
+            merge=True)
+    remove_degenerate_triangles(model)
+    return remap
+
+
+def simulate_vertex_cache(indices, cache_size=32):
+    """
+    return the count of the vertices transformed by a FIFO cache of
+    cache_size.
+    """
+    timestamps={}
+    time=0
+    for v in numpy.asarray(indices).tolist():
+        loaded=timestamps.get(v)
+        if loaded is None or time-loaded>=cache_size:
+            timestamps[v]=time
+            time+=1
+    return time
+
+
+def get_cache_metrics(indices, cache_size=32):
+    """
+    return (ACMR, ATVR) of the triangle indices.
+    """
+    indices=numpy.asarray(indices)
+    triangle_count=len(indices)//3
+    if triangle_count==0:
+        return 0.0, 0.0
+    transformed=simulate_vertex_cache(indices, cache_size)
+    return (float(transformed)/triangle_count,
+            float(transformed)/len(numpy.unique(indices)))
+
+
+def tipsify(triangles, cache_size=32):
+    """
+    return the order of the triangles(int Tx3) by Tipsify.
+    """
+    triangle_count=len(triangles)
+    if triangle_count==0:
+        return numpy.empty(0, numpy.int64)
+    # local vertex ids of the triangles
+    vertex_ids, local=numpy.unique(triangles, return_inverse=True)
+    local=local.reshape(-1, 3)
+    vertex_count=len(vertex_ids)
+    # vertex -> triangles
+    flat=local.reshape(-1)
+    adjacency_order=numpy.argsort(flat, kind='stable')
+    live=numpy.bincount(flat, minlength=vertex_count)
+    offsets=numpy.concatenate([[0], numpy.cumsum(live)]).tolist()
+    adjacency=(adjacency_order//3).tolist()
+    live=live.tolist()
+    corners=local.tolist()
+
+    timestamps=[-cache_size-1]*vertex_count
+    emitted=[False]*triangle_count
+    order=[]
+    dead_end=[]
+    time=cache_size+1
+    cursor=0
+    fanning=0
+    while fanning>=0:
+        candidates=set()
+        for t in adjacency[offsets[fanning]:offsets[fanning+1]]:
+            if emitted[t]:
+                continue
+            emitted[t]=True
+            order.append(t)
+            for v in corners[t]:
+                dead_end.append(v)
+                candidates.add(v)
+                live[v]-=1
+                if time-timestamps[v]>cache_size:
+                    timestamps[v]=time
+                    time+=1
+        # the candidate that stays in the cache after its fan
+        fanning=-1
+        best=-1
+        for v in candidates:
+            if live[v]<=0:
+                continue
+            priority=0
+            if time-timestamps[v]+2*live[v]<=cache_size:
+                priority=time-timestamps[v]
+            if priority>best:
+                best=priority
+                fanning=v
+        if fanning>=0:
+            continue
+        # dead end. a recent vertex, then the next vertex in input order
+        while dead_end:
+            v=dead_end.pop()
+            if live[v]>0:
+                fanning=v
+                break
+        else:
+            while cursor<vertex_count:
+                if live[cursor]>0:
+                    fanning=cursor
+                    break
+                cursor+=1
+    return numpy.array(order, numpy.int64)
+
+
+def get_material_ranges(model, index_count):
+    """
+    return [(begin, end)] triangle range of each material. the indices
+    after the materials are a range of their own.
+    """
+    ranges=[]
+    end=0
+    for m in model.materials:
+        begin=end
+        end=min(begin+m.vertex_count//3, index_count//3)
+        ranges.append((begin, end))
+    if end<index_count//3:
+        ranges.append((end, index_count//3))
+    return ranges
+
+
+def optimize_vertex_cache(model, cache_size=32):
+    """
+    reorder the triangles of each material and renumber the vertices in
+    place. return the metrics dict of "acmr_before", "atvr_before",
+    "acmr_after", "atvr_after".
+
+    :Parameters:
+      model
+        pmx.Model
+      cache_size
+        FIFO cache size of Tipsify and the metrics
+    """
+    indices=numpy.asarray(model.indices, numpy.int64)
+    acmr_before, atvr_before=get_cache_metrics(indices, cache_size)
+    triangles=indices[:len(indices)//3*3].reshape(-1, 3)
+    order=numpy.concatenate([numpy.arange(len(triangles))[begin:end][
+        tipsify(triangles[begin:end], cache_size)]
+        for begin, end in get_material_ranges(model, len(indices))]
+        +[numpy.empty(0, numpy.int64)])
+    indices=numpy.concatenate([triangles[order].reshape(-1),
+        indices[len(triangles)*3:]])
+    if hasattr(model.indices, "astype"):
+        # numpy
+        model.indices=indices.astype(model.indices.dtype)
+    else:
+        model.indices=indices.tolist()
+    optimize_vertex_fetch(model)
+    acmr_after, atvr_after=get_cache_metrics(model.indices, cache_size)
+    return {
+            "acmr_before": acmr_before,
+            "atvr_before": atvr_before,
+            "acmr_after": acmr_after,
+            "atvr_after": atvr_after,
+            }
+
+
+def optimize_vertex_fetch(model):
+    """
+    renumber the vertices in place in the order of the first use by the
+    indices. unused vertices follow in the original order. return the new
+    index of each old vertex(int64 N).
+    """
+    count=len(model.vertices)
+    indices=numpy.asarray(model.indices, numpy.int64)
+    used, first=numpy.unique(indices, return_index=True)
+    if len(used) and (used[0]<0 or used[-1]>=count):
+        raise ValueError("vertex index out of range")
+    unused=numpy.ones(count, bool)
+    unused[used]=False
+    sources=numpy.concatenate([used[numpy.argsort(first)],
+        numpy.flatnonzero(unused)])
+    remap=numpy.empty(count, numpy.int64)
+    remap[sources]=numpy.arange(count)
+    if (sources!=numpy.arange(count)).any():
+        remap_vertices(model, remap, sources)
+    return remap
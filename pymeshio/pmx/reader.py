@@ -6,6 +6,7 @@ import io
 import os
 from .. import common
 from .. import pmx
+from ..cache import get_cache
 
 
 class Reader(common.BinaryReader):
@@ -26,6 +27,12 @@ class Reader(common.BinaryReader):
         if extended_uv>0:
             raise common.ParseException(
                     "extended uv is not supported", extended_uv)
+        self.bone_index_size=bone_index_size
+        self.vertex_index_size=vertex_index_size
+        self.vertex_index_dtype={1: "<u1", 2: "<u2", 4: "<i4"}.get(
+                vertex_index_size)
+        self.texture_index_size=texture_index_size
+        self.morph_index_size=morph_index_size
         if vertex_index_size <= 2:
             self.read_vertex_index=lambda : self.read_uint(vertex_index_size)
         else:
@@ -36,82 +43,224 @@ class Reader(common.BinaryReader):
         self.read_morph_index=lambda : self.read_int(morph_index_size)
         self.read_rigidbody_index=lambda : self.read_int(rigidbody_index_size)
 
+        # fused record structs
+        int_format={1: "b", 2: "h", 4: "i"}
+        v=int_format[vertex_index_size] if vertex_index_size>2 else {
+                1: "B", 2: "H"}[vertex_index_size]
+        t=int_format[texture_index_size]
+        m=int_format[material_index_size]
+        b=int_format[bone_index_size]
+        mo=int_format[morph_index_size]
+        r=int_format[rigidbody_index_size]
+        get_struct=common.get_struct
+        # position, normal, uv, deform type
+        self.vertex_struct=get_struct("8fb")
+        # deform + edge factor
+        self.deform_structs=(
+                get_struct("{b}f".format(b=b)),
+                get_struct("2{b}ff".format(b=b)),
+                get_struct("4{b}4ff".format(b=b)),
+                get_struct("2{b}f9ff".format(b=b)),
+                )
+        # diffuse ... sphere_mode, toon_sharing_flag
+        self.material_struct=get_struct("4f4f3fb4ff2{t}bb".format(t=t))
+        # position, parent_index, layer, flag
+        self.bone_struct=get_struct("3f{b}ih".format(b=b))
+        self.bone_effect_struct=get_struct("{b}f".format(b=b))
+        self.ik_struct=get_struct("{b}ifi".format(b=b))
+        self.ik_link_struct=get_struct("{b}b".format(b=b))
+        self.limit_struct=get_struct("6f")
+        self.morph_struct=get_struct("bbi")
+        self.group_morph_struct=get_struct("{mo}f".format(mo=mo))
+        self.vertex_morph_struct=get_struct("{v}3f".format(v=v))
+        self.bone_morph_struct=get_struct("{b}7f".format(b=b))
+        self.uv_morph_struct=get_struct("{v}4f".format(v=v))
+        self.material_morph_struct=get_struct("{m}b28f".format(m=m))
+        self.rigidbody_struct=get_struct("{b}bhb9f5fb".format(b=b))
+        self.joint_struct=get_struct("b2{r}24f".format(r=r))
+
     def __str__(self):
         return '<pmx.Reader>'
 
     def get_read_text(self, text_encoding):
         if text_encoding==0:
-            def read_text():
-                size=self.read_int(4)
-                return self.unpack("{0}s".format(size), size).decode("utf-16-le")
-            return read_text
+            encoding="utf-16-le"
         elif text_encoding==1:
-            def read_text():
-                size=self.read_int(4)
-                return self.unpack("{0}s".format(size), size).decode("UTF8")
-            return read_text
+            encoding="UTF8"
         else:
             print("unknown text encoding", text_encoding)
+            return
+        def read_text():
+            size=self.read_int(4)
+            return str(self.read_bytes(size), encoding)
+        return read_text
 
     def read_vertex(self):
+        (x, y, z, nx, ny, nz, u, v, deform_type
+                )=self.read_struct(self.vertex_struct)
         return pmx.Vertex(
-                self.read_vector3(), # pos
-                self.read_vector3(), # normal
-                self.read_vector2(), # uv
-                self.read_deform(), # deform(bone weight)
-                self.read_float() # edge factor
+                common.Vector3(x, y, z), # pos
+                common.Vector3(nx, ny, nz), # normal
+                common.Vector2(u, v), # uv
+                *self.read_deform(deform_type) # deform(bone weight), edge factor
                 )
 
-    def read_deform(self):
-        deform_type=self.read_int(1)
+    def read_vertices_numpy(self, vertex_count):
+        """
+        read vertex block into pmx.VertexArray.
+
+        first pass walks the variable length deform records to collect
+        the byte offset of each vertex. second pass gathers the records of
+        each deform type at once.
+        """
+        import numpy
+        from numpy.lib.stride_tricks import sliding_window_view
+
+        bone_index_size=self.bone_index_size
+        # deform record size(without type byte) for Bdef1, Bdef2, Bdef4, Sdef
+        deform_sizes=(
+                bone_index_size,
+                bone_index_size*2+4,
+                bone_index_size*4+16,
+                bone_index_size*2+40,
+                )
+        # position, normal, uv(32) + deform type(1) + deform + edge_factor(4)
+        max_vertex_size=37+max(deform_sizes)
+
+        # first pass
+        start=self.offset
+        block=self.buffer[start:start+vertex_count*max_vertex_size]
+        offsets=[0]*vertex_count
+        pos=0
+        for i in range(vertex_count):
+            offsets[i]=pos
+            if pos+37>len(block):
+                raise common.ParseException("unexpected eof in vertices")
+            deform_type=block[pos+32]
+            if deform_type>=len(deform_sizes):
+                raise common.ParseException(
+                        "unknown deform type: {0}".format(deform_type))
+            pos+=37+deform_sizes[deform_type]
+        if pos>len(block):
+            raise common.ParseException("unexpected eof in vertices")
+        self.offset=start+pos
+
+        # second pass
+        buf=numpy.frombuffer(block, numpy.uint8, pos)
+        offsets=numpy.array(offsets, numpy.int64)
+        deform_types=buf[offsets+32].astype(numpy.int8)
+        positions=numpy.zeros((vertex_count, 3), numpy.float32)
+        normals=numpy.zeros((vertex_count, 3), numpy.float32)
+        uvs=numpy.zeros((vertex_count, 2), numpy.float32)
+        bone_indices=numpy.full((vertex_count, 4), -1, numpy.int32)
+        weights=numpy.zeros((vertex_count, 4), numpy.float32)
+        sdef_c=numpy.zeros((vertex_count, 3), numpy.float32)
+        sdef_r0=numpy.zeros((vertex_count, 3), numpy.float32)
+        sdef_r1=numpy.zeros((vertex_count, 3), numpy.float32)
+        edge_factors=numpy.zeros(vertex_count, numpy.float32)
+        bone_dtype=numpy.dtype("<i{0}".format(bone_index_size))
+        def get_column(records, begin, size, dtype):
+            return numpy.ascontiguousarray(
+                    records[:, begin:begin+size]).view(dtype)
+        for deform_type, deform_size in enumerate(deform_sizes):
+            index=numpy.nonzero(deform_types==deform_type)[0]
+            if len(index)==0:
+                continue
+            vertex_size=37+deform_size
+            records=sliding_window_view(buf, vertex_size)[offsets[index]]
+            floats=get_column(records, 0, 32, "<f4")
+            positions[index]=floats[:, 0:3]
+            normals[index]=floats[:, 3:6]
+            uvs[index]=floats[:, 6:8]
+            edge_factors[index]=get_column(records, vertex_size-4, 4, "<f4")[:, 0]
+            if deform_type==pmx.DEFORM_BDEF1:
+                bone_indices[index, 0]=get_column(records,
+                        33, bone_index_size, bone_dtype)[:, 0]
+                weights[index, 0]=1.0
+            elif deform_type==pmx.DEFORM_BDEF4:
+                bone_indices[index]=get_column(records,
+                        33, bone_index_size*4, bone_dtype)
+                weights[index]=get_column(records,
+                        33+bone_index_size*4, 16, "<f4")
+            else:
+                # Bdef2 and Sdef
+                bone_indices[index, 0:2]=get_column(records,
+                        33, bone_index_size*2, bone_dtype)
+                weight0=get_column(records, 33+bone_index_size*2, 4, "<f4")[:, 0]
+                weights[index, 0]=weight0
+                weights[index, 1]=1.0-weight0
+                if deform_type==pmx.DEFORM_SDEF:
+                    sdef=get_column(records, 37+bone_index_size*2, 36, "<f4")
+                    sdef_c[index]=sdef[:, 0:3]
+                    sdef_r0[index]=sdef[:, 3:6]
+                    sdef_r1[index]=sdef[:, 6:9]
+
+        return pmx.VertexArray(
+                positions, normals, uvs,
+                deform_types, bone_indices, weights,
+                sdef_c, sdef_r0, sdef_r1,
+                edge_factors)
+
+    def read_indices(self, index_count, vertex_layout="object"):
+        """
+        read index block at once.
+
+        return array.array(vertex_layout="object") or
+        numpy array(vertex_layout="numpy").
+        """
+        if vertex_layout=="numpy":
+            return self.read_numpy_array(self.vertex_index_dtype, index_count)
+        else:
+            typecode={1: "B", 2: "H", 4: "i"}[self.vertex_index_size]
+            return self.read_array(typecode, index_count)
+
+    def read_deform(self, deform_type):
+        """
+        return deform and edge factor
+        """
+        try:
+            record=self.read_struct(self.deform_structs[deform_type])
+        except IndexError:
+            raise common.ParseException(
+                    "unknown deform type: {0}".format(deform_type))
         if deform_type==0:
-            return pmx.Bdef1(self.read_bone_index())
+            return pmx.Bdef1(record[0]), record[1]
         elif deform_type==1:
-            return pmx.Bdef2(
-                    self.read_bone_index(),
-                    self.read_bone_index(),
-                    self.read_float()
-                    )
+            return pmx.Bdef2(*record[0:3]), record[3]
         elif deform_type==2:
-            return pmx.Bdef4(
-                    self.read_bone_index(),
-                    self.read_bone_index(),
-                    self.read_bone_index(),
-                    self.read_bone_index(),
-                    self.read_float(),
-                    self.read_float(),
-                    self.read_float(),
-                    self.read_float()
-                    )
+            return pmx.Bdef4(*record[0:8]), record[8]
         elif deform_type==3:
             return pmx.Sdef(
-                    self.read_bone_index(),
-                    self.read_bone_index(),
-                    self.read_float(),
-                    self.read_vector3(),
-                    self.read_vector3(),
-                    self.read_vector3()
-                    )
+                    record[0],
+                    record[1],
+                    record[2],
+                    common.Vector3(*record[3:6]),
+                    common.Vector3(*record[6:9]),
+                    common.Vector3(*record[9:12])
+                    ), record[12]
         else:
             raise common.ParseException(
                     "unknown deform type: {0}".format(deform_type))
 
     def read_material(self):
+        name=self.read_text()
+        english_name=self.read_text()
+        record=self.read_struct(self.material_struct)
         material=pmx.Material(
-                name=self.read_text(),
-                english_name=self.read_text(),
-                diffuse_color=self.read_rgb(),
-                alpha=self.read_float(),
-                specular_color=self.read_rgb(),
-                specular_factor=self.read_float(),
-                ambient_color=self.read_rgb(),
-                flag=self.read_int(1),
-                edge_color=self.read_rgba(),
-                edge_size=self.read_float(),
-                texture_index=self.read_texture_index(),
-                sphere_texture_index=self.read_texture_index(),
-                sphere_mode=self.read_int(1),
-                toon_sharing_flag=self.read_int(1),
+                name=name,
+                english_name=english_name,
+                diffuse_color=common.RGB(*record[0:3]),
+                alpha=record[3],
+                specular_color=common.RGB(*record[4:7]),
+                specular_factor=record[7],
+                ambient_color=common.RGB(*record[8:11]),
+                flag=record[11],
+                edge_color=common.RGBA(*record[12:16]),
+                edge_size=record[16],
+                texture_index=record[17],
+                sphere_texture_index=record[18],
+                sphere_mode=record[19],
+                toon_sharing_flag=record[20],
                 )
         if material.toon_sharing_flag==0:
             material.toon_texture_index=self.read_texture_index()
@@ -126,13 +275,16 @@ class Reader(common.BinaryReader):
         return material
 
     def read_bone(self):
+        name=self.read_text()
+        english_name=self.read_text()
+        x, y, z, parent_index, layer, flag=self.read_struct(self.bone_struct)
         bone=pmx.Bone(
-                name=self.read_text(),
-                english_name=self.read_text(),
-                position=self.read_vector3(),
-                parent_index=self.read_bone_index(),
-                layer=self.read_int(4),
-                flag=self.read_int(2)                
+                name=name,
+                english_name=english_name,
+                position=common.Vector3(x, y, z),
+                parent_index=parent_index,
+                layer=layer,
+                flag=flag
                 )
         if not bone.getConnectionFlag():
             bone.tail_position=self.read_vector3()
@@ -144,8 +296,8 @@ class Reader(common.BinaryReader):
                 bone.getConnectionFlag()))
 
         if bone.getExternalRotationFlag() or bone.getExternalTranslationFlag():
-            bone.effect_index=self.read_bone_index()
-            bone.effect_factor=self.read_float()
+            bone.effect_index, bone.effect_factor=self.read_struct(
+                    self.bone_effect_struct)
 
         if bone.getFixedAxisFlag():
             bone.fixed_axis=self.read_vector3()
@@ -163,42 +315,44 @@ class Reader(common.BinaryReader):
         return bone
 
     def read_ik(self):
+        target_index, loop, limit_radian, link_size=self.read_struct(
+                self.ik_struct)
         ik=pmx.Ik(
-                target_index=self.read_bone_index(),
-                loop=self.read_int(4),
-                limit_radian=self.read_float())
-        link_size=self.read_int(4)
+                target_index=target_index,
+                loop=loop,
+                limit_radian=limit_radian)
         ik.link=[self.read_ik_link() 
                 for _ in range(link_size)]
         return ik
 
     def read_ik_link(self):
-        link=pmx.IkLink(
-                self.read_bone_index(),
-                self.read_int(1))
+        link=pmx.IkLink(*self.read_struct(self.ik_link_struct))
         if link.limit_angle==0:
             pass
         elif link.limit_angle==1:
-            link.limit_min=self.read_vector3()
-            link.limit_max=self.read_vector3()
+            limit=self.read_struct(self.limit_struct)
+            link.limit_min=common.Vector3(*limit[0:3])
+            link.limit_max=common.Vector3(*limit[3:6])
         else:
             raise common.ParseException(
                     "invalid ik link limit_angle: {0}".format(
                 link.limit_angle))
         return link
 
-    def read_morgh(self):
+    def read_morgh(self, vertex_layout="object"):
         name=self.read_text()
         english_name=self.read_text()
-        panel=self.read_int(1)
-        morph_type=self.read_int(1)
-        offset_size=self.read_int(4)
+        panel, morph_type, offset_size=self.read_struct(self.morph_struct)
         morph=pmx.Morph(name, english_name, 
                 panel, morph_type)
         if morph_type==0:
             # group
             morph.offsets=[self.read_group_morph_data() 
                     for _ in range(offset_size)]
+        elif morph_type==1 and vertex_layout=="numpy":
+            # vertex
+            morph.offsets=self.read_vertex_position_morph_offsets_numpy(
+                    offset_size)
         elif morph_type==1:
             # vertex
             morph.offsets=[self.read_vertex_position_morph_offset() 
@@ -229,7 +383,7 @@ class Reader(common.BinaryReader):
                     for _ in range(offset_size)]
         elif morph_type==8:
             # material
-            morph.data=[self.read_material_morph_data()
+            morph.offsets=[self.read_material_morph_data()
                     for _ in range(offset_size)]
         else:
             raise common.ParseException(
@@ -238,39 +392,52 @@ class Reader(common.BinaryReader):
 
     def read_group_morph_data(self):
         return pmx.GroupMorphData(
-                self.read_morph_index(), 
-                self.read_float()
-                )
+                *self.read_struct(self.group_morph_struct))
 
     def read_vertex_position_morph_offset(self):
+        vertex_index, x, y, z=self.read_struct(self.vertex_morph_struct)
         return pmx.VertexMorphOffset(
-                self.read_vertex_index(), self.read_vector3())
+                vertex_index, common.Vector3(x, y, z))
+
+    def read_vertex_position_morph_offsets_numpy(self, offset_size):
+        """
+        read vertex morph offsets into pmx.VertexMorphOffsetArray.
+        """
+        records=self.read_numpy_array([
+            ("vertex_index", self.vertex_index_dtype),
+            ("position_offset", "<f4", (3,)),
+            ], offset_size)
+        return pmx.VertexMorphOffsetArray(
+                records["vertex_index"], records["position_offset"])
 
     def read_bone_morph_data(self):
+        record=self.read_struct(self.bone_morph_struct)
         return pmx.BoneMorphData(
-                self.read_bone_index(), 
-                self.read_vector3(),
-                self.read_quaternion()
+                record[0], 
+                common.Vector3(*record[1:4]),
+                common.Quaternion(*record[4:8])
                 )
 
     def read_uv_morph_data(self):
+        record=self.read_struct(self.uv_morph_struct)
         return pmx.UVMorphData(
-                self.read_vertex_index(), 
-                self.read_vector4(),
+                record[0], 
+                common.Vector4(*record[1:5]),
                 )
 
     def read_material_morph_data(self):
+        record=self.read_struct(self.material_morph_struct)
         return pmx.MaterialMorphData(
-                self.read_material_index(),
-                self.read_int(1),
-                self.read_rgba(),
-                self.read_rgb(), self.read_float(),
-                self.read_rgb(),
-                self.read_rgba(),
-                self.read_float(),
-                self.read_rgba(),
-                self.read_rgba(),
-                self.read_rgba()
+                record[0],
+                record[1],
+                common.RGBA(*record[2:6]),
+                common.RGB(*record[6:9]), record[9],
+                common.RGB(*record[10:13]),
+                common.RGBA(*record[13:17]),
+                record[17],
+                common.RGBA(*record[18:22]),
+                common.RGBA(*record[22:26]),
+                common.RGBA(*record[26:30])
                 )
 
     def read_display_slot(self):
@@ -291,48 +458,304 @@ class Reader(common.BinaryReader):
         return display_slot
 
     def read_rigidbody(self):
+        name=self.read_text()
+        english_name=self.read_text()
+        record=self.read_struct(self.rigidbody_struct)
         return pmx.RigidBody(
-                name=self.read_text(), 
-                english_name=self.read_text(),
-                bone_index=self.read_bone_index(),
-                collision_group=self.read_int(1),
-                no_collision_group=self.read_int(2),
-                shape_type=self.read_int(1),
-                shape_size=self.read_vector3(),
-                shape_position=self.read_vector3(),
-                shape_rotation=self.read_vector3(),
-                mass=self.read_float(),
-                linear_damping=self.read_float(),
-                angular_damping=self.read_float(),
-                restitution=self.read_float(),
-                friction=self.read_float(),
-                mode=self.read_int(1)
+                name=name, 
+                english_name=english_name,
+                bone_index=record[0],
+                collision_group=record[1],
+                no_collision_group=record[2],
+                shape_type=record[3],
+                shape_size=common.Vector3(*record[4:7]),
+                shape_position=common.Vector3(*record[7:10]),
+                shape_rotation=common.Vector3(*record[10:13]),
+                mass=record[13],
+                linear_damping=record[14],
+                angular_damping=record[15],
+                restitution=record[16],
+                friction=record[17],
+                mode=record[18]
                 )
 
     def read_joint(self):
+        name=self.read_text()
+        english_name=self.read_text()
+        record=self.read_struct(self.joint_struct)
         return pmx.Joint(
-                name=self.read_text(),
-                english_name=self.read_text(),
-                joint_type=self.read_int(1),
-                rigidbody_index_a=self.read_rigidbody_index(),
-                rigidbody_index_b=self.read_rigidbody_index(),
-                position=self.read_vector3(),
-                rotation=self.read_vector3(),
-                translation_limit_min=self.read_vector3(),
-                translation_limit_max=self.read_vector3(),
-                rotation_limit_min=self.read_vector3(),
-                rotation_limit_max=self.read_vector3(),
-                spring_constant_translation=self.read_vector3(),
-                spring_constant_rotation=self.read_vector3())
-
-
-def read_from_file(path):
+                name=name,
+                english_name=english_name,
+                joint_type=record[0],
+                rigidbody_index_a=record[1],
+                rigidbody_index_b=record[2],
+                position=common.Vector3(*record[3:6]),
+                rotation=common.Vector3(*record[6:9]),
+                translation_limit_min=common.Vector3(*record[9:12]),
+                translation_limit_max=common.Vector3(*record[12:15]),
+                rotation_limit_min=common.Vector3(*record[15:18]),
+                rotation_limit_max=common.Vector3(*record[18:21]),
+                spring_constant_translation=common.Vector3(*record[21:24]),
+                spring_constant_rotation=common.Vector3(*record[24:27]))
+
+    ############################################################
+    # skip without decode
+    ############################################################
+    def skip_text(self):
+        self.skip(self.read_int(4))
+
+    def skip_vertices(self, vertex_count):
+        buffer=self.buffer
+        deform_structs=self.deform_structs
+        offset=self.offset
+        for _ in range(vertex_count):
+            if offset+33>self.end:
+                raise common.ParseException("unexpected eof in vertices")
+            deform_type=buffer[offset+32]
+            if deform_type>=len(deform_structs):
+                raise common.ParseException(
+                        "unknown deform type: {0}".format(deform_type))
+            offset+=33+deform_structs[deform_type].size
+        if offset>self.end:
+            raise common.ParseException("unexpected eof in vertices")
+        self.offset=offset
+
+    def skip_indices(self, index_count):
+        self.skip(self.vertex_index_size*index_count)
+
+    def skip_textures(self, texture_count):
+        for _ in range(texture_count):
+            self.skip_text()
+
+    def skip_materials(self, material_count):
+        for _ in range(material_count):
+            self.skip_text()
+            self.skip_text()
+            self.skip(self.material_struct.size)
+            # toon_sharing_flag
+            if self.buffer[self.offset-1]==0:
+                self.skip(self.texture_index_size)
+            else:
+                self.skip(1)
+            self.skip_text()
+            self.skip(4)
+
+    def skip_bones(self, bone_count):
+        for _ in range(bone_count):
+            self.skip_text()
+            self.skip_text()
+            flag=self.read_struct(self.bone_struct)[5]
+            if flag & pmx.BONEFLAG_TAILPOS_IS_BONE:
+                self.skip(self.bone_index_size)
+            else:
+                self.skip(12)
+            if flag & (pmx.BONEFLAG_IS_EXTERNAL_ROTATION
+                    | pmx.BONEFLAG_IS_EXTERNAL_TRANSLATION):
+                self.skip(self.bone_effect_struct.size)
+            if flag & pmx.BONEFLAG_HAS_FIXED_AXIS:
+                self.skip(12)
+            if flag & pmx.BONEFLAG_HAS_LOCAL_COORDINATE:
+                self.skip(24)
+            if flag & pmx.BONEFLAG_IS_EXTERNAL_PARENT_DEFORM:
+                self.skip(4)
+            if flag & pmx.BONEFLAG_IS_IK:
+                link_size=self.read_struct(self.ik_struct)[3]
+                for _ in range(link_size):
+                    limit_angle=self.read_struct(self.ik_link_struct)[1]
+                    if limit_angle==1:
+                        self.skip(self.limit_struct.size)
+
+    def skip_morphs(self, morph_count):
+        sizes=(
+                self.group_morph_struct.size,
+                self.vertex_morph_struct.size,
+                self.bone_morph_struct.size,
+                self.uv_morph_struct.size,
+                self.uv_morph_struct.size,
+                self.uv_morph_struct.size,
+                self.uv_morph_struct.size,
+                self.uv_morph_struct.size,
+                self.material_morph_struct.size,
+                )
+        for _ in range(morph_count):
+            self.skip_text()
+            self.skip_text()
+            panel, morph_type, offset_size=self.read_struct(self.morph_struct)
+            if not 0<=morph_type<len(sizes):
+                raise common.ParseException(
+                        "unknown morph type: {0}".format(morph_type))
+            self.skip(sizes[morph_type]*offset_size)
+
+    def skip_display_slots(self, display_slot_count):
+        for _ in range(display_slot_count):
+            self.skip_text()
+            self.skip_text()
+            self.skip(1)
+            for _ in range(self.read_int(4)):
+                display_type=self.read_int(1)
+                if display_type==0:
+                    self.skip(self.bone_index_size)
+                elif display_type==1:
+                    self.skip(self.morph_index_size)
+                else:
+                    raise common.ParseException(
+                            "unknown display_type: {0}".format(display_type))
+
+    def skip_rigidbodies(self, rigidbody_count):
+        for _ in range(rigidbody_count):
+            self.skip_text()
+            self.skip_text()
+            self.skip(self.rigidbody_struct.size)
+
+    def skip_joints(self, joint_count):
+        for _ in range(joint_count):
+            self.skip_text()
+            self.skip_text()
+            self.skip(self.joint_struct.size)
+
+    def read_names(self, count, skip_record):
+        """
+        read the first text of count records. skip_record(1) skips one record.
+        """
+        names=[]
+        for _ in range(count):
+            offset=self.offset
+            names.append(self.read_text())
+            self.seek(offset)
+            skip_record(1)
+        return names
+
+
+# section name in file order
+SECTIONS=[
+        'vertices',
+        'indices',
+        'textures',
+        'materials',
+        'bones',
+        'morphs',
+        'display_slots',
+        'rigidbodies',
+        'joints',
+        ]
+
+
+def _lazy_section(name):
+    slot=getattr(pmx.Model, name)
+    def getter(self):
+        try:
+            return slot.__get__(self, LazyModel)
+        except AttributeError:
+            value=self.decode(name)
+            slot.__set__(self, value)
+            return value
+    def setter(self, value):
+        slot.__set__(self, value)
+    return property(getter, setter, 
+            doc="{0} decoded on first access".format(name))
+
+
+class LazyModel(pmx.Model):
+    """
+    pmx model returned by scan.
+
+    sections are decoded on first access.
+
+    :IVariables:
+        reader
+            pmx.reader.Reader over the whole file
+        vertex_layout
+            see read
+        sections
+            {section name: (byte offset, count)}
+    """
+    __slots__=[
+            'reader',
+            'vertex_layout',
+            'sections',
+            ]
+    def __init__(self, version, reader, vertex_layout):
+        self.path=''
+        self.version=version
+        self.reader=reader
+        self.vertex_layout=vertex_layout
+        self.sections={}
+
+    def __str__(self):
+        return ('<pmx-{version} "{name}" {vertices}vertices>'.format(
+            version=self.version,
+            name=self.english_name,
+            vertices=self.sections['vertices'][1]
+            ))
+
+    def decode(self, name):
+        """
+        decode the section
+        """
+        offset, count=self.sections[name]
+        reader=self.reader
+        reader.seek(offset)
+        if name=='vertices':
+            if self.vertex_layout=="numpy":
+                return reader.read_vertices_numpy(count)
+            return [reader.read_vertex() for _ in range(count)]
+        elif name=='indices':
+            return reader.read_indices(count, self.vertex_layout)
+        elif name=='textures':
+            return [reader.read_text() for _ in range(count)]
+        elif name=='materials':
+            return [reader.read_material() for _ in range(count)]
+        elif name=='bones':
+            return [reader.read_bone() for _ in range(count)]
+        elif name=='morphs':
+            return [reader.read_morgh(self.vertex_layout) 
+                    for _ in range(count)]
+        elif name=='display_slots':
+            return [reader.read_display_slot() for _ in range(count)]
+        elif name=='rigidbodies':
+            return [reader.read_rigidbody() for _ in range(count)]
+        elif name=='joints':
+            return [reader.read_joint() for _ in range(count)]
+        else:
+            raise KeyError(name)
+
+    def get_bone_names(self):
+        """
+        bone names without decoding the bone section.
+        """
+        offset, count=self.sections['bones']
+        self.reader.seek(offset)
+        return self.reader.read_names(count, self.reader.skip_bones)
+
+    def get_morph_names(self):
+        """
+        morph names without decoding the morph section.
+        """
+        offset, count=self.sections['morphs']
+        self.reader.seek(offset)
+        return self.reader.read_names(count, self.reader.skip_morphs)
+
+for _name in SECTIONS:
+    setattr(LazyModel, _name, _lazy_section(_name))
+del _name
+
+
+def read_from_file(path, vertex_layout="object", use_mmap=False, cache=None):
     """
     read from file path, then return the pmx.Model.
 
     :Parameters:
       path
         file path
+      vertex_layout
+        see read
+      use_mmap
+        read from a memory mapped file instead of a copy of it.
+        with vertex_layout="numpy" indices and vertex morph offsets
+        become read only views of the mapping.
+      cache
+        True or pymeshio.cache.ParseCache. load the parsed model from the
+        cache, or parse and store it.
 
     >>> import pmx.reader
     >>> m=pmx.reader.read_from_file('resources/初音ミクVer2.pmx')
@@ -343,44 +766,45 @@ def read_from_file(path):
     if not os.path.exists(path):
         print("{0} is not exist !".format(path))
         return
-    pmx=read(io.BytesIO(common.readall(path)))
+    if cache:
+        pmx=get_cache(cache).read(path, "pmx", (vertex_layout,),
+                lambda path: read_from_file(path, vertex_layout, use_mmap))
+        pmx.path=path
+        return pmx
+    if use_mmap:
+        pmx=read(common.mmap_file(path), vertex_layout)
+    else:
+        pmx=read(io.BytesIO(common.readall(path)), vertex_layout)
     pmx.path=path
     return pmx
 
 
-def read(ios):
+def read_header(ios):
     """
-    read from ios, then return the pmx pmx.Model.
+    read pmx header, then return the pmx.reader.Reader at the model info
+    and the version.
 
     :Parameters:
       ios
-        input stream (in io.IOBase)
-
-    >>> import pmx.reader
-    >>> m=pmx.reader.read(io.open('resources/初音ミクVer2.pmx', 'rb'))
-    >>> print(m)
-    <pmx-2.0 "Miku Hatsune" 12354vertices>
-
+        input stream (in io.IOBase) or bytes-like object
     """
-    assert(isinstance(ios, io.IOBase))
     reader=common.BinaryReader(ios)
 
     # header
     signature=reader.unpack("4s", 4)
     if signature!=b"PMX ":
         raise common.ParseException(
-                "invalid signature", signature)
+                "invalid signature: {0}".format(signature))
 
     version=reader.read_float()
     if version!=2.0:
         print("unknown version", version)
-    model=pmx.Model(version)
 
     # flags
     flag_bytes=reader.read_int(1)
     if flag_bytes!=8:
         raise common.ParseException(
-                "invalid flag length", reader.flag_bytes)
+                "invalid flag length: {0}".format(flag_bytes))
     text_encoding=reader.read_int(1)
     extended_uv=reader.read_int(1)
     vertex_index_size=reader.read_int(1)
@@ -391,7 +815,7 @@ def read(ios):
     rigidbody_index_size=reader.read_int(1)
     
     # pmx custom reader
-    reader=Reader(reader.ios,
+    reader=Reader(reader,
             text_encoding,
             extended_uv,
             vertex_index_size,
@@ -401,6 +825,32 @@ def read(ios):
             morph_index_size,
             rigidbody_index_size
             )
+    return reader, version
+
+
+def read(ios, vertex_layout="object"):
+    """
+    read from ios, then return the pmx pmx.Model.
+
+    :Parameters:
+      ios
+        input stream (in io.IOBase) or bytes-like object
+      vertex_layout
+        "object": model.vertices is a list of pmx.Vertex.
+        "numpy": model.vertices is a pmx.VertexArray, indices is a numpy
+        array and vertex morph offsets are pmx.VertexMorphOffsetArray
+        (requires numpy).
+
+    >>> import pmx.reader
+    >>> m=pmx.reader.read(io.open('resources/初音ミクVer2.pmx', 'rb'))
+    >>> print(m)
+    <pmx-2.0 "Miku Hatsune" 12354vertices>
+
+    """
+    if vertex_layout not in ("object", "numpy"):
+        raise ValueError("unknown vertex_layout: {0}".format(vertex_layout))
+    reader, version=read_header(ios)
+    model=pmx.Model(version)
 
     # model info
     model.name = reader.read_text()
@@ -409,17 +859,19 @@ def read(ios):
     model.english_comment = reader.read_text()
 
     # model data
-    model.vertices=[reader.read_vertex() 
-            for _ in range(reader.read_int(4))]
-    model.indices=[reader.read_vertex_index() 
-            for _ in range(reader.read_int(4))]
+    if vertex_layout=="numpy":
+        model.vertices=reader.read_vertices_numpy(reader.read_int(4))
+    else:
+        model.vertices=[reader.read_vertex() 
+                for _ in range(reader.read_int(4))]
+    model.indices=reader.read_indices(reader.read_int(4), vertex_layout)
     model.textures=[reader.read_text() 
             for _ in range(reader.read_int(4))]
     model.materials=[reader.read_material() 
             for _ in range(reader.read_int(4))]
     model.bones=[reader.read_bone() 
             for _ in range(reader.read_int(4))]
-    model.morphs=[reader.read_morgh() 
+    model.morphs=[reader.read_morgh(vertex_layout) 
             for _ in range(reader.read_int(4))]
     model.display_slots=[reader.read_display_slot() 
             for _ in range(reader.read_int(4))]
@@ -427,6 +879,52 @@ def read(ios):
             for _ in range(reader.read_int(4))]
     model.joints=[reader.read_joint()
             for _ in range(reader.read_int(4))]
+    reader.sync()
 
     return model
 
+
+def scan(path, vertex_layout="object", use_mmap=True):
+    """
+    skip through the file recording the byte offset and count of each
+    section, then return the pmx.reader.LazyModel.
+
+    only the header and the model info are decoded. the other sections
+    are decoded on first access.
+
+    :Parameters:
+      path
+        file path
+      vertex_layout
+        see read
+      use_mmap
+        see read_from_file
+
+    >>> import pmx.reader
+    >>> m=pmx.reader.scan('resources/初音ミクVer2.pmx')
+    >>> print(m.name, m.get_bone_names())
+
+    """
+    if vertex_layout not in ("object", "numpy"):
+        raise ValueError("unknown vertex_layout: {0}".format(vertex_layout))
+    if use_mmap:
+        data=common.mmap_file(path)
+    else:
+        data=common.readall(path)
+    reader, version=read_header(data)
+    model=LazyModel(version, reader, vertex_layout)
+    model.path=path
+
+    # model info
+    model.name = reader.read_text()
+    model.english_name = reader.read_text()
+    model.comment = reader.read_text()
+    model.english_comment = reader.read_text()
+
+    # skip pass
+    for name in SECTIONS:
+        count=reader.read_int(4)
+        model.sections[name]=(reader.tell(), count)
+        getattr(reader, "skip_"+name)(count)
+
+    return model
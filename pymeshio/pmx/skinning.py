@@ -0,0 +1,168 @@
+# coding: utf-8
+"""
+pmx skinning
+
+deform pmx.Model vertices by bone matrices.
+
+bone matrices are the global matrices of pymeshio.arraymath convention.
+the bind pose of pmx is the bone position without rotation, so a vertex
+is moved by -bone.position then by the global matrix of the bone.
+
+>>> import pymeshio.pmx.reader
+>>> from pymeshio.pmx import skinning
+>>> m=pymeshio.pmx.reader.read_from_file('resources/初音ミクVer2.pmx')
+>>> s=skinning.Skinning(m)
+>>> positions, normals=s.skin(global_matrices)
+
+"""
+import numpy
+from .. import pmx
+from .. import arraymath
+
+
+def create_skinning_matrices(global_matrices, bone_positions):
+    """
+    return skinning matrices ...xBx4x4 from global matrices ...xBx4x4 and
+    bind pose bone positions Bx3.
+    """
+    skinning_matrices=numpy.array(global_matrices, copy=True)
+    # translate(-bone_position) * global
+    skinning_matrices[..., 3, :3]-=numpy.einsum('bi,...bij->...bj',
+            bone_positions, global_matrices[..., :3, :3])
+    return skinning_matrices
+
+
+class Skinning(object):
+    """
+    linear blend(Bdef1, Bdef2, Bdef4) and SDEF skinning.
+
+    the padded bone index and weight arrays and the SDEF parameters are
+    prepared once at construction.
+
+    :IVariables:
+        positions
+            float32 Nx3 bind pose positions
+        normals
+            float32 Nx3 bind pose normals
+        bone_indices
+            int32 Nx4. unused slot is 0 with weight 0
+        weights
+            float32 Nx4. normalized
+        static_indices
+            int vertex indices without a valid bone weight. they keep the
+            bind pose
+        bone_positions
+            float32 Bx3
+        sdef_indices
+            int Sdef vertex indices
+        sdef_c
+            float32 Sx3
+        sdef_cr0
+            float32 Sx3
+        sdef_cr1
+            float32 Sx3
+    """
+    __slots__=[
+            'positions',
+            'normals',
+            'bone_indices',
+            'weights',
+            'static_indices',
+            'bone_positions',
+            'sdef_indices',
+            'sdef_c',
+            'sdef_cr0',
+            'sdef_cr1',
+            ]
+    def __init__(self, model):
+        vertices=pmx.create_vertex_array(model.vertices)
+        self.positions=numpy.asarray(vertices.positions, numpy.float32)
+        self.normals=numpy.asarray(vertices.normals, numpy.float32)
+        bone_indices=numpy.asarray(vertices.bone_indices, numpy.int32)
+        weights=numpy.asarray(vertices.weights, numpy.float32)
+        unused=bone_indices<0
+        self.bone_indices=numpy.where(unused, 0, bone_indices)
+        weights=numpy.where(unused, 0, weights)
+        # Bdef4 weight total is not guaranteed 1
+        total=weights.sum(axis=1, keepdims=True)
+        self.weights=(weights/numpy.where(total>0, total, 1)).astype(
+                numpy.float32)
+        self.static_indices=numpy.flatnonzero(total[:, 0]<=0)
+        self.bone_positions=numpy.array([
+            (b.position.x, b.position.y, b.position.z) for b in model.bones],
+            numpy.float32).reshape(-1, 3)
+        if len(self.bone_indices) and self.bone_indices.max(initial=0)>=len(
+                self.bone_positions):
+            raise ValueError("bone index out of range")
+
+        # sdef
+        self.sdef_indices=numpy.flatnonzero(
+                (numpy.asarray(vertices.deform_types)==pmx.DEFORM_SDEF)
+                &(total[:, 0]>0))
+        index=self.sdef_indices
+        w0=self.weights[index, 0:1]
+        w1=1-w0
+        c=numpy.asarray(vertices.sdef_c, numpy.float32)[index]
+        r0=numpy.asarray(vertices.sdef_r0, numpy.float32)[index]
+        r1=numpy.asarray(vertices.sdef_r1, numpy.float32)[index]
+        # move r0 and r1 so that the weighted mean of them is c
+        rw=r0*w0+r1*w1
+        r0=c+r0-rw
+        r1=c+r1-rw
+        self.sdef_c=c
+        self.sdef_cr0=(c+r0)*0.5
+        self.sdef_cr1=(c+r1)*0.5
+
+    def __str__(self):
+        return '<pmx.Skinning %d vertices, %d sdef>' % (
+                len(self.positions), len(self.sdef_indices))
+
+    def skin(self, global_matrices):
+        """
+        return deformed positions and normals(float32 Nx3).
+
+        :Parameters:
+          global_matrices
+            global matrices of every bone(Bx4x4)
+        """
+        global_matrices=numpy.asarray(global_matrices, numpy.float32)
+        if global_matrices.shape!=(len(self.bone_positions), 4, 4):
+            raise ValueError("global_matrices shape must be {0}: {1}".format(
+                (len(self.bone_positions), 4, 4), global_matrices.shape))
+        skinning_matrices=create_skinning_matrices(
+                global_matrices, self.bone_positions)
+
+        # linear blend
+        blended=numpy.einsum('nk,nkij->nij',
+                self.weights, skinning_matrices[self.bone_indices, :, :3])
+        positions=arraymath.transform_points(blended, self.positions)
+        normals=arraymath.transform_vectors(blended, self.normals)
+
+        # sdef
+        index=self.sdef_indices
+        if len(index):
+            i0=self.bone_indices[index, 0]
+            i1=self.bone_indices[index, 1]
+            w0=self.weights[index, 0]
+            w1=1-w0
+            rotations=arraymath.matrix_to_quaternion(global_matrices)
+            rotation=arraymath.quaternion_to_matrix(
+                    arraymath.slerp(rotations[i1], rotations[i0], w0))
+            m0=skinning_matrices[i0]
+            m1=skinning_matrices[i1]
+            positions[index]=(
+                    arraymath.transform_vectors(rotation,
+                        self.positions[index]-self.sdef_c)
+                    +arraymath.transform_points(m0, self.sdef_cr0)*w0[:, None]
+                    +arraymath.transform_points(m1, self.sdef_cr1)*w1[:, None]
+                    )
+            normals[index]=arraymath.transform_vectors(
+                    rotation, self.normals[index])
+
+        # no weight. keep the bind pose
+        index=self.static_indices
+        positions[index]=self.positions[index]
+        normals[index]=self.normals[index]
+
+        return (positions.astype(numpy.float32),
+                arraymath.normalize(normals).astype(numpy.float32))
@@ -1,20 +1,52 @@
 # coding: utf-8
 """
 pmx writer
+
+each section is packed into one buffer and written with one call. the
+vertex, index and vertex morph sections of columnar arrays(read by
+vertex_layout="numpy") are packed with numpy.
 """
 import io
 import struct
 from .. import common
 from .. import pmx
 
+
+# signed index formats. get_array_size keeps indices in the signed range
+INDEX_FORMATS={1: "b", 2: "h", 4: "i"}
+
+
 class Writer(common.BinaryWriter):
     """pmx writer
+
+    small records are written to a section buffer(self.ios) and
+    flush_section writes the buffer to the output stream.
     """
     def __init__(self, ios,
             text_encoding, extended_uv,
             vertex_index_size, texture_index_size, material_index_size,
             bone_index_size, morph_index_size, rigidbody_index_size):
-        super(Writer, self).__init__(ios)
+        super(Writer, self).__init__(io.BytesIO())
+        self.output=ios
+        self.vertex_index_size=vertex_index_size
+        self.bone_index_size=bone_index_size
+        v=INDEX_FORMATS[vertex_index_size]
+        m=INDEX_FORMATS[material_index_size]
+        b=INDEX_FORMATS[bone_index_size]
+        mo=INDEX_FORMATS[morph_index_size]
+        get_struct=common.get_struct
+        # position, normal, uv, deform type, deform, edge factor
+        self.deform_structs=(
+                get_struct("8fb{b}f".format(b=b)),
+                get_struct("8fb2{b}ff".format(b=b)),
+                get_struct("8fb4{b}4ff".format(b=b)),
+                get_struct("8fb2{b}f9ff".format(b=b)),
+                )
+        self.group_morph_struct=get_struct("{mo}f".format(mo=mo))
+        self.vertex_morph_struct=get_struct("{v}3f".format(v=v))
+        self.bone_morph_struct=get_struct("{b}7f".format(b=b))
+        self.uv_morph_struct=get_struct("{v}4f".format(v=v))
+        self.material_morph_struct=get_struct("{m}b28f".format(m=m))
         if text_encoding==0:
             def write_text(unicode):
                 if not unicode:
@@ -31,7 +63,7 @@ class Writer(common.BinaryWriter):
                self.write_bytes(utf8)
             self.write_text=write_text
         else:
-            raise WriteError(
+            raise common.WriteException(
                     "invalid text_encoding: {0}".format(text_encoding))
 
         self.write_vertex_index=lambda index: self.write_int(index, vertex_index_size)
@@ -41,42 +73,107 @@ class Writer(common.BinaryWriter):
         self.write_morph_index=lambda index: self.write_int(index, morph_index_size)
         self.write_rigidbody_index=lambda index: self.write_int(index, rigidbody_index_size)
 
+    def flush_section(self):
+        """
+        write the section buffer to the output stream.
+        """
+        self.output.write(self.ios.getbuffer())
+        self.ios=io.BytesIO()
+
+    def write_section(self, data):
+        self.flush_section()
+        self.output.write(data)
+
     def write_vertices(self, vertices):
         self.write_int(len(vertices), 4)
-        for v in vertices:
-            self.write_vector3(v.position)
-            self.write_vector3(v.normal)
-            self.write_vector2(v.uv)
-            self.write_deform(v.deform)
-            self.write_float(v.edge_factor)
-
-    def write_deform(self, deform):
-        if isinstance(deform, pmx.Bdef1):
-            self.write_int(0, 1)
-            self.write_bone_index(deform.index0)
-        elif isinstance(deform, pmx.Bdef2):
-            self.write_int(1, 1)
-            self.write_bone_index(deform.index0)
-            self.write_bone_index(deform.index1)
-            self.write_float(deform.weight0)
-        elif isinstance(deform, pmx.Bdef4):
-            self.write_int(2, 1)
-            self.write_bone_index(deform.index0)
-            self.write_bone_index(deform.index1)
-            self.write_bone_index(deform.index2)
-            self.write_bone_index(deform.index3)
-            self.write_float(deform.weight0)
-            self.write_float(deform.weight1)
-            self.write_float(deform.weight2)
-            self.write_float(deform.weight3)
+        if isinstance(vertices, pmx.VertexArray):
+            self.write_section(self.pack_vertex_array(vertices))
+            return
+        self.write_section(b"".join(
+            self.pack_vertex(v) for v in vertices))
+
+    def pack_vertex(self, v):
+        p=v.position
+        n=v.normal
+        uv=v.uv
+        d=v.deform
+        if isinstance(d, pmx.Bdef1):
+            return self.deform_structs[0].pack(p.x, p.y, p.z, n.x, n.y, n.z,
+                    uv.x, uv.y, 0, d.index0, v.edge_factor)
+        elif isinstance(d, pmx.Bdef2):
+            return self.deform_structs[1].pack(p.x, p.y, p.z, n.x, n.y, n.z,
+                    uv.x, uv.y, 1, d.index0, d.index1, d.weight0,
+                    v.edge_factor)
+        elif isinstance(d, pmx.Bdef4):
+            return self.deform_structs[2].pack(p.x, p.y, p.z, n.x, n.y, n.z,
+                    uv.x, uv.y, 2, d.index0, d.index1, d.index2, d.index3,
+                    d.weight0, d.weight1, d.weight2, d.weight3,
+                    v.edge_factor)
+        elif isinstance(d, pmx.Sdef):
+            return self.deform_structs[3].pack(p.x, p.y, p.z, n.x, n.y, n.z,
+                    uv.x, uv.y, 3, d.index0, d.index1, d.weight0,
+                    d.sdef_c.x, d.sdef_c.y, d.sdef_c.z,
+                    d.sdef_r0.x, d.sdef_r0.y, d.sdef_r0.z,
+                    d.sdef_r1.x, d.sdef_r1.y, d.sdef_r1.z,
+                    v.edge_factor)
         else:
             raise common.WriteException(
-                    "unknown deform type: {0}".format(deform.type))
+                    "unknown deform: {0}".format(d))
+
+    def pack_vertex_array(self, vertices):
+        """
+        pack pmx.VertexArray. vertices of a deform type are packed as a
+        record array, then scattered to their offsets.
+        """
+        import numpy
+        b="<i{0}".format(self.bone_index_size)
+        layouts=(
+                [("bone_indices", b, (1,))],
+                [("bone_indices", b, (2,)), ("weights", "<f4", (1,))],
+                [("bone_indices", b, (4,)), ("weights", "<f4", (4,))],
+                [("bone_indices", b, (2,)), ("weights", "<f4", (1,)),
+                    ("sdef_c", "<f4", (3,)), ("sdef_r0", "<f4", (3,)),
+                    ("sdef_r1", "<f4", (3,))],
+                )
+        deform_types=numpy.asarray(vertices.deform_types)
+        if len(deform_types) and (deform_types.min()<0
+                or deform_types.max()>=len(layouts)):
+            raise common.WriteException("unknown deform type")
+        dtypes=[numpy.dtype([
+            ("positions", "<f4", (3,)),
+            ("normals", "<f4", (3,)),
+            ("uvs", "<f4", (2,)),
+            ("deform_types", "i1"),
+            ]+layout+[("edge_factors", "<f4")]) for layout in layouts]
+        sizes=numpy.array([dtype.itemsize for dtype in dtypes])[deform_types]
+        offsets=numpy.cumsum(sizes)-sizes
+        data=numpy.empty(int(sizes.sum()), numpy.uint8)
+        for deform_type, dtype in enumerate(dtypes):
+            selected=numpy.flatnonzero(deform_types==deform_type)
+            if len(selected)==0:
+                continue
+            records=numpy.empty(len(selected), dtype)
+            for name in dtype.names:
+                column=numpy.asarray(getattr(vertices, name))[selected]
+                records[name]=column[:, :dtype[name].shape[0]] if (
+                        dtype[name].shape) else column
+            packed=records.view(numpy.uint8).reshape(len(selected), -1)
+            if len(selected)==len(deform_types):
+                return packed.tobytes()
+            data[offsets[selected][:, None]+numpy.arange(
+                dtype.itemsize)]=packed
+        return data.tobytes()
 
     def write_indices(self, indices):
         self.write_int(len(indices), 4)
-        for i in indices:
-            self.write_vertex_index(i)
+        index_format=INDEX_FORMATS[self.vertex_index_size]
+        if hasattr(indices, "astype"):
+            # numpy
+            self.write_section(indices.astype(
+                "<"+index_format).tobytes())
+        else:
+            self.write_section(struct.pack("<{0}{1}".format(
+                len(indices), index_format), *indices))
 
     def write_textures(self, textures):
         self.write_int(len(textures), 4)
@@ -169,50 +266,72 @@ class Writer(common.BinaryWriter):
     def write_morph(self, morphs):
         self.write_int(len(morphs), 4)
         for m in morphs:
-            self.write_text(m.name)
-            self.write_text(m.english_name)
-            self.write_int(m.panel, 1)
-            self.write_int(m.morph_type, 1)
-            if m.morph_type==0:
-                # todo
-                raise common.WriteException(
-                        "not implemented GroupMorph")
-            elif m.morph_type==1:
-                self.write_int(len(m.offsets), 4)
-                for o in m.offsets:
-                    self.write_vertex_index(o.vertex_index)
-                    self.write_vector3(o.position_offset)
-            elif m.morph_type==2:
-                # todo
-                raise common.WriteException(
-                        "not implemented BoneMorph")
-            elif m.morph_type==3:
-                # todo
-                raise common.WriteException(
-                        "not implemented UvMorph")
-            elif m.morph_type==4:
-                # todo
-                raise common.WriteException(
-                        "not implemented extended UvMorph1")
-            elif m.morph_type==5:
-                # todo
-                raise common.WriteException(
-                        "not implemented extended UvMorph2")
-            elif m.morph_type==6:
-                # todo
-                raise common.WriteException(
-                        "not implemented extended UvMorph3")
-            elif m.morph_type==7:
-                # todo
-                raise common.WriteException(
-                        "not implemented extended UvMorph4")
-            elif m.morph_type==8:
-                # todo
-                raise common.WriteException(
-                        "not implemented extended MaterialMorph")
-            else:
-                raise common.WriteException(
-                        "unknown morph type: {0}".format(m.morph_type))
+            self.write_morph_header(m, len(m.offsets))
+            self.write_morph_offsets(m.morph_type, m.offsets)
+
+    def write_morph_header(self, m, offset_count):
+        self.write_text(m.name)
+        self.write_text(m.english_name)
+        self.write_int(m.panel, 1)
+        self.write_int(m.morph_type, 1)
+        self.write_int(offset_count, 4)
+
+    def write_morph_offsets(self, morph_type, offsets):
+        if morph_type==pmx.MORPH_GROUP:
+            pack=self.group_morph_struct.pack
+            self.write_bytes(b"".join(pack(o.morph_index, o.value)
+                for o in offsets))
+        elif morph_type==pmx.MORPH_VERTEX:
+            self.write_vertex_morph_offsets(offsets)
+        elif morph_type==pmx.MORPH_BONE:
+            pack=self.bone_morph_struct.pack
+            self.write_bytes(b"".join(pack(o.bone_index,
+                o.position.x, o.position.y, o.position.z,
+                o.rotation.x, o.rotation.y, o.rotation.z, o.rotation.w)
+                for o in offsets))
+        elif pmx.MORPH_UV<=morph_type<=pmx.MORPH_EXTENDED_UV4:
+            pack=self.uv_morph_struct.pack
+            self.write_bytes(b"".join(pack(o.vertex_index,
+                o.uv.x, o.uv.y, o.uv.z, o.uv.w) for o in offsets))
+        elif morph_type==pmx.MORPH_MATERIAL:
+            pack=self.material_morph_struct.pack
+            self.write_bytes(b"".join(pack(o.material_index, o.calc_mode,
+                *self.get_material_morph_values(o)) for o in offsets))
+        else:
+            raise common.WriteException(
+                    "unknown morph type: {0}".format(morph_type))
+
+    def write_vertex_morph_offsets(self, offsets):
+        if isinstance(offsets, pmx.VertexMorphOffsetArray):
+            import numpy
+            records=numpy.empty(len(offsets), [
+                ("vertex_index",
+                    "<"+INDEX_FORMATS[self.vertex_index_size]),
+                ("position_offset", "<f4", (3,)),
+                ])
+            records["vertex_index"]=offsets.vertex_indices
+            records["position_offset"]=offsets.position_offsets
+            self.write_bytes(records.tobytes())
+        else:
+            pack=self.vertex_morph_struct.pack
+            self.write_bytes(b"".join(pack(o.vertex_index,
+                o.position_offset.x, o.position_offset.y, o.position_offset.z)
+                for o in offsets))
+
+    def get_material_morph_values(self, o):
+        return (o.diffuse.r, o.diffuse.g, o.diffuse.b, o.diffuse.a,
+                o.specular.r, o.specular.g, o.specular.b,
+                o.specular_factor,
+                o.ambient.r, o.ambient.g, o.ambient.b,
+                o.edge_color.r, o.edge_color.g, o.edge_color.b,
+                o.edge_color.a,
+                o.edge_size,
+                o.texture_factor.r, o.texture_factor.g,
+                o.texture_factor.b, o.texture_factor.a,
+                o.sphere_texture_factor.r, o.sphere_texture_factor.g,
+                o.sphere_texture_factor.b, o.sphere_texture_factor.a,
+                o.toon_texture_factor.r, o.toon_texture_factor.g,
+                o.toon_texture_factor.b, o.toon_texture_factor.a)
 
     def write_display_slots(self, display_slots):
         self.write_int(len(display_slots), 4)
@@ -268,28 +387,34 @@ class Writer(common.BinaryWriter):
             self.write_vector3(j.spring_constant_rotation)
 
 
-def write(ios, model, text_encoding=0):
+def get_array_size(size):
     """
-    write model to ios.
+    return the index size(1, 2 or 4) for an array of size elements.
+    """
+    if size<128:
+        return 1
+    elif size<32768:
+        return 2
+    elif size<2147483647:
+        return 4
+    else:
+        raise common.WriteException(
+                "invalid array_size: {0}".format(size))
 
-    :Parameters:
-        ios
-            output stream (in io.IOBase)
-        model
-            pmx model
-        text_encoding
-            text field encoding (0: UTF16, 1:UTF-8).
 
-    >>> import pymeshio.pmx.writer
-    >>> pymeshio.pmx.writer.write(io.open('out.pmx', 'wb'), pmx_model)
+def create_writer(ios, version, text_encoding,
+        vertex_count, texture_count, material_count,
+        bone_count, morph_count, rigidbody_count):
+    """
+    write the pmx header, then return the Writer for the sections.
 
+    the index sizes of the header are decided by the element counts, so
+    the sections can be written one by one without the whole model.
     """
-    assert(isinstance(ios, io.IOBase))
-    assert(isinstance(model, pmx.Model))
     writer=common.BinaryWriter(ios)
     # header
     writer.write_bytes(b"PMX ")
-    writer.write_float(model.version)
+    writer.write_float(version)
 
     # flags
     writer.write_int(8, 1)
@@ -297,40 +422,53 @@ def write(ios, model, text_encoding=0):
     writer.write_int(text_encoding, 1)
     # extend uv
     writer.write_int(0, 1)
-    def get_array_size(size):
-        if size<128:
-            return 1
-        elif size<32768:
-            return 2
-        elif size<2147483647:
-            return 4
-        else:
-            raise common.WriteError(
-                    "invalid array_size: {0}".format(size))
     # vertex_index_size
-    vertex_index_size=get_array_size(len(model.vertices))
+    vertex_index_size=get_array_size(vertex_count)
     writer.write_int(vertex_index_size, 1)
     # texture_index_size
-    texture_index_size=get_array_size(len(model.textures))
+    texture_index_size=get_array_size(texture_count)
     writer.write_int(texture_index_size, 1)
     # material_index_size
-    material_index_size=get_array_size(len(model.materials))
+    material_index_size=get_array_size(material_count)
     writer.write_int(material_index_size, 1)
     # bone_index_size
-    bone_index_size=get_array_size(len(model.bones))
+    bone_index_size=get_array_size(bone_count)
     writer.write_int(bone_index_size, 1)
     # morph_index_size
-    morph_index_size=get_array_size(len(model.morphs))
+    morph_index_size=get_array_size(morph_count)
     writer.write_int(morph_index_size, 1)
     # rigidbody_index_size
-    rigidbody_index_size=get_array_size(len(model.rigidbodies))
+    rigidbody_index_size=get_array_size(rigidbody_count)
     writer.write_int(rigidbody_index_size, 1)
 
-    writer=Writer(writer.ios, 
+    return Writer(ios,
             text_encoding, 0,
             vertex_index_size, texture_index_size, material_index_size,
             bone_index_size, morph_index_size, rigidbody_index_size)
- 
+
+
+def write(ios, model, text_encoding=0):
+    """
+    write model to ios.
+
+    :Parameters:
+        ios
+            output stream (in io.IOBase)
+        model
+            pmx model
+        text_encoding
+            text field encoding (0: UTF16, 1:UTF-8).
+
+    >>> import pymeshio.pmx.writer
+    >>> pymeshio.pmx.writer.write(io.open('out.pmx', 'wb'), pmx_model)
+
+    """
+    assert(isinstance(ios, io.IOBase))
+    assert(isinstance(model, pmx.Model))
+    writer=create_writer(ios, model.version, text_encoding,
+            len(model.vertices), len(model.textures), len(model.materials),
+            len(model.bones), len(model.morphs), len(model.rigidbodies))
+
     # model info
     writer.write_text(model.name)
     writer.write_text(model.english_name)
@@ -347,6 +485,7 @@ def write(ios, model, text_encoding=0):
     writer.write_display_slots(model.display_slots)
     writer.write_rigidbodies(model.rigidbodies)
     writer.write_joints(model.joints)
+    writer.flush_section()
     return True
 
 def write_to_file(pmx_model, path):
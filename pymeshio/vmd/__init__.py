@@ -16,6 +16,35 @@ import struct
 from .. import common
 
 
+# numpy dtypes of the frame records. read by frame_layout="numpy".
+BONE_FRAME_DTYPE=[
+        ('name', 'S15'),
+        ('frame', '<u4'),
+        ('pos', '<f4', (3,)),
+        ('q', '<f4', (4,)),
+        ('complement', 'u1', (64,)),
+        ]
+MORPH_FRAME_DTYPE=[
+        ('name', 'S15'),
+        ('frame', '<u4'),
+        ('ratio', '<f4'),
+        ]
+CAMERA_FRAME_DTYPE=[
+        ('frame', '<u4'),
+        ('length', '<f4'),
+        ('pos', '<f4', (3,)),
+        ('euler', '<f4', (3,)),
+        ('complement', 'u1', (24,)),
+        ('angle', '<f4'),
+        ('perspective', 'u1'),
+        ]
+LIGHT_FRAME_DTYPE=[
+        ('frame', '<u4'),
+        ('color', '<f4', (3,)),
+        ('pos', '<f4', (3,)),
+        ]
+
+
 class MorphFrame(object):
     """
     morphing animation data.
@@ -29,6 +58,9 @@ class MorphFrame(object):
     def __cmp__(self, other):
         return cmp(self.frame, other.frame)
 
+    def __lt__(self, other):
+        return self.frame<other.frame
+
 
 class BoneFrame(object):
     """
@@ -44,6 +76,9 @@ class BoneFrame(object):
     def __cmp__(self, other):
         return cmp(self.frame, other.frame)
 
+    def __lt__(self, other):
+        return self.frame<other.frame
+
     def __str__(self):
         return '<BoneFrame "%s" %d %s%s>' % (self.name, self.frame, self.pos, self.q)
 
@@ -65,10 +100,33 @@ class CameraFrame(object):
     def __cmp__(self, other):
         return cmp(self.frame, other.frame)
 
+    def __lt__(self, other):
+        return self.frame<other.frame
+
     def __str__(self):
         return '<CameraFrame %d %s%s>' % (self.frame, self.pos, self.euler)
 
 
+class LightFrame(object):
+    """
+    light animation data.
+    """
+    __slots__=['frame', 'color', 'pos']
+    def __init__(self):
+        self.frame=-1
+        self.color=common.RGB()
+        self.pos=common.Vector3()
+
+    def __cmp__(self, other):
+        return cmp(self.frame, other.frame)
+
+    def __lt__(self, other):
+        return self.frame<other.frame
+
+    def __str__(self):
+        return '<LightFrame %d %s%s>' % (self.frame, self.color, self.pos)
+
+
 class Motion(object):
     __slots__=[
             'model_name',
@@ -91,3 +149,222 @@ class Motion(object):
             self.model_name, len(self.motions), len(self.shapes),
             len(self.cameras), len(self.lights))
 
+
+def complement_to_bytes(complement, size):
+    """
+    raw bytes of the complement(interpolation) data.
+
+    :Parameters:
+      complement
+        bytes-like object or hex string(vmd.reader.read)
+      size
+        64(bone frame) or 24(camera frame)
+    """
+    if isinstance(complement, str):
+        if len(complement)!=size*2:
+            raise ValueError("invalid complement hex string: {0}".format(
+                complement))
+        complement=bytearray.fromhex(complement)
+    complement=bytes(complement)
+    if len(complement)!=size:
+        raise ValueError("invalid complement size: {0}".format(
+            len(complement)))
+    return complement
+
+
+class BoneTrack(object):
+    """
+    key frames of a bone sorted by frame number.
+
+    :IVariables:
+        name
+            bone name(bytes)
+        frames
+            uint32 N. sorted and unique
+        positions
+            float32 Nx3
+        rotations
+            float32 Nx4. quaternion x, y, z, w
+        interpolations
+            uint8 Nx64. raw complement data
+    """
+    __slots__=[
+            'name',
+            'frames',
+            'positions',
+            'rotations',
+            'interpolations',
+            ]
+    def __init__(self, name, frames, positions, rotations, interpolations):
+        self.name=name
+        self.frames=frames
+        self.positions=positions
+        self.rotations=rotations
+        self.interpolations=interpolations
+
+    def __str__(self):
+        return '<BoneTrack "%s" %d keys>' % (self.name, len(self))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def find(self, frame):
+        """
+        index of the last key at or before frame(-1 if none).
+        frame can be a number or an array.
+        """
+        return self.frames.searchsorted(frame, 'right')-1
+
+
+class MorphTrack(object):
+    """
+    key frames of a morph sorted by frame number.
+
+    :IVariables:
+        name
+            morph name(bytes)
+        frames
+            uint32 N. sorted and unique
+        weights
+            float32 N
+    """
+    __slots__=[
+            'name',
+            'frames',
+            'weights',
+            ]
+    def __init__(self, name, frames, weights):
+        self.name=name
+        self.frames=frames
+        self.weights=weights
+
+    def __str__(self):
+        return '<MorphTrack "%s" %d keys>' % (self.name, len(self))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def find(self, frame):
+        """
+        index of the last key at or before frame(-1 if none).
+        frame can be a number or an array.
+        """
+        return self.frames.searchsorted(frame, 'right')-1
+
+
+class MotionTracks(object):
+    """
+    columnar motion. created by create_motion_tracks.
+
+    :IVariables:
+        model_name
+            model name(bytes)
+        bones
+            {bone name: BoneTrack}
+        morphs
+            {morph name: MorphTrack}
+        last_frame
+            max frame number
+    """
+    __slots__=[
+            'model_name',
+            'bones',
+            'morphs',
+            'last_frame',
+            ]
+    def __init__(self, model_name, bones, morphs):
+        self.model_name=model_name
+        self.bones=bones
+        self.morphs=morphs
+        self.last_frame=max([int(track.frames[-1]) 
+            for track in list(bones.values())+list(morphs.values())
+            if len(track)]+[0])
+
+    def __str__(self):
+        return '<MotionTracks "%s" bone: %d, morph: %d, last_frame: %d>' % (
+                self.model_name, len(self.bones), len(self.morphs),
+                self.last_frame)
+
+
+def _group_by_name(names, frames):
+    """
+    return [(name, indices sorted by frame)]. the last of duplicated frames
+    in the file order is kept.
+    """
+    import numpy
+    if len(names)==0:
+        return []
+    uniques, inverse=numpy.unique(numpy.asarray(names), return_inverse=True)
+    # names may have garbage after the zero terminator
+    track_names=[]
+    track_ids={}
+    unique_ids=[]
+    for name in uniques.tolist():
+        pos=name.find(b"\x00")
+        if pos!=-1:
+            name=name[:pos]
+        if name not in track_ids:
+            track_ids[name]=len(track_names)
+            track_names.append(name)
+        unique_ids.append(track_ids[name])
+    ids=numpy.array(unique_ids)[inverse.reshape(-1)]
+
+    order=numpy.lexsort((frames, ids))
+    groups=numpy.split(order,
+            numpy.flatnonzero(numpy.diff(ids[order]))+1)
+    result=[]
+    for indices in groups:
+        track_frames=frames[indices]
+        keep=numpy.append(track_frames[1:]!=track_frames[:-1], True)
+        result.append((track_names[ids[indices[0]]], indices[keep]))
+    return result
+
+
+def create_motion_tracks(motion):
+    """
+    create MotionTracks from vmd.Motion(frame_layout "object" or "numpy").
+
+    requires numpy.
+    """
+    import numpy
+    motions=motion.motions
+    if isinstance(motions, numpy.ndarray):
+        names=motions['name']
+        frames=motions['frame']
+        positions=motions['pos']
+        rotations=motions['q']
+        interpolations=motions['complement']
+    else:
+        names=[f.name for f in motions]
+        frames=numpy.array([f.frame for f in motions], numpy.uint32)
+        positions=numpy.array([(f.pos.x, f.pos.y, f.pos.z) 
+            for f in motions], numpy.float32).reshape(-1, 3)
+        rotations=numpy.array([(f.q.x, f.q.y, f.q.z, f.q.w) 
+            for f in motions], numpy.float32).reshape(-1, 4)
+        interpolations=numpy.frombuffer(b"".join(
+            [complement_to_bytes(f.complement, 64) for f in motions]),
+            numpy.uint8).reshape(-1, 64)
+    bones={}
+    for name, indices in _group_by_name(names, frames):
+        bones[name]=BoneTrack(name,
+                frames[indices].astype(numpy.uint32),
+                positions[indices].astype(numpy.float32),
+                rotations[indices].astype(numpy.float32),
+                interpolations[indices].astype(numpy.uint8))
+
+    shapes=motion.shapes
+    if isinstance(shapes, numpy.ndarray):
+        names=shapes['name']
+        frames=shapes['frame']
+        weights=shapes['ratio']
+    else:
+        names=[f.name for f in shapes]
+        frames=numpy.array([f.frame for f in shapes], numpy.uint32)
+        weights=numpy.array([f.ratio for f in shapes], numpy.float32)
+    morphs={}
+    for name, indices in _group_by_name(names, frames):
+        morphs[name]=MorphTrack(name,
+                frames[indices].astype(numpy.uint32),
+                weights[indices].astype(numpy.float32))
+
+    return MotionTracks(motion.model_name, bones, morphs)
@@ -5,99 +5,309 @@ vmd reader
 import io
 import struct
 from .. import common
+from ..common import truncate_zero
 from .. import vmd
+from ..cache import get_cache
+
+
+# fused record structs
+BONE_FRAME_STRUCT=common.get_struct("15sI7f64s")
+MORPH_FRAME_STRUCT=common.get_struct("15sIf")
+CAMERA_FRAME_STRUCT=common.get_struct("If3f3f24sfB")
+LIGHT_FRAME_STRUCT=common.get_struct("I3f3f")
+
+
+def create_bone_frame(record):
+    """
+    vmd.BoneFrame from BONE_FRAME_STRUCT record. complement is raw bytes.
+    """
+    frame=vmd.BoneFrame(truncate_zero(record[0]))
+    frame.frame=record[1]
+    frame.pos=common.Vector3(*record[2:5])
+    frame.q=common.Quaternion(*record[5:9])
+    frame.complement=record[9]
+    return frame
+
+
+def create_morph_frame(record):
+    """
+    vmd.MorphFrame from MORPH_FRAME_STRUCT record.
+    """
+    frame=vmd.MorphFrame(truncate_zero(record[0]))
+    frame.frame=record[1]
+    frame.ratio=record[2]
+    return frame
+
+
+def create_camera_frame(record):
+    """
+    vmd.CameraFrame from CAMERA_FRAME_STRUCT record. complement is raw bytes.
+    """
+    frame=vmd.CameraFrame()
+    frame.frame=record[0]
+    frame.length=record[1]
+    frame.pos=common.Vector3(*record[2:5])
+    frame.euler=common.Vector3(*record[5:8])
+    frame.complement=record[8]
+    frame.angle=record[9]
+    frame.perspective=record[10]
+    return frame
+
+
+def create_light_frame(record):
+    """
+    vmd.LightFrame from LIGHT_FRAME_STRUCT record.
+    """
+    frame=vmd.LightFrame()
+    frame.frame=record[0]
+    frame.color=common.RGB(*record[1:4])
+    frame.pos=common.Vector3(*record[4:7])
+    return frame
+
+
+def complement_to_str(complement):
+    """
+    hex string of complement bytes(vmd.reader.read format)
+    """
+    return ''.join(['%02x' % x for x in bytearray(complement)])
 
 
 class Reader(common.BinaryReader):
     def read_text(self, size):
         """read cp932 text
         """
-        src=self.unpack("%ds" % size, size)
-        assert(type(src)==bytes)
-        pos = src.find(b"\x00")
-        if pos==-1:
-            return src
-        else:
-            return src[:pos]
+        return truncate_zero(self.read_bytes(size).tobytes())
 
     def read_bone_frame(self):
         """
         フレームひとつ分を読み込む(111 bytes)
         """
-        frame=vmd.BoneFrame(self.read_text(15))
-        (frame.frame, frame.pos.x, frame.pos.y, frame.pos.z,
-        frame.q.x, frame.q.y, frame.q.z, frame.q.w) = struct.unpack(
-                'I7f', self.ios.read(32))
+        frame=create_bone_frame(self.read_struct(BONE_FRAME_STRUCT))
         # complement data
-        frame.complement=''.join(
-                ['%x' % x for x in struct.unpack('64B', self.ios.read(64))])
+        frame.complement=complement_to_str(frame.complement)
         return frame
 
     def read_morph_frame(self):
         """
         モーフデータひとつ分を読み込む(23 bytes)
         """
-        frame=vmd.MorphFrame(self.read_text(15))
-        (frame.frame, frame.ratio)=struct.unpack('If', self.ios.read(8))
-        return frame
+        return create_morph_frame(self.read_struct(MORPH_FRAME_STRUCT))
 
     def read_camera_frame(self):
         """
         カメラデータひとつ分を読み込む(61 bytes)
         """
-        frame=vmd.CameraFrame()
-        (frame.frame, frame.length,
-                frame.pos.x, frame.pos.y, frame.pos.z,
-                frame.euler.x, frame.euler.y, frame.euler.z
-                )=struct.unpack('If3f3f', self.ios.read(32))
+        frame=create_camera_frame(self.read_struct(CAMERA_FRAME_STRUCT))
         # complement data
-        frame.complement=''.join(
-                ['%x' % x for x in struct.unpack('24B', self.ios.read(24))])
-        (frame.angle, frame.perspective
-                )=struct.unpack('fB', self.ios.read(5))
+        frame.complement=complement_to_str(frame.complement)
         return frame
 
+    def read_light_frame(self):
+        """
+        照明データひとつ分を読み込む(28 bytes)
+        """
+        return create_light_frame(self.read_struct(LIGHT_FRAME_STRUCT))
+
+
+# frame sections in file order
+SECTIONS=[
+        ('bone', BONE_FRAME_STRUCT, create_bone_frame),
+        ('morph', MORPH_FRAME_STRUCT, create_morph_frame),
+        ('camera', CAMERA_FRAME_STRUCT, create_camera_frame),
+        ('light', LIGHT_FRAME_STRUCT, create_light_frame),
+        ]
+KINDS=tuple(kind for kind, _, _ in SECTIONS)
+
+
+def _read_exactly(ios, size):
+    data=ios.read(size)
+    if len(data)!=size:
+        raise common.ParseException("unexpected eof: {0}/{1} bytes".format(
+            len(data), size))
+    return data
+
+
+def _skip(ios, size, chunk_size):
+    if ios.seekable():
+        ios.seek(size, io.SEEK_CUR)
+        return
+    while size>0:
+        n=min(size, chunk_size)
+        _read_exactly(ios, n)
+        size-=n
+
 
-def read_from_file(path):
+def iter_frames(ios, kinds=KINDS, batch_size=None, chunk_size=1024):
+    """
+    read frames sequentially from ios, holding at most chunk_size records.
+
+    complement(interpolation) of bone and camera frames is kept raw bytes.
+    reading stops after the last section in kinds, the other sections are
+    skipped(seek or read through).
+
+    :Parameters:
+      ios
+        input stream (in io.IOBase)
+      kinds
+        sections to yield. "bone", "morph", "camera" and "light".
+      batch_size
+        None yields each frame. otherwise yields lists of up to batch_size
+        frames of one section.
+      chunk_size
+        records to read at once
+
+    >>> import pymeshio.vmd.reader
+    >>> with open('resources/motion.vmd', 'rb') as f:
+    ...     for frame in pymeshio.vmd.reader.iter_frames(f, ['morph']):
+    ...         print(frame)
+
+    """
+    kinds=set(kinds)
+    for kind in kinds:
+        if kind not in KINDS:
+            raise ValueError("unknown frame kind: {0}".format(kind))
+    if batch_size is not None:
+        if batch_size<1:
+            raise ValueError("invalid batch_size: {0}".format(batch_size))
+        chunk_size=batch_size
+
+    signature=_read_exactly(ios, 30)
+    if signature[:25] == b"Vocaloid Motion Data 0002":
+        name_size=20
+    elif signature[:25] == b"Vocaloid Motion Data file":
+        name_size=10
+    else:
+        raise common.ParseException(
+                "invalid signature: {0}".format(signature))
+    # model name
+    _read_exactly(ios, name_size)
+
+    last=max([KINDS.index(kind) for kind in kinds]+[-1])
+    for kind, compiled, create in SECTIONS[:last+1]:
+        data=ios.read(4)
+        if len(data)<4:
+            # old vmd ends without later sections
+            return
+        count=common.UINT_STRUCTS[4].unpack(data)[0]
+        if kind not in kinds:
+            _skip(ios, compiled.size*count, compiled.size*chunk_size)
+            continue
+        while count>0:
+            n=min(count, chunk_size)
+            frames=[create(record) for record in compiled.iter_unpack(
+                _read_exactly(ios, compiled.size*n))]
+            if batch_size is None:
+                for frame in frames:
+                    yield frame
+            else:
+                yield frames
+            count-=n
+
+
+def read_from_file(path, frame_layout="object", use_mmap=False, cache=None):
     """
     read from file path
 
     :Parameters:
       path
         file path
+      frame_layout
+        see read
+      use_mmap
+        read from a memory mapped file instead of a copy of it.
+        with frame_layout="numpy" the frame arrays become read only views
+        of the mapping.
+      cache
+        True or pymeshio.cache.ParseCache. load the parsed motion from the
+        cache, or parse and store it.
 
     >>> import pymeshio.vmd.reader
     >>> m=pymeshio.vmd.reader.read_from_file('resources/motion.vmd')
     >>> print(m)
 
     """
-    return read(io.BytesIO(common.readall(path)))
+    if cache:
+        return get_cache(cache).read(path, "vmd", (frame_layout,),
+                lambda path: read_from_file(path, frame_layout, use_mmap))
+    if use_mmap:
+        return read(common.mmap_file(path), frame_layout)
+    else:
+        return read(io.BytesIO(common.readall(path)), frame_layout)
 
 
-def read(ios):
-    assert(isinstance(ios, io.IOBase))
+def read(ios, frame_layout="object"):
+    """
+    read from ios, then return the vmd.Motion.
+
+    :Parameters:
+      ios
+        input stream (in io.IOBase) or bytes-like object
+      frame_layout
+        "object": frames are lists of vmd.BoneFrame, vmd.MorphFrame,
+        vmd.CameraFrame and vmd.LightFrame.
+        "numpy": frames are numpy structured arrays of
+        vmd.BONE_FRAME_DTYPE, vmd.MORPH_FRAME_DTYPE,
+        vmd.CAMERA_FRAME_DTYPE and vmd.LIGHT_FRAME_DTYPE(requires numpy).
+    """
+    if frame_layout not in ("object", "numpy"):
+        raise ValueError("unknown frame_layout: {0}".format(frame_layout))
     reader=common.BinaryReader(ios)
 
     signature=reader.unpack("30s", 30)
     version=None
-    if signature[:25] == "Vocaloid Motion Data 0002":
+    if signature[:25] == b"Vocaloid Motion Data 0002":
         version=2
-    elif signature[:25] == "Vocaloid Motion Data file":
+    elif signature[:25] == b"Vocaloid Motion Data file":
         version=1
     else:
         print("invalid signature", signature)
         return
 
-    reader=Reader(reader.ios)
+    reader=Reader(reader)
     motion=vmd.Motion()
     motion.model_name=reader.read_text(20)
-    motion.motions=[reader.read_bone_frame() 
-            for _ in range(reader.unpack('I', 4))]
-    motion.shapes=[reader.read_morph_frame() 
-            for _ in range(reader.unpack('I', 4))]
-    motion.cameras=[reader.read_camera_frame() 
-            for _ in range(reader.unpack('I', 4))]
-    motion.lights=[reader.read_light_frame() 
-            for _ in range(reader.unpack('I', 4))]
+    if frame_layout=="numpy":
+        motion.motions=reader.read_numpy_array(vmd.BONE_FRAME_DTYPE,
+                reader.unpack('I', 4))
+        motion.shapes=reader.read_numpy_array(vmd.MORPH_FRAME_DTYPE,
+                reader.unpack('I', 4))
+        motion.cameras=reader.read_numpy_array(vmd.CAMERA_FRAME_DTYPE,
+                reader.unpack('I', 4))
+        motion.lights=reader.read_numpy_array(vmd.LIGHT_FRAME_DTYPE,
+                reader.unpack('I', 4))
+    else:
+        motion.motions=[reader.read_bone_frame() 
+                for _ in range(reader.unpack('I', 4))]
+        motion.shapes=[reader.read_morph_frame() 
+                for _ in range(reader.unpack('I', 4))]
+        motion.cameras=[reader.read_camera_frame() 
+                for _ in range(reader.unpack('I', 4))]
+        motion.lights=[reader.read_light_frame() 
+                for _ in range(reader.unpack('I', 4))]
+    reader.sync()
     return motion
 
+
+def read_tracks_from_file(path, use_mmap=False):
+    """
+    read from file path, then return the vmd.MotionTracks.
+
+    :Parameters:
+      path
+        file path
+      use_mmap
+        see read_from_file
+    """
+    return vmd.create_motion_tracks(read_from_file(path, "numpy", use_mmap))
+
+
+def read_tracks(ios):
+    """
+    read from ios, then return the vmd.MotionTracks without creating frame
+    objects.
+
+    :Parameters:
+      ios
+        input stream (in io.IOBase) or bytes-like object
+    """
+    return vmd.create_motion_tracks(read(ios, "numpy"))
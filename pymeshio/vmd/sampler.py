@@ -0,0 +1,220 @@
+# coding: utf-8
+"""
+vmd pose sampler
+
+evaluate vmd.MotionTracks at arbitrary frame times.
+
+complement(interpolation) of a bone key
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+the key holds the bezier curves of the segment from the previous key.
+control points (x1, y1), (x2, y2) in 0-127 for each channel::
+
+    x: [0], [4], [8], [12]
+    y: [1], [5], [9], [13]
+    z: [2], [6], [10], [14]
+    r: [3], [7], [11], [15]
+
+"""
+import numpy
+from ..arraymath import slerp
+
+
+# byte offsets of x1, y1, x2, y2 for the x, y, z, rotation channels
+CURVE_OFFSETS=numpy.array([
+    [0, 4, 8, 12],
+    [1, 5, 9, 13],
+    [2, 6, 10, 14],
+    [3, 7, 11, 15],
+    ])
+
+
+def decode_curves(interpolations):
+    """
+    return float32 Nx4(channel)x4(x1, y1, x2, y2) in 0-1 from raw uint8 Nx64
+    complement.
+    """
+    interpolations=numpy.asarray(interpolations, numpy.uint8).reshape(-1, 64)
+    return interpolations[:, CURVE_OFFSETS].astype(numpy.float32)/127.0
+
+
+def evaluate_bezier(curves, x, iterations=20):
+    """
+    evaluate the bezier curves (0, 0), (x1, y1), (x2, y2), (1, 1) at x.
+
+    :Parameters:
+      curves
+        float ...x4(x1, y1, x2, y2)
+      x
+        float ... in 0-1
+      iterations
+        bisection count to solve t from x
+    """
+    x1=curves[..., 0]
+    y1=curves[..., 1]
+    x2=curves[..., 2]
+    y2=curves[..., 3]
+    # bisection. Bx(t) is monotonic for x1, x2 in 0-1
+    lo=numpy.zeros_like(x)
+    hi=numpy.ones_like(x)
+    for _ in range(iterations):
+        t=(lo+hi)*0.5
+        s=1-t
+        bx=3*s*s*t*x1+3*s*t*t*x2+t*t*t
+        less=bx<x
+        lo=numpy.where(less, t, lo)
+        hi=numpy.where(less, hi, t)
+    t=(lo+hi)*0.5
+    s=1-t
+    y=3*s*s*t*y1+3*s*t*t*y2+t*t*t
+    # linear curve
+    linear=(x1==y1) & (x2==y2)
+    return numpy.where(linear, x, y)
+
+
+def _locate(keys, starts, counts, track_count, times, stride):
+    """
+    return the previous key index, the next key index and the segment ratio
+    of every (track, time) pair.
+
+    keys are the frames of all tracks concatenated in track order, and
+    shifted by track index * stride, so one searchsorted finds every pair.
+    """
+    # out of range times hold the first or the last key
+    times=numpy.clip(times, 0, stride-1)
+    track_ids=numpy.arange(track_count)
+    query=track_ids[:, None]*stride+times[None, :]
+    index=keys.searchsorted(query, 'right')-1
+    first=starts[:, None]
+    last=(starts+counts-1)[:, None]
+    prev_index=numpy.clip(index, first, last)
+    next_index=numpy.minimum(prev_index+1, last)
+    # before the first key
+    next_index=numpy.where(index<first, prev_index, next_index)
+    prev_frame=keys[prev_index]
+    next_frame=keys[next_index]
+    span=next_frame-prev_frame
+    ratio=numpy.where(span>0,
+            (query-prev_frame)/numpy.where(span>0, span, 1), 0.0)
+    return prev_index, next_index, numpy.clip(ratio, 0.0, 1.0)
+
+
+class PoseSampler(object):
+    """
+    sample bone poses and morph weights of vmd.MotionTracks.
+
+    the tracks are concatenated and the interpolation curves are decoded
+    once at construction.
+
+    :IVariables:
+        bone_names
+            bone name list. the order of sample_bone_arrays
+        morph_names
+            morph name list. the order of sample_morph_arrays
+    """
+    __slots__=[
+            'bone_names',
+            'bone_keys',
+            'bone_starts',
+            'bone_counts',
+            'positions',
+            'rotations',
+            'curves',
+            'morph_names',
+            'morph_keys',
+            'morph_starts',
+            'morph_counts',
+            'weights',
+            'stride',
+            ]
+    def __init__(self, tracks):
+        self.stride=float(tracks.last_frame+2)
+
+        bone_tracks=[t for t in tracks.bones.values() if len(t)]
+        self.bone_names=[t.name for t in bone_tracks]
+        (self.bone_keys, self.bone_starts, self.bone_counts
+                )=self.__concat_keys(bone_tracks)
+        self.positions=self.__concat(bone_tracks, 'positions', (0, 3))
+        self.rotations=self.__concat(bone_tracks, 'rotations', (0, 4))
+        self.curves=decode_curves(
+                self.__concat(bone_tracks, 'interpolations', (0, 64)))
+
+        morph_tracks=[t for t in tracks.morphs.values() if len(t)]
+        self.morph_names=[t.name for t in morph_tracks]
+        (self.morph_keys, self.morph_starts, self.morph_counts
+                )=self.__concat_keys(morph_tracks)
+        self.weights=self.__concat(morph_tracks, 'weights', (0,))
+
+    def __str__(self):
+        return '<PoseSampler bone: %d, morph: %d>' % (
+                len(self.bone_names), len(self.morph_names))
+
+    def __concat_keys(self, tracks):
+        counts=numpy.array([len(t) for t in tracks], numpy.int64)
+        starts=numpy.concatenate(([0], numpy.cumsum(counts)[:-1])).astype(
+                numpy.int64)
+        keys=numpy.concatenate([t.frames.astype(numpy.float64)+i*self.stride
+            for i, t in enumerate(tracks)]+[numpy.zeros(0)])
+        return keys, starts, counts
+
+    def __concat(self, tracks, name, empty_shape):
+        if not tracks:
+            return numpy.zeros(empty_shape, numpy.float32)
+        return numpy.concatenate([getattr(t, name) for t in tracks])
+
+    def sample_bone_arrays(self, times):
+        """
+        return translations(float32 BxNx3) and rotations(float32 BxNx4) of
+        every bone(bone_names order) at N frame times.
+        """
+        times=numpy.asarray(times, numpy.float64).reshape(-1)
+        bone_count=len(self.bone_names)
+        if bone_count==0:
+            return (numpy.zeros((0, len(times), 3), numpy.float32),
+                    numpy.zeros((0, len(times), 4), numpy.float32))
+        prev_index, next_index, ratio=_locate(self.bone_keys,
+                self.bone_starts, self.bone_counts, bone_count,
+                times, self.stride)
+        # curves of the segment are in the next key
+        curves=self.curves[next_index]
+        x=numpy.broadcast_to(ratio[..., None], curves.shape[:-1])
+        y=evaluate_bezier(curves, x.astype(numpy.float32))
+        p0=self.positions[prev_index]
+        p1=self.positions[next_index]
+        translations=p0+(p1-p0)*y[..., 0:3]
+        rotations=slerp(self.rotations[prev_index],
+                self.rotations[next_index], y[..., 3])
+        return (translations.astype(numpy.float32),
+                rotations.astype(numpy.float32))
+
+    def sample_bones(self, times):
+        """
+        return {bone name: (translations Nx3, rotations Nx4)} at N frame
+        times.
+        """
+        translations, rotations=self.sample_bone_arrays(times)
+        return dict((name, (translations[i], rotations[i]))
+                for i, name in enumerate(self.bone_names))
+
+    def sample_morph_arrays(self, times):
+        """
+        return weights(float32 MxN) of every morph(morph_names order) at N
+        frame times. morph keys are interpolated linearly.
+        """
+        times=numpy.asarray(times, numpy.float64).reshape(-1)
+        morph_count=len(self.morph_names)
+        if morph_count==0:
+            return numpy.zeros((0, len(times)), numpy.float32)
+        prev_index, next_index, ratio=_locate(self.morph_keys,
+                self.morph_starts, self.morph_counts, morph_count,
+                times, self.stride)
+        w0=self.weights[prev_index]
+        w1=self.weights[next_index]
+        return (w0+(w1-w0)*ratio).astype(numpy.float32)
+
+    def sample_morphs(self, times):
+        """
+        return {morph name: weights N} at N frame times.
+        """
+        weights=self.sample_morph_arrays(times)
+        return dict((name, weights[i])
+                for i, name in enumerate(self.morph_names))
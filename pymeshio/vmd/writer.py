@@ -32,7 +32,7 @@ def write(ios, motion):
         writer.write_float(m.q.y)
         writer.write_float(m.q.z)
         writer.write_float(m.q.w)
-        writer.write_bytes(m.complement, 64)
+        writer.write_bytes(vmd.complement_to_bytes(m.complement, 64), 64)
 
     # shape motions
     writer.write_uint(len(motion.shapes), 4)
@@ -0,0 +1,63 @@
+# coding: utf-8
+"""
+========================
+MikuMikuDance VPD format
+========================
+
+pose of the bones as text(cp932)::
+
+    Vocaloid Pose Data file
+
+    miku.osm;		// 親ファイル名
+    2;				// 総ポーズボーン数
+
+    Bone0{センター
+      0.000000,0.000000,0.000000;				// trans x,y,z
+      0.000000,0.000000,0.000000,1.000000;		// Quaternion x,y,z,w
+    }
+
+"""
+
+
+class Pose(object):
+    """
+    bones of a vpd file as arrays.
+
+    :IVariables:
+        osm
+            parent file name. bytes(cp932)
+        names
+            bone names. bytes(cp932) list
+        translations
+            float32 Bx3
+        rotations
+            float32 Bx4. quaternion x, y, z, w
+    """
+    __slots__=[
+            'path',
+            'osm',
+            'names',
+            'translations',
+            'rotations',
+            ]
+    def __init__(self, osm, names, translations, rotations):
+        self.path=''
+        self.osm=osm
+        self.names=names
+        self.translations=translations
+        self.rotations=rotations
+
+    def __str__(self):
+        return '<vpd.Pose %s %d bones>' % (self.osm.decode('cp932', 'replace'),
+                len(self.names))
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_bone_samples(self):
+        """
+        return {bone name: (translation 1x3, rotation 1x4)}, the
+        bone_samples of pmx.fk.create_pose_from_samples with frame_count 1.
+        """
+        return dict((name, (self.translations[i:i+1], self.rotations[i:i+1]))
+                for i, name in enumerate(self.names))
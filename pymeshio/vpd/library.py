@@ -0,0 +1,308 @@
+# coding: utf-8
+"""
+vpd pose library
+
+index a directory of vpd files into an array store. the bones of all the
+poses are concatenated, so a pose browser searches and applies the poses
+without parsing the text again.
+
+a library is a directory::
+
+    <library>/index.json        version, bone name table and pose table
+    <library>/translations.npy  float32 Tx3. bones of all poses
+    <library>/rotations.npy     float32 Tx4
+    <library>/bone_ids.npy      int32 T. index in the bone name table
+    <library>/starts.npy        int64 P+1. bones of the pose i are
+                                starts[i]:starts[i+1]
+
+the arrays are loaded as read only mmaps. files which fail to parse are
+skipped and listed in PoseLibrary.errors.
+
+>>> from pymeshio.vpd import library
+>>> poses=library.build_library('resources/pose')
+>>> poses.save('pose.library')
+>>> poses=library.load('pose.library')
+>>> rotations, translations=poses.apply(poses.find(u'wave'), bone_names)
+
+"""
+import os
+import io
+import json
+import numpy
+from .. import common
+from .. import vpd
+from . import reader
+
+
+LIBRARY_VERSION=1
+INDEX_NAME="index.json"
+ARRAY_NAMES=["translations", "rotations", "bone_ids", "starts"]
+
+
+def _to_text(name):
+    if isinstance(name, bytes):
+        return name.decode("cp932", "replace")
+    return name
+
+
+class PoseLibrary(object):
+    """
+    poses as concatenated arrays with a bone name table.
+
+    :IVariables:
+        paths
+            pose file paths relative to the indexed directory('/'
+            separated)
+        osms
+            parent file name of each pose
+        stats
+            (size, mtime) of each pose file. unchanged files are reused
+            by build_library
+        bone_names
+            bone name table(str)
+        translations
+            float32 Tx3
+        rotations
+            float32 Tx4
+        bone_ids
+            int32 T. index in bone_names
+        starts
+            int64 P+1
+        errors
+            [(path, message)] of the files failed to parse
+    """
+    __slots__=[
+            'paths',
+            'osms',
+            'stats',
+            'bone_names',
+            'translations',
+            'rotations',
+            'bone_ids',
+            'starts',
+            'errors',
+            ]
+    def __init__(self, paths, osms, stats, bone_names,
+            translations, rotations, bone_ids, starts, errors=None):
+        self.paths=paths
+        self.osms=osms
+        self.stats=stats
+        self.bone_names=bone_names
+        self.translations=translations
+        self.rotations=rotations
+        self.bone_ids=bone_ids
+        self.starts=starts
+        self.errors=errors or []
+
+    def __str__(self):
+        return '<vpd.library.PoseLibrary %d poses, %d bones, %d names>' % (
+                len(self), len(self.bone_ids), len(self.bone_names))
+
+    def __len__(self):
+        return len(self.paths)
+
+    def get_bones(self, index):
+        """
+        return (bone names(str), translations, rotations) of the pose.
+        """
+        start, end=self.starts[index], self.starts[index+1]
+        return ([self.bone_names[i] for i in self.bone_ids[start:end]],
+                self.translations[start:end], self.rotations[start:end])
+
+    def get_pose(self, index):
+        """
+        return vpd.Pose of the pose.
+        """
+        names, translations, rotations=self.get_bones(index)
+        pose=vpd.Pose(self.osms[index].encode("cp932"),
+                [name.encode("cp932") for name in names],
+                numpy.array(translations), numpy.array(rotations))
+        pose.path=self.paths[index]
+        return pose
+
+    def find(self, text):
+        """
+        indices of the poses whose path contains text, case insensitive.
+        """
+        text=_to_text(text).lower()
+        return numpy.array([i for i, path in enumerate(self.paths)
+            if text in path.lower()], numpy.int64)
+
+    def find_bone(self, name):
+        """
+        indices of the poses which have the bone.
+        """
+        name=_to_text(name)
+        if name not in self.bone_names:
+            return numpy.zeros(0, numpy.int64)
+        rows=numpy.flatnonzero(self.bone_ids==self.bone_names.index(name))
+        return numpy.unique(numpy.searchsorted(self.starts, rows,
+            side="right")-1)
+
+    def apply(self, indices, bone_names):
+        """
+        return rotations PxBx4 and translations PxBx3 of the poses in the
+        bone order of a model, as pymeshio.pmx.fk takes. bones without a
+        pose are identity.
+
+        :Parameters:
+          indices
+            pose indices P
+          bone_names
+            bone names B of the model. str or bytes(cp932)
+        """
+        indices=numpy.asarray(indices, numpy.int64).reshape(-1)
+        model_indices=dict((_to_text(name), i)
+                for i, name in enumerate(bone_names))
+        lookup=numpy.array([model_indices.get(name, -1)
+            for name in self.bone_names], numpy.int64)
+        rotations=numpy.zeros((len(indices), len(bone_names), 4),
+                numpy.float32)
+        rotations[..., 3]=1
+        translations=numpy.zeros((len(indices), len(bone_names), 3),
+                numpy.float32)
+        counts=self.starts[indices+1]-self.starts[indices]
+        poses=numpy.repeat(numpy.arange(len(indices)), counts)
+        rows=numpy.repeat(self.starts[indices]-(numpy.cumsum(counts)-counts),
+                counts)+numpy.arange(int(counts.sum()))
+        bones=lookup[self.bone_ids[rows]] if len(lookup) else rows
+        valid=bones>=0
+        rotations[poses[valid], bones[valid]]=self.rotations[rows[valid]]
+        translations[poses[valid], bones[valid]]=self.translations[
+                rows[valid]]
+        return rotations, translations
+
+    def save(self, path):
+        """
+        write the library directory.
+        """
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for name in ARRAY_NAMES:
+            numpy.save(os.path.join(path, name+".npy"),
+                    numpy.ascontiguousarray(getattr(self, name)),
+                    allow_pickle=False)
+        # the index is written last. a library without it is incomplete
+        with io.open(os.path.join(path, INDEX_NAME), "w",
+                encoding="utf-8") as f:
+            f.write(json.dumps({
+                "version": LIBRARY_VERSION,
+                "bone_names": self.bone_names,
+                "poses": [[path, osm, size, mtime] for path, osm, (size, mtime)
+                    in zip(self.paths, self.osms, self.stats)],
+                "errors": self.errors,
+                }, ensure_ascii=False))
+
+
+def load(path, use_mmap=True):
+    """
+    load the library directory written by PoseLibrary.save.
+
+    :Parameters:
+      path
+        library directory
+      use_mmap
+        load the arrays as read only mmaps
+    """
+    with io.open(os.path.join(path, INDEX_NAME), "r", encoding="utf-8") as f:
+        index=json.load(f)
+    if index.get("version")!=LIBRARY_VERSION:
+        raise common.ParseException("unknown pose library version: {0}".format(
+            index.get("version")))
+    arrays=[numpy.load(os.path.join(path, name+".npy"),
+        mmap_mode="r" if use_mmap else None, allow_pickle=False)
+        for name in ARRAY_NAMES]
+    poses=index["poses"]
+    return PoseLibrary([p[0] for p in poses], [p[1] for p in poses],
+            [(p[2], p[3]) for p in poses], index["bone_names"], *arrays,
+            errors=[tuple(e) for e in index["errors"]])
+
+
+def find_files(directory, extension=".vpd"):
+    """
+    return the sorted relative paths('/' separated) of the files with the
+    extension under directory.
+    """
+    paths=[]
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        relative=os.path.relpath(root, directory)
+        for name in sorted(files):
+            if name.lower().endswith(extension):
+                path=name if relative=="." else os.path.join(relative, name)
+                paths.append(path.replace(os.sep, "/"))
+    return paths
+
+
+def build_library(directory, previous=None, extension=".vpd"):
+    """
+    index the vpd files under directory, then return the PoseLibrary.
+
+    :Parameters:
+      directory
+        pose directory
+      previous
+        PoseLibrary of the same directory. the poses of the unchanged
+        files(size and mtime) are copied from it instead of parsed
+      extension
+        file extension to index
+    """
+    reuse={}
+    if previous is not None:
+        for i, (path, stat) in enumerate(zip(previous.paths, previous.stats)):
+            reuse[path]=(i, tuple(stat))
+
+    paths=[]
+    osms=[]
+    stats=[]
+    errors=[]
+    name_ids={}
+    bone_names=[]
+    bone_ids=[]
+    translations=[]
+    rotations=[]
+    def get_ids(names):
+        ids=[]
+        for name in names:
+            i=name_ids.get(name)
+            if i is None:
+                i=len(bone_names)
+                name_ids[name]=i
+                bone_names.append(name)
+            ids.append(i)
+        return ids
+
+    for path in find_files(directory, extension):
+        full_path=os.path.join(directory, path)
+        status=os.stat(full_path)
+        stat=(status.st_size, status.st_mtime)
+        if path in reuse and reuse[path][1]==stat:
+            i=reuse[path][0]
+            names, pose_translations, pose_rotations=previous.get_bones(i)
+            osm=previous.osms[i]
+        else:
+            try:
+                pose=reader.read_from_file(full_path)
+            except (common.ParseException, ValueError) as ex:
+                errors.append((path, str(ex)))
+                continue
+            names=[_to_text(name) for name in pose.names]
+            pose_translations=pose.translations
+            pose_rotations=pose.rotations
+            osm=_to_text(pose.osm)
+        paths.append(path)
+        osms.append(osm)
+        stats.append(stat)
+        bone_ids.append(numpy.array(get_ids(names), numpy.int32))
+        translations.append(pose_translations)
+        rotations.append(pose_rotations)
+
+    counts=[len(ids) for ids in bone_ids]
+    return PoseLibrary(paths, osms, stats, bone_names,
+            numpy.concatenate(translations+[numpy.zeros((0, 3),
+                numpy.float32)]).astype(numpy.float32),
+            numpy.concatenate(rotations+[numpy.zeros((0, 4),
+                numpy.float32)]).astype(numpy.float32),
+            numpy.concatenate(bone_ids+[numpy.zeros(0, numpy.int32)]),
+            numpy.cumsum([0]+counts).astype(numpy.int64),
+            errors)
@@ -0,0 +1,79 @@
+# coding: utf-8
+"""
+vpd reader
+
+the whole text is matched by one compiled pattern pass. the numbers of all
+bones are joined and parsed at once.
+"""
+import io
+import re
+from .. import common
+from .. import vpd
+
+
+SIGNATURE=b"Vocaloid Pose Data file"
+_NUMBER=br"\s*([^\s,;]+)\s*"
+# name, translation x, y, z, rotation x, y, z, w. a comment may follow ;
+BONE_PATTERN=re.compile(
+        br"Bone\d+\s*\{([^\r\n]*)\r?\n"
+        +_NUMBER+b","+_NUMBER+b","+_NUMBER+br";[^\n]*\n"
+        +_NUMBER+b","+_NUMBER+b","+_NUMBER+b","+_NUMBER+br";[^\n]*\n"
+        br"\s*\}")
+HEADER_PATTERN=re.compile(br"^\s*([^\r\n;]*);[^\n]*\n\s*(\d+)\s*;", re.M)
+
+
+def parse(data):
+    """
+    return vpd.Pose of the vpd bytes.
+    """
+    import numpy
+    if not data.startswith(SIGNATURE):
+        raise common.ParseException("invalid signature: {0}".format(
+            data[:len(SIGNATURE)]))
+    header=HEADER_PATTERN.search(data, len(SIGNATURE))
+    if not header:
+        raise common.ParseException("no bone count")
+    osm, bone_count=header.group(1).strip(), int(header.group(2))
+    bones=BONE_PATTERN.findall(data, header.end())
+    if len(bones)!=bone_count:
+        raise common.ParseException(
+                "bone count mismatch: {0} bones for {1}".format(
+                    len(bones), bone_count))
+    values=numpy.fromstring(b" ".join(
+        [b" ".join(bone[1:]) for bone in bones]), numpy.float32, sep=" ")
+    if len(values)!=bone_count*7:
+        raise common.ParseException("invalid number in bones")
+    values=values.reshape(-1, 7)
+    return vpd.Pose(osm, [bone[0].strip() for bone in bones],
+            numpy.ascontiguousarray(values[:, 0:3]),
+            numpy.ascontiguousarray(values[:, 3:7]))
+
+
+def read(ios):
+    """
+    read from ios, then return the vpd.Pose.
+
+    :Parameters:
+      ios
+        input stream (in io.IOBase)
+    """
+    assert(isinstance(ios, io.IOBase))
+    return parse(ios.read())
+
+
+def read_from_file(path):
+    """
+    read from file path, then return the vpd.Pose.
+
+    :Parameters:
+      path
+        file path
+
+    >>> import pymeshio.vpd.reader
+    >>> pose=pymeshio.vpd.reader.read_from_file('resources/pose.vpd')
+    >>> print(pose.names[0], pose.rotations[0])
+
+    """
+    pose=parse(common.readall(path))
+    pose.path=path
+    return pose
@@ -0,0 +1,50 @@
+# coding: utf-8
+"""
+vpd writer
+"""
+import io
+from .. import vpd
+
+
+HEADER=(b"Vocaloid Pose Data file\r\n"
+        b"\r\n"
+        b"%s;\t\t// " + u"親ファイル名".encode("cp932") + b"\r\n"
+        b"%d;\t\t\t\t// " + u"総ポーズボーン数".encode("cp932") + b"\r\n"
+        b"\r\n")
+BONE=(b"Bone%d{%s\r\n"
+        b"  %f,%f,%f;\t\t\t\t// trans x,y,z\r\n"
+        b"  %f,%f,%f,%f;\t\t// Quaternion x,y,z,w\r\n"
+        b"}\r\n"
+        b"\r\n")
+
+
+def write(ios, pose):
+    """
+    write pose to ios.
+
+    :Parameters:
+        ios
+            output stream (in io.IOBase)
+        pose
+            vpd.Pose
+
+    >>> import pymeshio.vpd.writer
+    >>> pymeshio.vpd.writer.write(io.open('out.vpd', 'wb'), pose)
+
+    """
+    assert(isinstance(ios, io.IOBase))
+    assert(isinstance(pose, vpd.Pose))
+    ios.write(HEADER % (pose.osm, len(pose.names)))
+    values=[]
+    for i, name in enumerate(pose.names):
+        values.append(i)
+        values.append(name)
+        values.extend(pose.translations[i].tolist())
+        values.extend(pose.rotations[i].tolist())
+    ios.write(BONE*len(pose.names) % tuple(values))
+    return True
+
+
+def write_to_file(pose, path):
+    with io.open(path, "wb") as f:
+        return write(f, pose)
@@ -4,20 +4,124 @@
 ========================
 DirectX format
 ========================
+
+text format(xof 0302txt) Mesh, MeshMaterialList, MeshNormals and
+MeshTextureCoords.
 """
+from .. import common
+
 
 class Material(object):
+    """
+    :IVariables:
+        diffuse
+            common.RGBA
+        shininess
+            float. power
+        specular
+            common.RGB
+        emit
+            common.RGB
+        texture
+            bytes. TextureFilename. b"" is none
+    """
     __slots__=[
             'diffuse',
             'specular',
             'shininess',
             'emit',
+            'texture',
             ]
     def __init__(self):
-        pass
+        self.diffuse=common.RGBA(1, 1, 1, 1)
+        self.shininess=0.0
+        self.specular=common.RGB(0, 0, 0)
+        self.emit=common.RGB(0, 0, 0)
+        self.texture=b""
+
+
+class FaceArray(object):
+    """
+    the face indices of a Mesh concatenated, read by vertex_layout="numpy".
+    indexing returns an index list as the face list of the object layout.
+
+    :IVariables:
+        sizes
+            int64 F. index count of each face
+        starts
+            int64 F. first index of each face
+        indices
+            int64 C
+    """
+    __slots__=[
+            'sizes',
+            'starts',
+            'indices',
+            ]
+    def __init__(self, sizes, indices):
+        import numpy
+        self.sizes=sizes
+        self.starts=numpy.cumsum(sizes)-sizes
+        self.indices=indices
+
+    def __str__(self):
+        return '<x.FaceArray {0}faces>'.format(len(self))
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        if index<0:
+            index+=len(self)
+        start=self.starts[index]
+        return self.indices[start:start+self.sizes[index]].tolist()
+
+    def get_triangles(self):
+        """
+        return corner positions in indices(int64 Tx3) of the faces
+        triangulated as fans.
+        """
+        from .. import arraymath
+        return arraymath.triangulate_fans(self.starts, self.sizes)
+
+
+def create_face_array(faces):
+    """
+    create x.FaceArray from the index lists. FaceArray is returned as is.
+
+    requires numpy.
+    """
+    if isinstance(faces, FaceArray):
+        return faces
+    import numpy
+    return FaceArray(numpy.array([len(f) for f in faces], numpy.int64),
+            numpy.array([i for f in faces for i in f], numpy.int64))
 
 
 class Model(object):
+    """
+    :IVariables:
+        templates
+            template chunk bytes
+        vertices
+            common.Vector3 list. float32 Nx3 of vertex_layout="numpy"
+        faces
+            index lists. x.FaceArray of vertex_layout="numpy"
+        face_materials
+            int list. int64 F of vertex_layout="numpy"
+        materials
+            x.Material list
+        normals
+            common.Vector3 list. float32 Nx3 of vertex_layout="numpy"
+        face_normals
+            normal index lists. x.FaceArray of vertex_layout="numpy"
+        uvs
+            common.Vector2 list. float32 Nx2 of vertex_layout="numpy"
+    """
     __slots__=[
             'templates',
             'vertices',
@@ -0,0 +1,96 @@
+# coding: utf-8
+"""
+x read/write benchmark on a grid mesh.
+
+compare the object layout(per line parse, x.Model of lists) with the
+numpy layout and pymeshio.x.writer.write_pmx.
+
+usage::
+
+    python -m pymeshio.x.benchmark [triangle_count]
+
+"""
+import sys
+import io
+import math
+import timeit
+import numpy
+from .. import common
+from .. import pmx
+from . import reader
+from . import writer
+
+
+def create_grid_model(triangle_count):
+    """
+    return pmx.Model of a square grid with about triangle_count triangles.
+    """
+    n=max(2, int(math.sqrt(triangle_count/2.0))+1)
+    x, y=numpy.meshgrid(numpy.arange(n, dtype=numpy.float32),
+            numpy.arange(n, dtype=numpy.float32))
+    count=n*n
+    positions=numpy.stack([x.reshape(-1), y.reshape(-1),
+        numpy.sin(x+y).reshape(-1)], axis=1).astype(numpy.float32)
+    normals=numpy.zeros((count, 3), numpy.float32)
+    normals[:, 2]=-1
+    uvs=numpy.stack([x.reshape(-1), y.reshape(-1)], axis=1)/(n-1)
+    model=pmx.Model()
+    model.name=u"grid"
+    model.vertices=pmx.create_bdef1_vertex_array(positions, normals, uvs)
+    corner=(numpy.arange(n-1)[:, None]*n+numpy.arange(n-1)).reshape(-1)
+    model.indices=numpy.stack([corner, corner+n, corner+1,
+        corner+1, corner+n, corner+n+1], axis=1).reshape(-1).astype(
+                numpy.int32)
+    model.textures=[u"grid.png"]
+    model.materials=[pmx.Material(u"grid", u"grid",
+        common.RGB(1, 1, 1), 1.0, 5.0, common.RGB(0, 0, 0),
+        common.RGB(0.5, 0.5, 0.5), 0, common.RGBA(0, 0, 0, 1), 0,
+        0, -1, pmx.MATERIALSPHERE_NONE, 1, 0, u"", len(model.indices))]
+    return model
+
+
+def measure(function):
+    """
+    return (result, seconds) of one call.
+    """
+    start=timeit.default_timer()
+    result=function()
+    return result, timeit.default_timer()-start
+
+
+def run(triangle_count=1000000):
+    """
+    return (triangle count, bytes, [(name, seconds)])
+    """
+    model=create_grid_model(triangle_count)
+    results=[]
+    def write_pmx():
+        ios=io.BytesIO()
+        writer.write_pmx(ios, model)
+        return ios.getvalue()
+    data, seconds=measure(write_pmx)
+    results.append(("write_pmx", seconds))
+    numpy_model, seconds=measure(lambda: reader.read(io.BytesIO(data),
+        vertex_layout="numpy"))
+    results.append(("read numpy", seconds))
+    object_model, seconds=measure(lambda: reader.read(io.BytesIO(data)))
+    results.append(("read object", seconds))
+    for name, x_model in (("write numpy", numpy_model),
+            ("write object", object_model)):
+        _, seconds=measure(lambda: writer.write(io.BytesIO(), x_model))
+        results.append((name, seconds))
+    return len(model.indices)//3, len(data), results
+
+
+def main():
+    triangle_count=int(sys.argv[1]) if len(sys.argv)>1 else 1000000
+    triangles, size, results=run(triangle_count)
+    print("%d triangles, %.1f MB" % (triangles, size/1024.0/1024.0))
+    print("%-16s %10s %10s" % ("step", "sec", "MB/s"))
+    for name, seconds in results:
+        print("%-16s %10.3f %10.1f" % (name, seconds,
+            size/1024.0/1024.0/seconds))
+
+
+if __name__=='__main__':
+    main()
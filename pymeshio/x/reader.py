@@ -1,6 +1,10 @@
 # coding: utf-8
 """
 x reader
+
+vertex_layout="numpy" finds the chunks by the brace positions, then splits
+each vertex, face, normal and uv block on ";" and parses the numbers at
+once. only the text format is supported.
 """
 import io
 import re
@@ -8,6 +12,270 @@ from .. import common
 from .. import x
 
 
+COMMENT_PATTERN=re.compile(br"(?://|#)[^\n]*")
+
+
+class Chunk(object):
+    """
+    a braced chunk of the text format.
+
+    :IVariables:
+        header
+            tokens before the brace, such as [b"Mesh", b"name"]. empty for a
+            reference({ name })
+        begin
+            offset of the header
+        start
+            offset of the body(after the brace)
+        end
+            offset of the closing brace
+        children
+            nested Chunk list
+    """
+    __slots__=[
+            'header',
+            'begin',
+            'start',
+            'end',
+            'children',
+            ]
+    def __init__(self, header, begin, start):
+        self.header=header
+        self.begin=begin
+        self.start=start
+        self.end=None
+        self.children=[]
+
+    def __str__(self):
+        return '<x.Chunk %s %d children>' % (
+                b" ".join(self.header), len(self.children))
+
+    def get_name(self):
+        return self.header[0] if self.header else b""
+
+    def get_head(self, data):
+        """
+        body before the first nested chunk.
+        """
+        return data[self.start:
+                self.children[0].begin if self.children else self.end]
+
+
+def parse_chunks(data):
+    """
+    return the top level Chunk list of the text.
+    """
+    import numpy
+    buffer=numpy.frombuffer(data, numpy.uint8)
+    braces=numpy.flatnonzero((buffer==ord("{")) | (buffer==ord("}")))
+    opens=(buffer[braces]==ord("{")).tolist()
+    root=Chunk([], 0, 0)
+    stack=[root]
+    previous=0
+    for pos, is_open in zip(braces.tolist(), opens):
+        if is_open:
+            begin=max(data.rfind(separator, previous, pos)
+                    for separator in (b"\n", b";", b"{", b"}"))+1
+            begin=max(begin, previous)
+            chunk=Chunk(data[begin:pos].split(), begin, pos+1)
+            stack[-1].children.append(chunk)
+            stack.append(chunk)
+        else:
+            if len(stack)==1:
+                raise common.ParseException(
+                        "unbalanced brace at {0}".format(pos))
+            stack.pop().end=pos
+        previous=pos
+    if len(stack)!=1:
+        raise common.ParseException("invalid eof")
+    return root.children
+
+
+def parse_numbers(pieces, dtype):
+    """
+    parse the numbers separated by ",", ";" or spaces.
+    """
+    import numpy
+    return numpy.fromstring(b" ".join(pieces).replace(b",", b" ").replace(
+        b";", b" "), dtype, sep=" ")
+
+
+def parse_vectors(pieces, offset, width):
+    """
+    parse "count; x;y;z;,...;" from pieces(split on ";").
+    return (float32 count x width, next offset).
+    """
+    count=int(pieces[offset])
+    offset+=1
+    values=parse_numbers(pieces[offset:offset+count*width], "float32")
+    if len(values)!=count*width:
+        raise common.ParseException(
+                "invalid vector array: {0} values for {1}".format(
+                    len(values), count))
+    offset+=count*width
+    # array terminator
+    if offset<len(pieces) and not pieces[offset].strip():
+        offset+=1
+    return values.reshape(-1, width), offset
+
+
+def parse_faces(pieces, offset):
+    """
+    parse "count; n;i,j,k;,...;" from pieces(split on ";").
+    return (x.FaceArray, next offset).
+    """
+    import numpy
+    count=int(pieces[offset])
+    offset+=1
+    faces=pieces[offset:offset+count*2]
+    sizes=parse_numbers(faces[0::2], numpy.int64)
+    indices=parse_numbers(faces[1::2], numpy.int64)
+    if len(sizes)!=count or len(indices)!=sizes.sum():
+        raise common.ParseException(
+                "invalid face array: {0} indices for {1} faces".format(
+                    len(indices), count))
+    offset+=count*2
+    if offset<len(pieces) and not pieces[offset].strip():
+        offset+=1
+    return x.FaceArray(sizes, indices), offset
+
+
+def parse_material(data, chunk):
+    material=x.Material()
+    values=[float(v) for v in chunk.get_head(data).replace(
+        b";", b" ").replace(b",", b" ").split()]
+    if len(values)<11:
+        raise common.ParseException(
+                "invalid material: {0}".format(b" ".join(chunk.header)))
+    material.diffuse=common.RGBA(*values[0:4])
+    material.shininess=values[4]
+    material.specular=common.RGB(*values[5:8])
+    material.emit=common.RGB(*values[8:11])
+    for child in chunk.children:
+        if child.get_name()==b"TextureFilename":
+            material.texture=data[child.start:child.end].strip().rstrip(
+                    b";").strip().strip(b'"')
+    return material
+
+
+class MeshArrays(object):
+    """
+    arrays of a Mesh chunk. merged to x.Model by read_numpy.
+    """
+    __slots__=[
+            'vertices',
+            'faces',
+            'face_materials',
+            'materials',
+            'normals',
+            'face_normals',
+            'uvs',
+            ]
+    def __init__(self, data, chunk, material_library):
+        import numpy
+        pieces=chunk.get_head(data).split(b";")
+        self.vertices, offset=parse_vectors(pieces, 0, 3)
+        self.faces, offset=parse_faces(pieces, offset)
+        self.face_materials=numpy.zeros(len(self.faces), numpy.int64)
+        self.materials=[]
+        self.normals=numpy.zeros((0, 3), numpy.float32)
+        self.face_normals=x.FaceArray(numpy.zeros(0, numpy.int64),
+                numpy.zeros(0, numpy.int64))
+        self.uvs=numpy.zeros((0, 2), numpy.float32)
+        for child in chunk.children:
+            name=child.get_name()
+            if name==b"MeshMaterialList":
+                self.read_material_list(data, child, material_library)
+            elif name==b"MeshNormals":
+                pieces=child.get_head(data).split(b";")
+                self.normals, offset=parse_vectors(pieces, 0, 3)
+                self.face_normals, offset=parse_faces(pieces, offset)
+            elif name==b"MeshTextureCoords":
+                self.uvs, _=parse_vectors(
+                        child.get_head(data).split(b";"), 0, 2)
+
+    def read_material_list(self, data, chunk, material_library):
+        import numpy
+        pieces=chunk.get_head(data).split(b";")
+        face_count=int(pieces[1])
+        self.face_materials=parse_numbers(pieces[2:3], numpy.int64)
+        if len(self.face_materials)!=face_count:
+            raise common.ParseException(
+                    "invalid face material count: {0}".format(
+                        len(self.face_materials)))
+        for child in chunk.children:
+            if child.get_name()==b"Material":
+                self.materials.append(parse_material(data, child))
+            elif not child.header:
+                # reference to a top level material
+                name=data[child.start:child.end].strip()
+                if name not in material_library:
+                    raise common.ParseException(
+                            "unknown material: {0}".format(name))
+                self.materials.append(material_library[name])
+
+
+def read_numpy(data):
+    """
+    read the text into x.Model of vertex_layout="numpy". Mesh chunks in
+    Frame chunks are read and every Mesh is merged into the model.
+    """
+    import numpy
+    if data[0:4]!=b"xof " or data[8:12]!=b"txt ":
+        raise common.ParseException("not a text x file")
+    data=data[16:]
+    if data.find(b"//")!=-1 or data.find(b"#")!=-1:
+        data=COMMENT_PATTERN.sub(b"", data)
+    model=x.Model()
+    chunks=parse_chunks(data)
+    material_library={}
+    for chunk in chunks:
+        if chunk.get_name()==b"Material" and len(chunk.header)>1:
+            material_library[chunk.header[1]]=parse_material(data, chunk)
+    meshes=[]
+    def traverse(chunks):
+        for chunk in chunks:
+            name=chunk.get_name()
+            if name==b"template":
+                model.templates.append(data[chunk.begin:chunk.end+1])
+            elif name==b"Mesh":
+                meshes.append(MeshArrays(data, chunk, material_library))
+            elif name==b"Frame":
+                traverse(chunk.children)
+    traverse(chunks)
+
+    def concatenate(arrays, offsets, empty):
+        arrays=[a+offset for a, offset in zip(arrays, offsets)]
+        return numpy.concatenate(arrays) if arrays else empty
+    def concatenate_faces(faces, offsets):
+        return x.FaceArray(
+                concatenate([f.sizes for f in faces], [0]*len(faces),
+                    numpy.zeros(0, numpy.int64)),
+                concatenate([f.indices for f in faces], offsets,
+                    numpy.zeros(0, numpy.int64)))
+    def get_offsets(counts):
+        return numpy.cumsum([0]+counts[:-1]).tolist()
+    zeros=[0]*len(meshes)
+    model.vertices=concatenate([m.vertices for m in meshes], zeros,
+            numpy.zeros((0, 3), numpy.float32))
+    model.faces=concatenate_faces([m.faces for m in meshes],
+            get_offsets([len(m.vertices) for m in meshes]))
+    model.face_materials=concatenate([m.face_materials for m in meshes],
+            get_offsets([len(m.materials) for m in meshes]),
+            numpy.zeros(0, numpy.int64))
+    model.materials=[material for m in meshes for material in m.materials]
+    model.normals=concatenate([m.normals for m in meshes], zeros,
+            numpy.zeros((0, 3), numpy.float32))
+    model.face_normals=concatenate_faces([m.face_normals for m in meshes],
+            get_offsets([len(m.normals) for m in meshes]))
+    # uv is per vertex. fill the meshes without uv if any has
+    has_uv=any(len(m.uvs) for m in meshes)
+    model.uvs=concatenate([m.uvs if len(m.uvs) or not has_uv
+        else numpy.zeros((len(m.vertices), 2), numpy.float32)
+        for m in meshes], zeros, numpy.zeros((0, 2), numpy.float32))
+    return model
+
+
 class Reader(common.TextReader):
     """x reader
     """
@@ -72,7 +340,6 @@ class Reader(common.TextReader):
         # vertices
         ####################
         vertex_count=int(self.getline().split(b";")[0].strip())
-        print("vertex_count: %d" % vertex_count)
         def get_vertex(line):
             splited=line.split(b";")
             return common.Vector3(
@@ -88,7 +355,6 @@ class Reader(common.TextReader):
         # faces
         ####################
         face_count=int(self.getline().split(b";")[0].strip())
-        print("face_count: %d" % face_count)
         def get_face(line):
             splited=line.split(b";")
             face_vertex_count=int(splited[0])
@@ -113,7 +379,6 @@ class Reader(common.TextReader):
             line=line[0:-1].strip()
 
             splited=line.split()
-            print(splited)
             chunk=splited[0]
 
             if chunk==b"MeshMaterialList":
@@ -123,12 +388,12 @@ class Reader(common.TextReader):
             elif chunk==b"MeshTextureCoords":
                 self.readUVChunkBody()
             else:
-                raise "unknown chunk !: [%s]" % chunk
+                raise common.ParseException(
+                        "unknown chunk !: [{0}]".format(chunk))
 
 
     def readMeshMaterialListChunkBody(self):
         material_count=int(self.getline().split(b";")[0].strip())
-        print(material_count)
         face_material_count=int(self.getline().split(b";")[0].strip())
 
         num_p=re.compile(b"\d+")
@@ -144,7 +409,6 @@ class Reader(common.TextReader):
             chunk=splited[0]
             
             assert(chunk==b"Material")
-            print(splited[1])
 
             material=x.Material()
 
@@ -175,13 +439,13 @@ class Reader(common.TextReader):
             
             line=self.getline().strip()
             if line.startswith(b"TextureFilename "):
-                # todo
                 line=self.getline().strip()
+                material.texture=line.rstrip(b";").strip().strip(b'"')
                 line=self.getline().strip()
                 line=self.getline().strip()
-                #line=self.getline().strip()
 
             assert(line==b'}')
+            return material
 
         for _ in range(material_count):
             self.model.materials.append(read_material())
@@ -230,8 +494,6 @@ class Reader(common.TextReader):
             if line==b"}":
                 break
 
-            print(line)
-
 
     def readUVChunkBody(self):
         uv_count=int(self.getline().split(b";")[0].strip())
@@ -268,13 +530,11 @@ class Reader(common.TextReader):
                 continue
             line=line.strip()
 
-            print(line)
             assert(line.endswith(b"{"))
             # drop {
             line=line[0:-1].strip()
 
             splited=line.split()
-            print(splited)
             chunk=splited[0]
 
             if chunk==b"template":
@@ -289,35 +549,46 @@ class Reader(common.TextReader):
             elif chunk==b"Mesh":
                 self.readMeshChunkBody()
             else:
-                raise "unknown chunk !: [%s]" % chunk
+                raise common.ParseException(
+                        "unknown chunk !: [{0}]".format(chunk))
 
         return self.model
 
 
-def read(ios):
+def read(ios, vertex_layout="object"):
     """
-    read from ios, then return the pymeshio.mqo.Model.
+    read from ios, then return the pymeshio.x.Model.
 
     :Parameters:
       ios
         input stream (in io.IOBase)
+      vertex_layout
+        "object": vertices, normals and uvs are common.Vector3 and
+        common.Vector2 lists, faces are index lists.
+        "numpy": vertices, normals and uvs are float32 arrays, faces and
+        face_normals are x.FaceArray(requires numpy).
     """
     assert(isinstance(ios, io.IOBase))
-    return Reader(ios).read()
+    if vertex_layout=="numpy":
+        return read_numpy(ios.read())
+    elif vertex_layout=="object":
+        return Reader(ios).read()
+    raise ValueError("unknown vertex_layout: {0}".format(vertex_layout))
 
 
-def read_from_file(path):
+def read_from_file(path, vertex_layout="object"):
     """
     read from file path, then return the x.Model.
 
     :Parameters:
       path
         file path
+      vertex_layout
+        see read
 
     >>> import x.reader
     >>> m=x.reader.read_from_file('resources/cube.x')
 
     """
     with io.open(path, 'rb') as ios:
-        return read(ios)
-
+        return read(ios, vertex_layout)
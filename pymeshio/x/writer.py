@@ -1,10 +1,154 @@
 # coding: utf-8
 """
+x writer
+
+arrays are written by blocks of rows. a block is formatted by one
+preformatted row template repeated for the rows, so no write is issued per
+vertex or face.
 """
 import io
+from .. import common
 from .. import x
 
 
+# rows formatted and written at once
+BLOCK_ROWS=4096
+
+
+def get_rows(values, width, attribute=None):
+    """
+    return the flat value list of the rows.
+
+    :Parameters:
+        values
+            numpy array(N x width) or objects with x, y(, z)
+        attribute
+            take the vector from this attribute of the objects
+    """
+    if hasattr(values, "dtype"):
+        return values.reshape(-1).tolist()
+    names=("x", "y", "z")[:width]
+    if attribute:
+        return [getattr(getattr(v, attribute), name)
+                for v in values for name in names]
+    return [getattr(v, name) for v in values for name in names]
+
+
+def write_lines(ios, text):
+    ios.write(text.encode("ascii"))
+
+
+def write_vectors(ios, values, width, indent, precision, attribute=None):
+    """
+    write "count; x;y;z;,...;;" of the vectors.
+    """
+    count=len(values)
+    write_lines(ios, "%s%d;\r\n" % (indent, count))
+    row=indent+";".join(["%%.%df" % precision]*width)+";,\r\n"
+    for start in range(0, count, BLOCK_ROWS):
+        block=values[start:start+BLOCK_ROWS]
+        text=row*len(block) % tuple(get_rows(block, width, attribute))
+        if start+BLOCK_ROWS>=count:
+            # array terminator
+            text=text[:-3]+";\r\n"
+        write_lines(ios, text)
+
+
+def write_faces(ios, faces, indent):
+    """
+    write "count; n;i,j,k;,...;;" of x.FaceArray or index lists.
+    """
+    count=len(faces)
+    write_lines(ios, "%s%d;\r\n" % (indent, count))
+    for start in range(0, count, BLOCK_ROWS):
+        stop=min(start+BLOCK_ROWS, count)
+        if isinstance(faces, x.FaceArray):
+            text=format_face_block(faces, start, stop, indent)
+        else:
+            text="".join([
+                "%s%d;%s;,\r\n" % (indent, len(f), ",".join(map(str, f)))
+                for f in faces[start:stop]])
+        if stop>=count:
+            text=text[:-3]+";\r\n"
+        write_lines(ios, text)
+
+
+def format_face_block(faces, start, stop, indent):
+    import numpy
+    sizes=faces.sizes[start:stop]
+    indices=faces.indices[faces.starts[start]:
+            faces.starts[stop-1]+sizes[-1]]
+    if (sizes==sizes[0]).all():
+        # all faces have the same size. one template for the block
+        size=int(sizes[0])
+        rows=numpy.empty((len(sizes), size+1), numpy.int64)
+        rows[:, 0]=size
+        rows[:, 1:]=indices.reshape(-1, size)
+        row=indent+"%d;"+",".join(["%d"]*size)+";,\r\n"
+        return row*len(sizes) % tuple(rows.reshape(-1).tolist())
+    lines=[]
+    offset=0
+    indices=indices.tolist()
+    for size in sizes.tolist():
+        lines.append("%s%d;%s;,\r\n" % (indent, size,
+            ",".join(map(str, indices[offset:offset+size]))))
+        offset+=size
+    return "".join(lines)
+
+
+def write_ints(ios, values, indent):
+    """
+    write "i,...;;" of the ints.
+    """
+    count=len(values)
+    row=indent+"%d,\r\n"
+    for start in range(0, count, BLOCK_ROWS):
+        block=values[start:start+BLOCK_ROWS]
+        if hasattr(block, "dtype"):
+            block=block.tolist()
+        text=row*len(block) % tuple(block)
+        if start+BLOCK_ROWS>=count:
+            text=text[:-3]+";;\r\n"
+        write_lines(ios, text)
+
+
+def write_header(ios, templates=()):
+    # signature
+    write_lines(ios, "xof 0302txt 0064\r\n")
+
+    # templates
+    for template in templates:
+        ios.write(template)
+        ios.write(b"\r\n")
+
+    # header
+    write_lines(ios, "Header{\r\n"
+            "1;\r\n"
+            "0;\r\n"
+            "1;\r\n"
+            "}\r\n"
+            "\r\n")
+
+
+def write_materials(ios, face_materials, materials):
+    write_lines(ios, " MeshMaterialList {\r\n")
+    write_lines(ios, "  %d;\r\n" % len(materials))
+    write_lines(ios, "  %d;\r\n" % len(face_materials))
+    write_ints(ios, face_materials, "  ")
+    for m in materials:
+        write_lines(ios, "  Material {\r\n")
+        write_lines(ios, "   %.6f;%.6f;%.6f;%.6f;;\r\n" % (m.diffuse.r, m.diffuse.g, m.diffuse.b, m.diffuse.a))
+        write_lines(ios, "   %.6f;\r\n" % m.shininess)
+        write_lines(ios, "   %.6f;%.6f;%.6f;;\r\n" % (m.specular.r, m.specular.g, m.specular.b))
+        write_lines(ios, "   %.6f;%.6f;%.6f;;\r\n" % (m.emit.r, m.emit.g, m.emit.b))
+        if m.texture:
+            ios.write(b"   TextureFilename {\r\n")
+            ios.write(b'    "'+m.texture+b'";\r\n')
+            ios.write(b"   }\r\n")
+        write_lines(ios, "  }\r\n")
+    write_lines(ios, " }\r\n")
+
+
 def write(ios, model):
     """
     write model to ios.
@@ -13,7 +157,7 @@ def write(ios, model):
         ios
             output stream (in io.IOBase)
         model
-            pmx model
+            x model of vertex_layout "object" or "numpy"
 
     >>> import pymeshio.x.writer
     >>> pymeshio.x.writer.write(io.open('out.x', 'wb'), x_model)
@@ -22,98 +166,102 @@ def write(ios, model):
     assert(isinstance(ios, io.IOBase))
     assert(isinstance(model, x.Model))
 
-    # signature
-    ios.write("xof 0302txt 0064\r\n")
-
-    # templates
-    for template in model.templates:
-        ios.write(template)
-        ios.write("\r\n")
-
-    # header
-    ios.write("Header{\r\n")
-    ios.write("1;\r\n");
-    ios.write("0;\r\n");
-    ios.write("1;\r\n");
-    ios.write("}\r\n")
-    ios.write("\r\n")
+    write_header(ios, model.templates)
 
-    ios.write("Mesh {\r\n")
+    write_lines(ios, "Mesh {\r\n")
 
     # vertex
-    ios.write(" %d;\r\n" % len(model.vertices))
-    last_index=len(model.vertices)-1
-    for i, v in enumerate(model.vertices):
-        if i!=last_index:
-            ios.write(" %.5f;%.5f;%.5f;,\r\n" % (v.x, v.y, v.z))
-        else:
-            ios.write(" %.5f;%.5f;%.5f;;\r\n" % (v.x, v.y, v.z))
-    ios.write("\r\n")
+    write_vectors(ios, model.vertices, 3, " ", 5)
+    write_lines(ios, "\r\n")
 
     # faces
-    ios.write(" %d;\r\n" % len(model.faces))
-    def get_face_line(f):
-        return ("%d;" % len(f))+",".join([str(n) for n in f])+";"
-    last_index=len(model.faces)-1
-    for i, f in enumerate(model.faces):
-        if i!=last_index:
-            ios.write( " %s,\r\n" % get_face_line(f))
-        else:
-            ios.write( " %s;\r\n" % get_face_line(f))
-    ios.write("\r\n")
+    write_faces(ios, model.faces, " ")
+    write_lines(ios, "\r\n")
 
     # material list
-    ios.write(" MeshMaterialList {\r\n")
-    ios.write("  %d;\r\n" % len(model.materials))
-    ios.write("  %d;\r\n" % len(model.faces))
-    last_index=len(model.face_materials)-1
-    for i, f in enumerate(model.face_materials):
-        if i!=last_index:
-            ios.write("  %d,\r\n" % f)
-        else:
-            ios.write("  %d;;\r\n" % f)
-    for i, m in enumerate(model.materials):
-        ios.write("  Material {\r\n")
-        ios.write("   %.6f;%.6f;%.6f;%.6f;;\r\n" % (m.diffuse.r, m.diffuse.g, m.diffuse.b, m.diffuse.a))
-        ios.write("   %.6f;\r\n" % m.shininess)
-        ios.write("   %.6f;%.6f;%.6f;;\r\n" % (m.specular.r, m.specular.g, m.specular.b))
-        ios.write("   %.6f;%.6f;%.6f;;\r\n" % (m.emit.r, m.emit.g, m.emit.b))
-        ios.write("  }\r\n")
-    ios.write(" }\r\n")
+    write_materials(ios, model.face_materials, model.materials)
 
     # normals
-    ios.write(" MeshNormals {\r\n")
-    ios.write("  %d;\r\n" % len(model.normals))
-    last_index=len(model.normals)-1
-    for i, n in enumerate(model.normals):
-        if i!=last_index:
-            ios.write("  %.6f;%.6f;%.6f;,\r\n" % (n.x, n.y, n.z))
-        else:
-            ios.write("  %.6f;%.6f;%.6f;;\r\n" % (n.x, n.y, n.z))
-
-    ios.write("  %d;\r\n" % len(model.face_normals))
-    last_index=len(model.face_normals)-1
-    def get_face_normal_line(face_normal):
-        return ("%d;" % len(face_normal))+",".join([str(n) for n in face_normal])+";"
-    for i, fn in enumerate(model.face_normals):
-        if i!=last_index:
-            ios.write( "  %s,\r\n" % get_face_normal_line(fn))
-        else:
-            ios.write( "  %s;\r\n" % get_face_normal_line(fn))
-    ios.write(" }\r\n")
+    write_lines(ios, " MeshNormals {\r\n")
+    write_vectors(ios, model.normals, 3, "  ", 6)
+    write_faces(ios, model.face_normals, "  ")
+    write_lines(ios, " }\r\n")
 
     # uv
     if len(model.uvs)>0:
-        ios.write(" MeshTextureCoords {\r\n")
-        ios.write("  %d;\r\n" % len(model.uvs))
-        last_index=len(model.uvs)-1
-        for i, uv in enumerate(model.uvs):
-            if i!=last_index:
-                ios.write("  %.6f;%.6f;,\r\n" % (uv.x, uv.y))
-            else:
-                ios.write("  %.6f;%.6f;;\r\n" % (uv.x, uv.y))
-        ios.write(" }\r\n")
+        write_lines(ios, " MeshTextureCoords {\r\n")
+        write_vectors(ios, model.uvs, 2, "  ", 6)
+        write_lines(ios, " }\r\n")
 
+    write_lines(ios, "}\r\n")
+
+
+def write_pmx(ios, model):
+    """
+    write the mesh of pmx.Model to ios, without building x.Model.
+
+    vertices, normals and uvs are streamed by blocks from the vertex list or
+    pmx.VertexArray. a pmx vertex normal is written as the normal of the
+    same index. ambient color is written as the emissive color.
+
+    requires numpy.
+
+    :Parameters:
+        ios
+            output stream (in io.IOBase)
+        model
+            pmx model
+
+    >>> import pymeshio.x.writer
+    >>> pymeshio.x.writer.write_pmx(io.open('out.x', 'wb'), pmx_model)
+
+    """
+    import numpy
+    assert(isinstance(ios, io.IOBase))
+    vertices=model.vertices
+    if hasattr(vertices, "positions"):
+        # pmx.VertexArray
+        columns=[(vertices.positions, None), (vertices.normals, None),
+                (vertices.uvs, None)]
+    else:
+        columns=[(vertices, "position"), (vertices, "normal"),
+                (vertices, "uv")]
+    (positions, position), (normals, normal), (uvs, uv)=columns
+    indices=numpy.asarray(model.indices, numpy.int64)
+    triangle_count=len(indices)//3
+    faces=x.FaceArray(numpy.full(triangle_count, 3, numpy.int64),
+            indices[:triangle_count*3])
+    face_materials=numpy.repeat(numpy.arange(len(model.materials)),
+            [m.vertex_count//3 for m in model.materials])
+    if len(face_materials)!=triangle_count:
+        raise ValueError("material vertex_count does not match indices: "
+                "{0} faces for {1} triangles".format(
+                    len(face_materials), triangle_count))
 
-    ios.write("}\r\n")
+    materials=[]
+    for m in model.materials:
+        material=x.Material()
+        material.diffuse=common.RGBA(m.diffuse_color.r, m.diffuse_color.g,
+                m.diffuse_color.b, m.alpha)
+        material.shininess=m.specular_factor
+        material.specular=m.specular_color
+        material.emit=m.ambient_color
+        if 0<=m.texture_index<len(model.textures):
+            material.texture=model.textures[m.texture_index].encode("cp932")
+        materials.append(material)
 
+    write_header(ios)
+    write_lines(ios, "Mesh {\r\n")
+    write_vectors(ios, positions, 3, " ", 5, position)
+    write_lines(ios, "\r\n")
+    write_faces(ios, faces, " ")
+    write_lines(ios, "\r\n")
+    write_materials(ios, face_materials, materials)
+    write_lines(ios, " MeshNormals {\r\n")
+    write_vectors(ios, normals, 3, "  ", 6, normal)
+    write_faces(ios, faces, "  ")
+    write_lines(ios, " }\r\n")
+    write_lines(ios, " MeshTextureCoords {\r\n")
+    write_vectors(ios, uvs, 2, "  ", 6, uv)
+    write_lines(ios, " }\r\n")
+    write_lines(ios, "}\r\n")